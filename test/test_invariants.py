@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+#   Проверка инвариантов на тестовых областях test/*.rf:
+#   совпадение способов вычисления R-функции, параллельного и
+#   последовательного поиска границы, сохранения и загрузки сетки
+###################################################################
+
+import contextlib
+import glob
+import io
+import os
+import sys
+import numpy as np
+import pytest
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(test_dir))
+
+from tri_parser import TParser
+from tri_cache import TCache
+from tri_tri import TTri
+from tri_export import load_mesh, mesh_formats
+
+# Тестовые области
+domain_files = sorted(glob.glob(os.path.join(test_dir, 'test*.rf')))
+# Количество шагов сетки при построении тестовых сеток
+mesh_step = 40
+
+
+# Транслятор описания области из файла
+def parser(file_name, cache=None):
+    res = TParser()
+    res.set_cache(cache)
+    with open(file_name) as file:
+        res.set_code(file.readlines())
+    return res
+
+
+# Точки проверки: равномерная сетка (больше одного блока TParser.block_size) вокруг области
+def points(count=120, size=3.0):
+    x, y = np.meshgrid(np.linspace(-size, size, count), np.linspace(-size, size, count))
+    return x.ravel(), y.ravel()
+
+
+# Построение сетки без кэша (результат вычисляется заново при каждом вызове)
+def mesh(file_name, **settings):
+    tri = TTri()
+    tri.set_cache(None)
+    tri.set_file_name(file_name)
+    tri.set_step(mesh_step)
+    tri.set_eps(1.0E-6)
+    for name, value in settings.items():
+        getattr(tri, 'set_' + name)(value)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert tri.start() is not False
+    return tri
+
+
+@pytest.mark.parametrize('file_name', domain_files, ids=os.path.basename)
+def test_run_many_matches_run(file_name):
+    p = parser(file_name)
+    x, y = points()
+    expected = np.array([p.run(a, b) for a, b in zip(x.tolist(), y.tolist())])
+    np.testing.assert_array_equal(p.run_many(x, y), expected)
+
+
+@pytest.mark.parametrize('file_name', domain_files, ids=os.path.basename)
+def test_interpreter_matches_compiled(file_name):
+    p = parser(file_name)
+    domain = p.get_domain()
+    x, y = points(30)
+    for a, b in zip(x.tolist(), y.tolist()):
+        assert domain.value(a, b) == p.run(a, b)
+    np.testing.assert_array_equal(domain.vector(x, y), p.run_many(x, y))
+
+
+@pytest.mark.parametrize('file_name', domain_files, ids=os.path.basename)
+def test_cached_translation_matches(file_name, tmp_path):
+    x, y = points()
+    expected = parser(file_name).run_many(x, y)
+    cache = TCache(str(tmp_path))
+    # Первая трансляция заполняет кэш, вторая загружает из него байт-код функций
+    for _ in range(0, 2):
+        np.testing.assert_array_equal(parser(file_name, cache).run_many(x, y), expected)
+    assert cache.size() > 0
+
+
+@pytest.mark.parametrize('mode', ['line', 'grid', 'quadtree'])
+@pytest.mark.parametrize('file_name', domain_files[:2], ids=os.path.basename)
+def test_parallel_matches_serial(file_name, mode):
+    serial = mesh(file_name, search_mode=mode, workers=1)
+    parallel = mesh(file_name, search_mode=mode, workers=2)
+    np.testing.assert_array_equal(parallel.x, serial.x)
+    assert parallel.get_root_statistics() == serial.get_root_statistics()
+
+
+@pytest.mark.parametrize('file_name', domain_files, ids=os.path.basename)
+def test_grid_matches_line(file_name):
+    np.testing.assert_array_equal(mesh(file_name, search_mode='grid').x, mesh(file_name, search_mode='line').x)
+
+
+@pytest.mark.parametrize('ext', sorted(mesh_formats))
+def test_export_round_trip(ext, tmp_path):
+    res = mesh(domain_files[1]).get_mesh()
+    file_name = str(tmp_path / ('mesh' + ext))
+    res.save(file_name)
+    loaded = load_mesh(file_name)
+    np.testing.assert_array_equal(loaded.x, res.x)
+    np.testing.assert_array_equal(loaded.fe, res.fe)
+    np.testing.assert_array_equal(loaded.boundary_edges(), res.boundary_edges())
+    np.testing.assert_array_equal(loaded.boundary_loops(), res.boundary_loops())
+    if mesh_formats[ext] in ('npz', 'raw'):
+        # Двоичные форматы сохраняют массивы полностью (с типами и соседями КЭ)
+        assert loaded.be.dtype == res.be.dtype
+        np.testing.assert_array_equal(loaded.be, res.be)
+        np.testing.assert_array_equal(loaded.neighbors, res.neighbors)
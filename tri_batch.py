@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+#   Пакетное построение сеток без графического интерфейса:
+#   обработка множества файлов описания областей пулом процессов
+#   с ограничением времени каждого расчета и сводкой в формате JSON
+###################################################################
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing.connection import wait
+from collections import deque
+from tri_tri import TTri
+from tri_cache import default_cache_path
+from tri_export import mesh_formats
+from tri_raster import TRaster
+
+# Параметры расчета, передаваемые одноименным методам set_* объекта TTri: (имя, тип, описание)
+mesh_options = [
+    ('eps', float, 'root finding accuracy'),
+    ('root_method', str, 'root finding method (bisect, illinois, itp)'),
+    ('step', int, 'number of search steps'),
+    ('search_mode', str, 'boundary search mode (line, grid, quadtree)'),
+    ('quadtree_depth', int, 'quadtree depth (0 - by the number of steps)'),
+    ('angle', float, 'maximum angle between adjacent boundary segments'),
+    ('ratio', float, 'maximum length ratio of adjacent boundary segments'),
+    ('min_length', float, 'minimum boundary segment length for resampling (0 - automatic)'),
+    ('max_length', float, 'maximum boundary segment length for resampling (0 - automatic)'),
+    ('min_angle', float, 'minimum element angle for refinement'),
+    ('max_elements', int, 'maximum number of elements during refinement (0 - unlimited)'),
+    ('max_iterations', int, 'maximum number of refinement iterations'),
+    ('workers', int, 'number of processes for the boundary search of each file')
+]
+# Признаки, отключающие этапы расчета: (имя параметра, метод TTri)
+disable_options = [
+    ('no_auto_region', 'set_auto_region'),
+    ('no_resample', 'set_resample'),
+    ('no_length_optimize', 'set_length_optimize'),
+    ('no_angle_optimize', 'set_angle_optimize'),
+    ('no_full_optimize', 'set_full_optimize')
+]
+
+
+# Разбор аргументов командной строки
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='Batch 2D mesh generation from R-function descriptions (.rf files)')
+    parser.add_argument('files', nargs='+', help='.rf files or glob patterns (** is supported)')
+    parser.add_argument('-o', '--output', default='.', help='output directory for meshes (default: current)')
+    parser.add_argument('-f', '--format', default='npz', choices=sorted(set(mesh_formats.values())),
+                        help='output mesh format (default: npz)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of files meshed in parallel (default: number of CPUs)')
+    parser.add_argument('-t', '--timeout', type=float, default=0, help='time limit per file in seconds (0 - none)')
+    parser.add_argument('-p', '--preview', action='store_true', help='save a PNG preview next to each mesh')
+    parser.add_argument('--preview-size', type=int, default=800, help='preview size in pixels (default: 800)')
+    parser.add_argument('--preview-quality', action='store_true', help='color preview elements by quality')
+    parser.add_argument('-s', '--summary', default='-', help='JSON summary file (default: standard output)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report finished files to stderr')
+    for name, kind, text in mesh_options:
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, type=kind, default=None, help=text)
+    parser.add_argument('--region', type=float, nargs=4, metavar=('X0', 'Y0', 'X1', 'Y1'), default=None,
+                        help='boundary search region (disables automatic region)')
+    for name, _ in disable_options:
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, action='store_true',
+                            help='disable ' + name[3:].replace('_', ' '))
+    parser.add_argument('--incremental', action='store_true', help='incremental retriangulation')
+    parser.add_argument('--cache', default=default_cache_path(), help='cache directory')
+    parser.add_argument('--no-cache', action='store_true', help='do not use the cache')
+    parser.add_argument('--mesh-cache', action='store_true', help='reuse meshes built with the same parameters')
+    return parser.parse_args(argv)
+
+
+# Список файлов по именам и шаблонам (в порядке задания, без повторов)
+def expand_files(patterns):
+    res = []
+    for pattern in patterns:
+        names = sorted(glob.glob(pattern, recursive=True)) if any(c in pattern for c in '*?[') else [pattern]
+        for name in names:
+            if name not in res:
+                res.append(name)
+    return res
+
+
+# Имена выходных файлов: имя исходного файла с расширением формата fmt (повторяющиеся имена нумеруются)
+def output_names(files, output, fmt):
+    suffix = [key for key, val in mesh_formats.items() if val == fmt][0]
+    res = []
+    used = set()
+    for name in files:
+        stem = os.path.splitext(os.path.basename(name))[0]
+        base = stem
+        k = 1
+        while base in used:
+            base = '%s-%d' % (stem, k)
+            k += 1
+        used.add(base)
+        res.append(os.path.join(output, base + suffix))
+    return res
+
+
+# Настройка объекта TTri по аргументам командной строки
+def configure(tri, args):
+    for name, _, _ in mesh_options:
+        if getattr(args, name) is not None:
+            getattr(tri, 'set_' + name)(getattr(args, name))
+    if args.region is not None:
+        tri.set_region(args.region[:2], args.region[2:])
+    for name, method in disable_options:
+        if getattr(args, name):
+            getattr(tri, method)(False)
+    tri.set_incremental(args.incremental)
+    tri.set_cache(None if args.no_cache else args.cache)
+    tri.set_mesh_cache(args.mesh_cache and not args.no_cache)
+    tri.set_progress(False)
+
+
+# Построение сетки для одного файла; сообщения расчета перехватываются и включаются в результат
+def mesh_file(file_name, output_name, args):
+    res = {'file': file_name, 'status': 'failed'}
+    begin = time.perf_counter()
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        tri = TTri()
+        configure(tri, args)
+        tri.set_file_name(file_name)
+        is_ok = tri.start()
+    res['phases'] = tri.get_timings()
+    if is_ok:
+        tri.save(output_name, args.format)
+        if args.preview:
+            raster = TRaster(tri.x, tri.fe, tri.be, args.preview_size, args.preview_size)
+            if args.preview_quality:
+                raster.set_quality()
+            res['preview'] = os.path.splitext(output_name)[0] + '.png'
+            raster.save_png(res['preview'])
+        quality = tri.mesh_quality()
+        res.update({'status': 'ok', 'output': output_name, 'nodes': quality['nodes'],
+                    'elements': quality['elements'], 'boundary': quality['boundary'], 'loops': quality['loops']})
+        if 'min_angle' in quality:
+            res.update({'min_angle': quality['min_angle'], 'mean_quality': quality['mean_quality']})
+    res['time'] = time.perf_counter() - begin
+    message = messages.getvalue().replace('\033[1;31m', '').replace('\033[1;m', '').strip()
+    if message:
+        res['message'] = message
+    return res
+
+
+# Процесс пула: построение сетки и передача результата через канал connection
+def run_job(file_name, output_name, args, connection):
+    try:
+        res = mesh_file(file_name, output_name, args)
+    except Exception as err:
+        res = {'file': file_name, 'status': 'error', 'message': '%s: %s' % (type(err).__name__, err)}
+    connection.send(res)
+    connection.close()
+
+
+# Построение сеток для всех файлов: одновременно выполняется не больше jobs процессов, процесс, превысивший
+# время timeout, завершается принудительно. Результаты возвращаются в порядке файлов
+def run_batch(files, args):
+    names = output_names(files, args.output, args.format)
+    res = [None]*len(files)
+    pending = deque(range(0, len(files)))
+    running = {}            # Канал процесса -> (номер файла, процесс, момент запуска)
+    while pending or running:
+        while pending and len(running) < max(1, args.jobs):
+            i = pending.popleft()
+            receiver, sender = multiprocessing.Pipe(False)
+            process = multiprocessing.Process(target=run_job, args=(files[i], names[i], args, sender))
+            process.start()
+            sender.close()
+            running[receiver] = (i, process, time.perf_counter())
+        timeout = None
+        if args.timeout > 0:
+            now = time.perf_counter()
+            timeout = max(0.0, min(start + args.timeout - now for _, _, start in running.values()))
+        for receiver in wait(list(running.keys()), timeout):
+            i, process, start = running.pop(receiver)
+            try:
+                res[i] = receiver.recv()
+            except (EOFError, OSError):
+                res[i] = {'file': files[i], 'status': 'error', 'message': 'process terminated unexpectedly'}
+            receiver.close()
+            process.join()
+            report(res[i], args)
+        if args.timeout > 0:
+            now = time.perf_counter()
+            for receiver, (i, process, start) in list(running.items()):
+                if now - start >= args.timeout:
+                    process.terminate()
+                    process.join()
+                    receiver.close()
+                    del running[receiver]
+                    res[i] = {'file': files[i], 'status': 'timeout', 'time': now - start}
+                    report(res[i], args)
+    return res
+
+
+# Вывод состояния завершенного расчета в поток ошибок
+def report(job, args):
+    if args.quiet:
+        return
+    text = '%s: %s' % (job['file'], job['status'])
+    if job['status'] == 'ok':
+        text += ' (%d nodes, %d elements, %.2f s)' % (job['nodes'], job['elements'], job['time'])
+    elif 'message' in job:
+        text += ' (' + job['message'].splitlines()[-1] + ')'
+    sys.stderr.write(text + '\n')
+    sys.stderr.flush()
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    files = expand_files(args.files)
+    if not files:
+        sys.stderr.write('No input files\n')
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    begin = time.perf_counter()
+    jobs = run_batch(files, args)
+    summary = {'files': len(jobs), 'time': time.perf_counter() - begin, 'jobs': jobs}
+    for status in ['ok', 'failed', 'timeout', 'error']:
+        summary[status] = sum(1 for job in jobs if job['status'] == status)
+    text = json.dumps(summary, indent=2)
+    if args.summary == '-':
+        sys.stdout.write(text + '\n')
+    else:
+        with open(args.summary, 'w') as file:
+            file.write(text + '\n')
+    return 0 if summary['ok'] == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+#   Кэш результатов расчетов на диске с ограничением размера
+#   и удалением давно не использовавшихся записей (LRU)
+###################################################################
+
+import os
+import tempfile
+import hashlib
+
+# Максимальный суммарный размер записей кэша по умолчанию (в байтах)
+cache_size = 256 << 20
+# Расширение файлов записей кэша
+cache_suffix = '.bin'
+
+
+# Каталог кэша по умолчанию
+def default_cache_path():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'pytri')
+
+
+# Класс, реализующий кэш в каталоге path: запись хранится в файле <ключ>.bin, время изменения файла - время
+# последнего обращения к записи. При превышении суммарного размера max_size удаляются записи, использовавшиеся
+# раньше остальных. Запись выполняется во временный файл с последующим переименованием, поэтому кэшем могут
+# одновременно пользоваться несколько процессов (читающий процесс получает либо прежнюю, либо новую запись целиком)
+class TCache:
+    def __init__(self, path, max_size=cache_size):
+        self.path = path                # Каталог кэша
+        self.max_size = max_size        # Максимальный суммарный размер записей
+        self.hits = 0                   # Количество найденных записей
+        self.misses = 0                 # Количество отсутствовавших записей
+
+    # Ключ записи: хеш SHA-256 составных частей (строк, байтов или чисел)
+    @staticmethod
+    def key(*parts):
+        res = hashlib.sha256()
+        for part in parts:
+            part = part if isinstance(part, bytes) else str(part).encode('utf-8')
+            res.update(len(part).to_bytes(8, 'little'))
+            res.update(part)
+        return res.hexdigest()
+
+    def __file_name__(self, key):
+        return os.path.join(self.path, key + cache_suffix)
+
+    # Чтение записи (None, если запись отсутствует)
+    def get(self, key):
+        name = self.__file_name__(key)
+        try:
+            with open(name, 'rb') as file:
+                data = file.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(name)
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    # Сохранение записи (при ошибке записи выводится предупреждение, расчет продолжается без кэша)
+    def put(self, key, data):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            handle, temp_name = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+            try:
+                with os.fdopen(handle, 'wb') as file:
+                    file.write(data)
+                os.replace(temp_name, self.__file_name__(key))
+            except OSError:
+                os.remove(temp_name)
+                raise
+            self.__evict__()
+        except OSError as err:
+            print('\033[1;31mCache write error: %s\033[1;m' % err)
+
+    # Удаление записи (например, поврежденной)
+    def remove(self, key):
+        try:
+            os.remove(self.__file_name__(key))
+        except OSError:
+            pass
+
+    # Список записей: (время последнего обращения, размер, имя файла)
+    def __entries__(self):
+        res = []
+        try:
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(cache_suffix):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    res.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            pass
+        return res
+
+    # Удаление давно не использовавшихся записей до уменьшения суммарного размера до max_size
+    def __evict__(self):
+        entries = self.__entries__()
+        total = sum(entry[1] for entry in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+            total -= size
+
+    # Суммарный размер записей кэша
+    def size(self):
+        return sum(entry[1] for entry in self.__entries__())
+
+    # Очистка кэша
+    def clear(self):
+        for _, _, name in self.__entries__():
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    # Статистика использования кэша
+    def statistics(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+#   Трансляция дерева разбора R-функции в функцию языка Python
+###################################################################
+
+import math
+import numpy as np
+from tri_tree import TRealNode, TUnaryNode, TBinaryNode, TFunctionNode, visit
+from tri_tree import power, vector_pow, vector_functions, libm
+
+# Версия транслятора (изменяется при изменении генерируемого кода - для проверки кэшированных функций)
+compiler_version = 1
+
+# Имена аргументов генерируемой функции
+arg_names = ['x', 'y', 'z']
+
+# Шаблоны бинарных операций (скалярный и векторный варианты)
+scalar_operations = {
+    '+': '{0} + {1}',
+    '-': '{0} - {1}',
+    '*': '{0}*{1}',
+    '/': '{0}/{1}',
+    '^': 'pow({0}, {1})',
+    '=': '1 if {0} == {1} else 0',
+    '<>': '0 if {0} == {1} else 1',
+    '<': '1 if {0} < {1} else 0',
+    '<=': '1 if {0} <= {1} else 0',
+    '>': '1 if {0} > {1} else 0',
+    '>=': '1 if {0} >= {1} else 0',
+    'or': '{0} + {1} + sqrt({0}*{0} + {1}*{1})',
+    'and': '{0} + {1} - sqrt({0}*{0} + {1}*{1})'
+}
+vector_operations = dict(scalar_operations)
+vector_operations.update({
+    '=': 'where({0} == {1}, 1.0, 0.0)',
+    '<>': 'where({0} == {1}, 0.0, 1.0)',
+    '<': 'where({0} < {1}, 1.0, 0.0)',
+    '<=': 'where({0} <= {1}, 1.0, 0.0)',
+    '>': 'where({0} > {1}, 1.0, 0.0)',
+    '>=': 'where({0} >= {1}, 1.0, 0.0)'
+})
+
+# Функции, доступные генерируемому коду (скалярный и векторный варианты)
+scalar_names = {
+    'pow': power,
+    'sqrt': math.sqrt,
+    'abs': math.fabs,
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'exp': math.exp,
+    'asin': math.asin,
+    'acos': math.acos,
+    'atan': math.atan,
+    'sinh': math.sinh,
+    'cosh': math.cosh,
+    'tanh': math.tanh,
+    'atan2': math.atan2
+}
+# Операции, вычисляемые на этапе трансляции (свертка констант)
+fold_operations = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a*b,
+    '/': lambda a, b: a/b,
+    '^': power,
+    '=': lambda a, b: 1 if a == b else 0,
+    '<>': lambda a, b: 0 if a == b else 1,
+    '<': lambda a, b: 1 if a < b else 0,
+    '<=': lambda a, b: 1 if a <= b else 0,
+    '>': lambda a, b: 1 if a > b else 0,
+    '>=': lambda a, b: 1 if a >= b else 0,
+    'or': lambda a, b: a + b + math.sqrt(a*a + b*b),
+    'and': lambda a, b: a + b - math.sqrt(a*a + b*b)
+}
+
+vector_names = dict(vector_functions)
+vector_names.update({
+    'pow': vector_pow,
+    'sqrt': np.sqrt,
+    'where': np.where
+})
+
+
+# Частное n/s, равное нулю при s = 0 (производные R-операций в точке a = b = 0)
+def vector_rdiv(n, s):
+    n, s = np.broadcast_arrays(np.asarray(n, dtype=np.float64), np.asarray(s, dtype=np.float64))
+    return np.divide(n, s, out=np.zeros(n.shape), where=s != 0)
+
+
+# Функции, дополнительно используемые при вычислении производных
+scalar_names.update({
+    'log': math.log,
+    'sign': lambda a: float((a > 0) - (a < 0)),
+    'rdiv': lambda n, s: n/s if s else 0.0
+})
+vector_names.update({
+    'log': libm(math.log),
+    'sign': np.sign,
+    'rdiv': vector_rdiv
+})
+
+
+# Класс, транслирующий дерево разбора области в одну функцию f(x, y, z)
+class TCompiler:
+    def __init__(self, vector=False):
+        self.__vector__ = vector        # Признак генерации векторного (NumPy) варианта функции
+        self.__lines__ = []             # Операторы тела функции
+        self.__names__ = {}             # Используемые функции и нечисловые константы
+        self.__count__ = 0              # Счетчик временных переменных
+        self.__exprs__ = {}             # Уже вычисленные выражения (исключение общих подвыражений)
+        self.__consts__ = {}            # Значения констант, известных на этапе трансляции
+        self.source = ''                # Текст сгенерированной функции
+        self.code = None                # ... и ее байт-код
+
+    # Трансляция области (подобласти) в функцию
+    def compile(self, domain):
+        self.__lines__ = []
+        self.__names__ = {}
+        self.__count__ = 0
+        self.__exprs__ = {}
+        self.__consts__ = {}
+        bind = {}
+        arg_list = list(domain.arguments.keys())
+        for i in range(0, len(arg_list)):
+            bind[id(domain.arguments[arg_list[i]])] = self.__argument__(i)
+        res = self.__result__(visit(domain.result, bind, self.__visit_node__))
+        names = sorted(self.__names__.keys())
+        header = 'def domain(x, y, z=0.0'
+        if len(names):
+            header += ', *, ' + ', '.join(name + '=' + name for name in names)
+        self.source = ''.join([header + '):\n'] + ['    ' + line + '\n' for line in self.__lines__] +
+                              ['    return ' + res + '\n'])
+        self.code = compile(self.source, '<domain ' + domain.name + '>', 'exec')
+        namespace = dict(self.__names__)
+        exec(self.code, namespace)
+        return namespace['domain']
+
+    # Описание последней транслированной функции для сохранения (например, в кэше): байт-код и имена, доступные
+    # ему (для констант - их значения, для функций - None)
+    def export(self):
+        names = self.__names__.items()
+        return self.code, {name: float(val) if isinstance(val, float) else None for name, val in names}
+
+    # Создание функции по байт-коду и описанию имен, полученным export
+    def load(self, code, names):
+        namespace = {}
+        for name, val in names.items():
+            if val is None:
+                val = vector_names[name] if self.__vector__ else scalar_names[name]
+            namespace[name] = val
+        exec(code, namespace)
+        return namespace['domain']
+
+    # Аргумент i генерируемой функции
+    def __argument__(self, i):
+        return arg_names[i]
+
+    # Возвращаемое генерируемой функцией выражение
+    def __result__(self, res):
+        return res
+
+    # Регистрация имени, доступного генерируемому коду
+    def __use__(self, name, val=None):
+        if val is None:
+            val = vector_names[name] if self.__vector__ else scalar_names[name]
+        self.__names__[name] = val
+        return name
+
+    # Добавление оператора присваивания временной переменной (повторно вычисляемые выражения не дублируются)
+    def __emit__(self, exp):
+        if exp in self.__exprs__:
+            return self.__exprs__[exp]
+        name = 't' + str(self.__count__)
+        self.__count__ += 1
+        self.__lines__.append(name + ' = ' + exp)
+        self.__exprs__[exp] = name
+        return name
+
+    # Числовая константа
+    def __constant__(self, val):
+        if math.isfinite(val):
+            name = repr(val)
+        else:
+            name = self.__use__('c' + str(len(self.__names__)), val)
+        self.__consts__[name] = val
+        return name
+
+    # Проверка, является ли операнд заданной константой (с учетом знака нуля)
+    def __is_constant__(self, name, val):
+        return name in self.__consts__ and self.__consts__[name] == val and \
+            math.copysign(1, self.__consts__[name]) == math.copysign(1, val)
+
+    # Свертка операции над константами (None, если операнды не константы или операция не выполнима)
+    def __fold__(self, func, *args):
+        for arg in args:
+            if arg not in self.__consts__:
+                return None
+        try:
+            return self.__constant__(func(*[self.__consts__[arg] for arg in args]))
+        except (ArithmeticError, ValueError):
+            return None
+
+    # Трансляция узла дерева над уже транслированными операндами args (дерево обходится функцией visit с учетом
+    # общих узлов)
+    def __visit_node__(self, node, args):
+        return self.__operation__(node, args)
+
+    # Трансляция операции узла над уже транслированными операндами args
+    def __operation__(self, node, args):
+        if isinstance(node, TRealNode):
+            return self.__constant__(node.__val__)
+        elif isinstance(node, TUnaryNode):
+            val = args[0]
+            res = self.__fold__((lambda a: +a) if node.__op__ == '+' else (lambda a: -a), val)
+            return res if res is not None else self.__emit__(('+' if node.__op__ == '+' else '-') + val)
+        elif isinstance(node, TBinaryNode):
+            left, right = args
+            res = self.__fold__(fold_operations[node.__op__], left, right)
+            if res is not None:
+                return res
+            # Тождества, не изменяющие результат ни в одном бите: x - 0, x*1, 1*x, x/1
+            if (node.__op__ == '-' or node.__op__ == '*' or node.__op__ == '/') and \
+                    self.__is_constant__(right, 0.0 if node.__op__ == '-' else 1.0):
+                return left
+            if node.__op__ == '*' and self.__is_constant__(left, 1.0):
+                return right
+            if node.__op__ == '^' and self.__is_constant__(right, 2.0):
+                return self.__emit__(left + '*' + left)
+            elif node.__op__ == '^' and self.__is_constant__(right, 0.5):
+                return self.__emit__(self.__use__('sqrt') + '(' + left + ')')
+            elif node.__op__ == '^':
+                self.__use__('pow')
+            elif node.__op__ == 'or' or node.__op__ == 'and':
+                self.__use__('sqrt')
+            elif self.__vector__ and node.__op__ in ['=', '<>', '<', '<=', '>', '>=']:
+                self.__use__('where')
+            template = vector_operations[node.__op__] if self.__vector__ else scalar_operations[node.__op__]
+            return self.__emit__(template.format(left, right))
+        elif isinstance(node, TFunctionNode):
+            res = self.__fold__(scalar_names[node.__func__], *args)
+            if res is not None:
+                return res
+            return self.__emit__(self.__use__(node.__func__) + '(' + ', '.join(args) + ')')
+
+
+# Класс, транслирующий дерево разбора области в функцию f(x, y, z), возвращающую значение R-функции и ее
+# частные производные по x и y (прямое автоматическое дифференцирование: для каждого узла вычисляются значение
+# и две производные, значение вычисляется тем же кодом, что и в TCompiler)
+class TGradientCompiler(TCompiler):
+    def __argument__(self, i):
+        zero = self.__constant__(0.0)
+        one = self.__constant__(1.0)
+        return arg_names[i], one if i == 0 else zero, one if i == 1 else zero
+
+    def __result__(self, res):
+        return ', '.join(res)
+
+    def __visit_node__(self, node, args):
+        val = self.__operation__(node, [arg[0] for arg in args])
+        return val, self.__derivative__(node, val, args, 1), self.__derivative__(node, val, args, 2)
+
+    # Проверка, является ли операнд нулевой константой
+    def __is_zero__(self, name):
+        return name in self.__consts__ and self.__consts__[name] == 0
+
+    # Операции над производными с упрощением нулевых и единичных множителей
+    def __d_add__(self, a, b):
+        if self.__is_zero__(a):
+            return b
+        if self.__is_zero__(b):
+            return a
+        res = self.__fold__(fold_operations['+'], a, b)
+        return res if res is not None else self.__emit__(a + ' + ' + b)
+
+    def __d_sub__(self, a, b):
+        if self.__is_zero__(b):
+            return a
+        if self.__is_zero__(a):
+            return self.__d_neg__(b)
+        res = self.__fold__(fold_operations['-'], a, b)
+        return res if res is not None else self.__emit__(a + ' - ' + b)
+
+    def __d_neg__(self, a):
+        res = self.__fold__(lambda v: -v, a)
+        return res if res is not None else self.__emit__('-' + a)
+
+    def __d_mul__(self, a, b):
+        if self.__is_zero__(a) or self.__is_zero__(b):
+            return self.__constant__(0.0)
+        if self.__is_constant__(a, 1.0):
+            return b
+        if self.__is_constant__(b, 1.0):
+            return a
+        res = self.__fold__(fold_operations['*'], a, b)
+        return res if res is not None else self.__emit__(a + '*' + b)
+
+    def __d_div__(self, a, b):
+        if self.__is_zero__(a):
+            return self.__constant__(0.0)
+        res = self.__fold__(fold_operations['/'], a, b)
+        return res if res is not None else self.__emit__(a + '/' + b)
+
+    # Вызов функции func с аргументами args
+    def __apply__(self, func, *args):
+        res = self.__fold__(scalar_names[func], *args)
+        return res if res is not None else self.__emit__(self.__use__(func) + '(' + ', '.join(args) + ')')
+
+    # Производная узла по аргументу k (1 - x, 2 - y); val - значение узла, args - транслированные операнды
+    # (значение и производные каждого)
+    def __derivative__(self, node, val, args, k):
+        if isinstance(node, TRealNode):
+            return self.__constant__(0.0)
+        elif isinstance(node, TUnaryNode):
+            return args[0][k] if node.__op__ == '+' else self.__d_neg__(args[0][k])
+        elif isinstance(node, TBinaryNode):
+            a, da = args[0][0], args[0][k]
+            b, db = args[1][0], args[1][k]
+            if node.__op__ == '+':
+                return self.__d_add__(da, db)
+            elif node.__op__ == '-':
+                return self.__d_sub__(da, db)
+            elif node.__op__ == '*':
+                return self.__d_add__(self.__d_mul__(da, b), self.__d_mul__(a, db))
+            elif node.__op__ == '/':
+                return self.__d_div__(self.__d_sub__(da, self.__d_mul__(val, db)), b)
+            elif node.__op__ == '^':
+                res = self.__constant__(0.0)
+                if not self.__is_zero__(da):
+                    if self.__is_constant__(b, 2.0):
+                        factor = self.__d_mul__(self.__constant__(2.0), a)
+                    elif self.__is_constant__(b, 0.5):
+                        factor = self.__d_div__(self.__constant__(0.5), val)
+                    elif b in self.__consts__:
+                        factor = self.__d_mul__(b, self.__apply__('pow', a, self.__constant__(self.__consts__[b] - 1)))
+                    else:
+                        factor = self.__d_mul__(b, self.__apply__('pow', a, self.__d_sub__(b, self.__constant__(1.0))))
+                    res = self.__d_mul__(factor, da)
+                if not self.__is_zero__(db):
+                    res = self.__d_add__(res, self.__d_mul__(self.__d_mul__(val, self.__apply__('log', a)), db))
+                return res
+            elif node.__op__ == 'or' or node.__op__ == 'and':
+                if self.__is_zero__(da) and self.__is_zero__(db):
+                    return self.__constant__(0.0)
+                s = self.__apply__('sqrt', self.__emit__(a + '*' + a + ' + ' + b + '*' + b))
+                d = self.__apply__('rdiv', self.__d_add__(self.__d_mul__(a, da), self.__d_mul__(b, db)), s)
+                return self.__d_add__(self.__d_add__(da, db), d if node.__op__ == 'or' else self.__d_neg__(d))
+            # Сравнения кусочно-постоянны
+            return self.__constant__(0.0)
+        elif isinstance(node, TFunctionNode):
+            a, da = args[0][0], args[0][k]
+            if node.__func__ == 'atan2':
+                b, db = args[1][0], args[1][k]
+                if self.__is_zero__(da) and self.__is_zero__(db):
+                    return self.__constant__(0.0)
+                return self.__d_div__(self.__d_sub__(self.__d_mul__(b, da), self.__d_mul__(a, db)),
+                                      self.__emit__(a + '*' + a + ' + ' + b + '*' + b))
+            if self.__is_zero__(da):
+                return self.__constant__(0.0)
+            one = self.__constant__(1.0)
+            if node.__func__ == 'abs':
+                factor = self.__apply__('sign', a)
+            elif node.__func__ == 'sin':
+                factor = self.__apply__('cos', a)
+            elif node.__func__ == 'cos':
+                factor = self.__d_neg__(self.__apply__('sin', a))
+            elif node.__func__ == 'tan':
+                factor = self.__d_add__(one, self.__d_mul__(val, val))
+            elif node.__func__ == 'exp':
+                factor = val
+            elif node.__func__ == 'asin' or node.__func__ == 'acos':
+                factor = self.__d_div__(one, self.__apply__('sqrt', self.__d_sub__(one, self.__d_mul__(a, a))))
+                factor = factor if node.__func__ == 'asin' else self.__d_neg__(factor)
+            elif node.__func__ == 'atan':
+                factor = self.__d_div__(one, self.__d_add__(one, self.__d_mul__(a, a)))
+            elif node.__func__ == 'sinh':
+                factor = self.__apply__('cosh', a)
+            elif node.__func__ == 'cosh':
+                factor = self.__apply__('sinh', a)
+            else:
+                factor = self.__d_sub__(one, self.__d_mul__(val, val))
+            return self.__d_mul__(factor, da)
@@ -14,6 +14,10 @@ class TDomain:
         self.arguments = {}         # Таблица аргументов (координат)
         self.variables = {}         # Таблица переменных
         self.result = TTree()       # Дерево разбора функционального выражения, описывающего object
+        self.function = None        # Функция f(x, y, z), полученная трансляцией дерева разбора
+        self.function_many = None   # ... и ее векторный (NumPy) вариант
+        self.gradient = None        # Функция, возвращающая значение f и частные производные df/dx, df/dy
+        self.gradient_many = None   # ... и ее векторный (NumPy) вариант
 
     def set_name(self, name):
         self.name = name
@@ -34,4 +38,24 @@ class TDomain:
         self.variables[name] = value
 
     def set_result(self, value):
-        self.result = value
\ No newline at end of file
+        self.result = value
+
+    def set_function(self, function, function_many):
+        self.function = function
+        self.function_many = function_many
+
+    def set_gradient(self, gradient, gradient_many):
+        self.gradient = gradient
+        self.gradient_many = gradient_many
+
+    # Кадр вычисления: значения аргументов области по id их деревьев разбора
+    def frame(self, x, y, z=0.0):
+        return {id(arg): val for arg, val in zip(self.arguments.values(), (x, y, z))}
+
+    # Вычисление функции интерпретацией дерева разбора (без изменения его узлов)
+    def value(self, x, y, z=0.0):
+        return self.result.value(self.frame(x, y, z))
+
+    # ... и для массивов координат
+    def vector(self, xs, ys, zs=0.0):
+        return self.result.vector(self.frame(xs, ys, zs))
@@ -6,8 +6,10 @@
 
 
 class TException(Exception):
-    def __init__(self, e):
+    def __init__(self, e, line=0, col=0):
         self.error = e
+        self.line = line        # Номер строки и столбца исходного текста, в которых обнаружена ошибка (0 - неизвестны)
+        self.col = col          # ...
 
     def print_error(self):
         err_msg = '\nError: '
@@ -39,6 +41,12 @@ class TException(Exception):
             err_msg += 'incorrect domain/subdomain block'
         elif self.error == 'redefinition_domain_err':
             err_msg += 'redefinition domain/subdomain block'
+        elif self.error == 'root_method_err':
+            err_msg += 'unknown root finding method'
+        elif self.error == 'unknown_format_err':
+            err_msg += 'unknown mesh file format'
         else:
             err_msg += self.error
+        if self.line:
+            err_msg += ' (line %d, column %d)' % (self.line, self.col)
         print('\033[1;31m%s\033[1;m' % err_msg)
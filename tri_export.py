@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+####################################################################
+#   Сохранение и загрузка сеток: архив NumPy (.npz), массивы,
+#   отображаемые в память (.raw), форматы VTK и Gmsh
+####################################################################
+
+import json
+import os
+import zipfile
+import numpy as np
+from tri_error import TException
+
+# Сигнатура и версия формата массивов, отображаемых в память
+raw_signature = b'PYTRIRAW'
+raw_version = 1
+# Выравнивание данных массивов в файле формата .raw (в байтах)
+raw_alignment = 64
+# Количество строк, записываемых за один раз в потоковых форматах (VTK, Gmsh)
+chunk_rows = 1 << 16
+# Типы ячеек VTK: отрезок и треугольник
+vtk_line = 3
+vtk_triangle = 5
+# Структура ГЭ сетки, загруженной из файла формата VTK или Gmsh: вершины и номер контура
+loaded_be_type = np.dtype([('v1', np.int32), ('v2', np.int32), ('loop', np.int32)])
+# Форматы файлов сеток по расширению имени
+mesh_formats = {
+    '.npz': 'npz',
+    '.raw': 'raw',
+    '.vtk': 'vtk',
+    '.msh': 'gmsh'
+}
+
+
+# Класс, описывающий сетку: узлы x (N x 2), КЭ fe (M x 3), ГЭ be (структуры be_type или массив, первые два
+# столбца которого - вершины) и соседи КЭ neighbors (M x 3, может отсутствовать). Массивы загруженной сетки
+# отображаются в память и читаются с диска по мере обращения к ним
+class TMesh:
+    def __init__(self, x, fe, be, neighbors=None):
+        self.x = x
+        self.fe = fe
+        self.be = be
+        self.neighbors = neighbors
+
+    # Сетка по массивам или спискам (в том числе в представлении TTri.get_lists: лишние столбцы КЭ и ГЭ
+    # отбрасываются)
+    @staticmethod
+    def from_arrays(x, fe, be):
+        fe = np.asarray(fe, dtype=np.int64)
+        be = np.asarray(be)
+        if be.dtype.names is None:
+            be = be[:, :2].astype(np.int64) if be.ndim == 2 else np.zeros((0, 2), dtype=np.int64)
+        return TMesh(np.asarray(x, dtype=np.float64).reshape(-1, 2), fe[:, :3] if fe.ndim == 2 else fe.reshape(0, 3),
+                     be)
+
+    # Вершины ГЭ (K x 2)
+    def boundary_edges(self):
+        if self.be.dtype.names is not None:
+            return np.column_stack((self.be['v1'], self.be['v2']))
+        return np.asarray(self.be)[:, :2]
+
+    # Ребра КЭ без повторов (E x 2, меньший номер вершины первым)
+    def edges(self):
+        fe = np.asarray(self.fe, dtype=np.int64)
+        n = max(len(self.x), 1)
+        res = np.sort(fe[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        # Совпадающие ребра удаляются сортировкой ключей (быстрее np.unique на больших сетках)
+        res = np.sort(res[:, 0]*n + res[:, 1])
+        res = res[np.concatenate(([True], res[1:] != res[:-1]))] if len(res) else res
+        return np.column_stack((res//n, res % n))
+
+    # Номера контуров ГЭ (0, если они не заданы)
+    def boundary_loops(self):
+        if self.be.dtype.names is not None and 'loop' in self.be.dtype.names:
+            return np.asarray(self.be['loop'])
+        return np.zeros(len(self.be), dtype=np.int32)
+
+    # Массивы сетки по именам (отсутствующие не включаются)
+    def arrays(self):
+        res = {'x': self.x, 'fe': self.fe, 'be': self.be}
+        if self.neighbors is not None:
+            res['neighbors'] = self.neighbors
+        return res
+
+    # Сохранение в файл; формат задается явно ('npz', 'raw', 'vtk', 'gmsh') или определяется по расширению имени
+    def save(self, file_name, fmt=None):
+        if fmt is None:
+            fmt = mesh_formats.get(os.path.splitext(file_name)[1].lower())
+        if fmt == 'npz':
+            self.save_npz(file_name)
+        elif fmt == 'raw':
+            self.save_raw(file_name)
+        elif fmt == 'vtk':
+            self.save_vtk(file_name)
+        elif fmt == 'gmsh':
+            self.save_gmsh(file_name)
+        else:
+            raise TException('unknown_format_err')
+
+    # Архив NumPy без сжатия (массивы архива могут быть отображены в память при загрузке)
+    def save_npz(self, file_name, compressed=False):
+        with open(file_name, 'wb') as file:
+            if compressed:
+                np.savez_compressed(file, **self.arrays())
+            else:
+                np.savez(file, **self.arrays())
+
+    # Массивы, отображаемые в память: сигнатура, длина заголовка (8 байт), заголовок JSON (имя, тип, размерность
+    # и смещение каждого массива), данные массивов в порядке C, выровненные по границе raw_alignment байт
+    def save_raw(self, file_name):
+        arrays = [(name, np.asarray(val)) for name, val in self.arrays().items()]
+        table = []
+        for name, val in arrays:
+            table.append({'name': name, 'descr': np.lib.format.dtype_to_descr(val.dtype), 'shape': list(val.shape),
+                          'offset': 0})
+        # Смещения массивов зависят от длины заголовка, а она - от записи смещений: длина увеличивается
+        # (заголовок дополняется пробелами), пока заголовок с вычисленными смещениями в нее не поместится
+        size = 0
+        while True:
+            offset = self.__align__(len(raw_signature) + 8 + size)
+            for item, (_, val) in zip(table, arrays):
+                item['offset'] = offset
+                offset = self.__align__(offset + val.nbytes)
+            header = json.dumps({'version': raw_version, 'arrays': table}).encode('utf-8')
+            if len(header) <= size:
+                break
+            size = self.__align__(len(header))
+        with open(file_name, 'wb') as file:
+            file.write(raw_signature)
+            file.write(size.to_bytes(8, 'little'))
+            file.write(header.ljust(size))
+            for item, (_, val) in zip(table, arrays):
+                file.write(b'\0'*(item['offset'] - file.tell()))
+                self.__write_chunks__(file, val, lambda chunk: np.ascontiguousarray(chunk).tobytes())
+
+    @staticmethod
+    def __align__(offset):
+        return (offset + raw_alignment - 1)//raw_alignment*raw_alignment
+
+    # Запись строк массива частями по chunk_rows: convert - преобразование части в байты
+    @staticmethod
+    def __write_chunks__(file, val, convert):
+        for k in range(0, len(val), chunk_rows):
+            file.write(convert(val[k:k + chunk_rows]))
+
+    # Запись частей массива в текстовом виде
+    @staticmethod
+    def __write_text__(file, val, fmt):
+        for k in range(0, len(val), chunk_rows):
+            np.savetxt(file, val[k:k + chunk_rows], fmt=fmt)
+
+    # Формат VTK (legacy, неструктурированная сетка): треугольники и граничные отрезки; номер контура отрезка
+    # записывается в данные ячеек (loop, -1 для треугольников). Данные записываются частями, без построения
+    # текста (массива) всего файла
+    def save_vtk(self, file_name, binary=True):
+        x = np.asarray(self.x)
+        fe = np.asarray(self.fe)
+        edges = self.boundary_edges()
+        count = len(fe) + len(edges)
+        with open(file_name, 'wb') as file:
+            file.write(('# vtk DataFile Version 3.0\nR-function mesh\n%s\nDATASET UNSTRUCTURED_GRID\n' %
+                        ('BINARY' if binary else 'ASCII')).encode('ascii'))
+            file.write(('POINTS %d double\n' % len(x)).encode('ascii'))
+            if binary:
+                self.__write_chunks__(file, x, lambda chunk: np.column_stack((chunk, np.zeros(len(chunk))))
+                                      .astype('>f8').tobytes())
+            else:
+                self.__write_text__(file, np.column_stack((x, np.zeros(len(x)))), '%.17g')
+            file.write(('\nCELLS %d %d\n' % (count, 4*len(fe) + 3*len(edges))).encode('ascii'))
+            for val, n in [(fe, 3), (edges, 2)]:
+                if binary:
+                    self.__write_chunks__(file, val, lambda chunk: np.column_stack((np.full(len(chunk), n), chunk))
+                                          .astype('>i4').tobytes())
+                else:
+                    self.__write_text__(file, np.column_stack((np.full(len(val), n), val)), '%d')
+            file.write(('\nCELL_TYPES %d\n' % count).encode('ascii'))
+            self.__write_ints__(file, np.concatenate((np.full(len(fe), vtk_triangle), np.full(len(edges), vtk_line))),
+                                binary)
+            file.write(('\nCELL_DATA %d\nSCALARS loop int 1\nLOOKUP_TABLE default\n' % count).encode('ascii'))
+            self.__write_ints__(file, np.concatenate((np.full(len(fe), -1), self.boundary_loops())), binary)
+            file.write(b'\n')
+
+    # Запись целых чисел в формате VTK (в двоичном виде - 32 бита, старший байт первым)
+    def __write_ints__(self, file, val, binary):
+        if binary:
+            self.__write_chunks__(file, val, lambda chunk: chunk.astype('>i4').tobytes())
+        else:
+            self.__write_text__(file, val, '%d')
+
+    # Формат Gmsh 2.2 (текстовый): узлы, граничные отрезки (физическая группа - номер контура + 1) и треугольники
+    # (физическая группа 1). Данные записываются частями
+    def save_gmsh(self, file_name):
+        x = np.asarray(self.x)
+        fe = np.asarray(self.fe)
+        edges = self.boundary_edges()
+        loop = self.boundary_loops() + 1
+        with open(file_name, 'wb') as file:
+            file.write(b'$MeshFormat\n2.2 0 8\n$EndMeshFormat\n')
+            file.write(('$Nodes\n%d\n' % len(x)).encode('ascii'))
+            for k in range(0, len(x), chunk_rows):
+                chunk = x[k:k + chunk_rows]
+                np.savetxt(file, np.column_stack((np.arange(k + 1, k + len(chunk) + 1), chunk)), fmt='%d %.17g %.17g',
+                           newline=' 0\n')
+            file.write(('$EndNodes\n$Elements\n%d\n' % (len(edges) + len(fe))).encode('ascii'))
+            for k in range(0, len(edges), chunk_rows):
+                n = len(edges[k:k + chunk_rows])
+                index = np.arange(k + 1, k + n + 1)
+                np.savetxt(file, np.column_stack((index, np.full(n, 1), np.full(n, 2), loop[k:k + n], loop[k:k + n],
+                                                  edges[k:k + n] + 1)), fmt='%d')
+            for k in range(0, len(fe), chunk_rows):
+                n = len(fe[k:k + chunk_rows])
+                index = np.arange(len(edges) + k + 1, len(edges) + k + n + 1)
+                np.savetxt(file, np.column_stack((index, np.full(n, 2), np.full(n, 2), np.ones(n, dtype=np.int64),
+                                                  np.ones(n, dtype=np.int64), fe[k:k + n] + 1)), fmt='%d')
+            file.write(b'$EndElements\n')
+
+
+# Восстановление типа массива по описанию dtype_to_descr, прочитанному из JSON (списки вместо кортежей)
+def descr_dtype(descr):
+    return np.lib.format.descr_to_dtype(json_descr(descr))
+
+
+# Описание структуры из JSON: поля (имя, тип[, размерность]) - кортежи, тип поля может быть структурой
+def json_descr(descr):
+    if isinstance(descr, list):
+        return [(item[0], json_descr(item[1])) + tuple(tuple(val) for val in item[2:]) for item in descr]
+    return descr
+
+
+# Загрузка сетки из файла формата .npz, .raw, VTK или Gmsh (формат определяется по началу файла). Массивы файлов
+# .npz и .raw отображаются в память (mmap=True; для архива .npz - если массивы сохранены без сжатия), т.е. читаются
+# с диска по мере обращения к ним
+def load_mesh(file_name, mmap=True):
+    with open(file_name, 'rb') as file:
+        signature = file.read(len(raw_signature))
+    if signature == raw_signature:
+        arrays = load_raw(file_name, mmap)
+    elif signature[:2] == b'PK':
+        arrays = load_npz(file_name, mmap)
+    elif signature.startswith(b'# vtk'):
+        arrays = load_vtk(file_name)
+    elif signature == b'$MeshFor':
+        arrays = load_gmsh(file_name)
+    else:
+        raise TException('unknown_format_err')
+    if 'x' not in arrays or 'fe' not in arrays or 'be' not in arrays:
+        raise TException('read_file_err')
+    return TMesh(arrays['x'], arrays['fe'], arrays['be'], arrays.get('neighbors'))
+
+
+# Массивы файла формата .raw
+def load_raw(file_name, mmap=True):
+    res = {}
+    with open(file_name, 'rb') as file:
+        if file.read(len(raw_signature)) != raw_signature:
+            raise TException('read_file_err')
+        header = json.loads(file.read(int.from_bytes(file.read(8), 'little')).decode('utf-8'))
+        if header.get('version') != raw_version:
+            raise TException('read_file_err')
+        for item in header['arrays']:
+            dtype = descr_dtype(item['descr'])
+            shape = tuple(item['shape'])
+            if not np.prod(shape):
+                res[item['name']] = np.empty(shape, dtype=dtype)
+            elif mmap:
+                res[item['name']] = np.memmap(file_name, dtype=dtype, mode='r', offset=item['offset'], shape=shape)
+            else:
+                file.seek(item['offset'])
+                res[item['name']] = np.fromfile(file, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return res
+
+
+# Массивы архива NumPy: массивы, сохраненные без сжатия, отображаются в память по смещению их данных в архиве
+def load_npz(file_name, mmap=True):
+    res = {}
+    with zipfile.ZipFile(file_name) as archive, open(file_name, 'rb') as file:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if not mmap or info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    res[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+            # Локальный заголовок записи архива: 30 байт, имя и дополнительное поле переменной длины
+            file.seek(info.header_offset + 26)
+            sizes = np.frombuffer(file.read(4), dtype='<u2')
+            file.seek(info.header_offset + 30 + int(sizes[0]) + int(sizes[1]))
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            if dtype.hasobject:
+                raise TException('read_file_err')
+            if not np.prod(shape):
+                res[name] = np.empty(shape, dtype=dtype)
+                continue
+            res[name] = np.memmap(file_name, dtype=dtype, mode='r', offset=file.tell(), shape=shape,
+                                  order='F' if fortran_order else 'C')
+    return res
+
+
+# Массивы сетки формата VTK (legacy, двоичный или текстовый, как записывает TMesh.save_vtk): треугольники - КЭ,
+# отрезки - ГЭ с номерами контуров из данных ячеек loop
+def load_vtk(file_name):
+    x = cells = types = loop = None
+    scalars = None
+    with open(file_name, 'rb') as file:
+        if not file.readline().startswith(b'# vtk'):
+            raise TException('read_file_err')
+        file.readline()
+        binary = file.readline().strip().upper() == b'BINARY'
+        while True:
+            line = file.readline()
+            if not line:
+                break
+            words = line.split()
+            if not len(words):
+                continue
+            if words[0] == b'POINTS':
+                x = vtk_values(file, 3*int(words[1]), '>f8', binary).reshape(-1, 3)[:, :2]
+            elif words[0] == b'CELLS':
+                cells = vtk_values(file, int(words[2]), '>i4', binary)
+            elif words[0] == b'CELL_TYPES':
+                types = vtk_values(file, int(words[1]), '>i4', binary)
+            elif words[0] == b'SCALARS':
+                scalars = words[1]
+            elif words[0] == b'LOOKUP_TABLE' and scalars == b'loop' and types is not None:
+                loop = vtk_values(file, len(types), '>i4', binary)
+    if x is None or cells is None or types is None or not np.isin(types, [vtk_triangle, vtk_line]).all():
+        raise TException('read_file_err')
+    # Ячейка в массиве CELLS - количество вершин и их номера
+    size = np.where(types == vtk_triangle, 4, 3)
+    if size.sum() != len(cells):
+        raise TException('read_file_err')
+    start = np.concatenate(([0], np.cumsum(size)[:-1])).astype(np.int64)
+    is_fe = types == vtk_triangle
+    edges = cells[start[~is_fe][:, np.newaxis] + np.arange(1, 3)]
+    be = np.zeros(len(edges), dtype=loaded_be_type)
+    be['v1'] = edges[:, 0]
+    be['v2'] = edges[:, 1]
+    if loop is not None:
+        be['loop'] = loop[~is_fe]
+    return {'x': x, 'fe': cells[start[is_fe][:, np.newaxis] + np.arange(1, 4)], 'be': be}
+
+
+# Чтение count чисел типа dtype из файла VTK: в двоичном виде - подряд, в текстовом - из строк файла
+def vtk_values(file, count, dtype, binary):
+    dtype = np.dtype(dtype)
+    if binary:
+        data = file.read(count*dtype.itemsize)
+        if len(data) != count*dtype.itemsize:
+            raise TException('read_file_err')
+        return np.frombuffer(data, dtype=dtype).astype(dtype.newbyteorder('='))
+    res = []
+    size = 0
+    while size < count:
+        line = file.readline()
+        if not line:
+            raise TException('read_file_err')
+        res.append(np.array(line.split(), dtype=np.float64 if dtype.kind == 'f' else np.int64))
+        size += len(res[-1])
+    if size != count:
+        raise TException('read_file_err')
+    return np.concatenate(res).astype(dtype.newbyteorder('=')) if len(res) else np.empty(0, dtype.newbyteorder('='))
+
+
+# Массивы сетки формата Gmsh 2.2 (текстовый, как записывает TMesh.save_gmsh): треугольники - КЭ, отрезки - ГЭ
+# с номерами контуров по физическим группам (номер группы - 1)
+def load_gmsh(file_name):
+    ids = x = None
+    fe, edges, loop = [], [], []
+    with open(file_name, 'rb') as file:
+        while True:
+            line = file.readline()
+            if not line:
+                break
+            line = line.strip()
+            if line == b'$Nodes':
+                n = int(file.readline())
+                nodes = np.loadtxt([file.readline() for _ in range(0, n)], ndmin=2) if n else np.empty((0, 4))
+                ids = nodes[:, 0].astype(np.int64)
+                x = nodes[:, 1:3]
+            elif line == b'$Elements':
+                for _ in range(0, int(file.readline())):
+                    words = file.readline().split()
+                    kind, tags = int(words[1]), int(words[2])
+                    if kind == 2:
+                        fe.append([int(w) for w in words[3 + tags:6 + tags]])
+                    elif kind == 1:
+                        edges.append([int(w) for w in words[3 + tags:5 + tags]])
+                        loop.append(int(words[3]) - 1 if tags else 0)
+    if x is None:
+        raise TException('read_file_err')
+    # Номера узлов файла заменяются их порядковыми номерами
+    order = np.argsort(ids, kind='stable')
+    fe = order[np.searchsorted(ids[order], np.array(fe, dtype=np.int64).reshape(-1, 3))]
+    edges = order[np.searchsorted(ids[order], np.array(edges, dtype=np.int64).reshape(-1, 2))]
+    be = np.zeros(len(edges), dtype=loaded_be_type)
+    be['v1'] = edges[:, 0]
+    be['v2'] = edges[:, 1]
+    be['loop'] = loop
+    return {'x': x, 'fe': fe, 'be': be}
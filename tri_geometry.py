@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+####################################################################
+#   Геометрические характеристики треугольников и граничных
+#   сегментов, вычисляемые сразу для всей сетки
+####################################################################
+
+import numpy as np
+
+
+# Класс, вычисляющий геометрические характеристики треугольников сетки (все величины - массивы по треугольникам).
+# Ребро k треугольника - отрезок (triangles[i][k], triangles[i][(k + 1) % 3])
+class TGeometry:
+    def __init__(self, x, triangles):
+        self.x = np.asarray(x, dtype=np.float64).reshape(-1, 2)
+        self.triangles = np.asarray(triangles).reshape(-1, 3)
+        self.__p__ = self.x[self.triangles]                             # Координаты вершин (M x 3 x 2)
+        self.__e__ = np.roll(self.__p__, -1, axis=1) - self.__p__       # Векторы ребер (M x 3 x 2)
+        self.__center__ = None
+        self.__radius__ = None
+
+    # Длины ребер (M x 3)
+    def edge_lengths(self):
+        return np.hypot(self.__e__[:, :, 0], self.__e__[:, :, 1])
+
+    # Ориентированные площади (положительные при обходе вершин против часовой стрелки)
+    def areas(self):
+        e0 = self.__e__[:, 0]
+        e2 = self.__e__[:, 2]
+        return (e2[:, 0]*e0[:, 1] - e2[:, 1]*e0[:, 0])/2
+
+    # Центры описанных окружностей (вычисляются относительно первой вершины для уменьшения погрешности)
+    def circumcenters(self):
+        if self.__center__ is None:
+            b = self.__e__[:, 0]
+            c = -self.__e__[:, 2]
+            b2 = (b**2).sum(axis=1)
+            c2 = (c**2).sum(axis=1)
+            d = 2*(b[:, 0]*c[:, 1] - b[:, 1]*c[:, 0])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                u = np.column_stack(((c[:, 1]*b2 - b[:, 1]*c2)/d, (b[:, 0]*c2 - c[:, 0]*b2)/d))
+            # Вырожденный треугольник: центр и радиус бесконечны
+            u[d == 0] = np.inf
+            self.__center__ = self.__p__[:, 0] + u
+            self.__radius__ = np.hypot(u[:, 0], u[:, 1])
+        return self.__center__
+
+    # Радиусы описанных окружностей
+    def circumradii(self):
+        self.circumcenters()
+        return self.__radius__
+
+    # Углы при вершинах в градусах (M x 3, угол k - при вершине k)
+    def angles(self):
+        e = self.__e__
+        f = -np.roll(e, 1, axis=1)
+        cross = e[:, :, 0]*f[:, :, 1] - e[:, :, 1]*f[:, :, 0]
+        dot = (e*f).sum(axis=2)
+        return np.degrees(np.arctan2(np.abs(cross), dot))
+
+    # Отношение радиуса описанной окружности к длине наименьшего ребра (1/sqrt(3) для правильного треугольника)
+    def radius_edge_ratios(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.circumradii()/self.edge_lengths().min(axis=1)
+
+    # Качество треугольников: отношение удвоенного радиуса вписанной окружности к радиусу описанной
+    # (1 - правильный треугольник, 0 - вырожденный)
+    def quality(self):
+        area = np.abs(self.areas())
+        perimeter = self.edge_lengths().sum(axis=1)
+        radius = self.circumradii()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            res = 4*area/(perimeter*radius)
+        res[~np.isfinite(res)] = 0.0
+        return res
+
+    # Длины отрезков (v1, v2)
+    @staticmethod
+    def segment_lengths(x, v1, v2):
+        d = x[v2] - x[v1]
+        return np.hypot(d[:, 0], d[:, 1])
+
+    # Углы в градусах (от 0 до 90) между прямыми, содержащими отрезки (v1, v2) и (w1, w2)
+    @staticmethod
+    def segment_angles(x, v1, v2, w1, w2):
+        a = x[v2] - x[v1]
+        b = x[w2] - x[w1]
+        cross = a[:, 0]*b[:, 1] - a[:, 1]*b[:, 0]
+        dot = a[:, 0]*b[:, 0] + a[:, 1]*b[:, 1]
+        return np.degrees(np.arctan2(np.abs(cross), np.abs(dot)))
+
+    # Углы поворота в градусах (от 0 до 180) при переходе от отрезка (v1, v2) к следующему за ним отрезку (w1, w2)
+    @staticmethod
+    def turn_angles(x, v1, v2, w1, w2):
+        a = x[v2] - x[v1]
+        b = x[w2] - x[w1]
+        cross = a[:, 0]*b[:, 1] - a[:, 1]*b[:, 0]
+        dot = a[:, 0]*b[:, 0] + a[:, 1]*b[:, 1]
+        return np.degrees(np.arctan2(np.abs(cross), dot))
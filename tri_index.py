@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+####################################################################
+#   Пространственный индекс узлов сетки: поиск ближайшего узла,
+#   узлов в окрестности точки и совпадающих узлов
+####################################################################
+
+from scipy.spatial import cKDTree
+import numpy as np
+
+
+# Класс, индексирующий множество точек плоскости (k-d дерево строится заново при изменении множества)
+class TSpatialIndex:
+    def __init__(self, x=None):
+        self.x = None               # Проиндексированные точки
+        self.__tree__ = None        # ... и построенное по ним k-d дерево
+        self.update(np.empty((0, 2)) if x is None else x)
+
+    # Синхронизация индекса с массивом точек (дерево перестраивается, только если массив заменен)
+    def update(self, x):
+        if x is self.x:
+            return
+        self.x = x
+        self.__tree__ = cKDTree(np.asarray(x, dtype=np.float64).reshape(-1, 2)) if len(x) else None
+
+    # Ближайшие к точкам p узлы: расстояния и номера (-1, если индекс пуст)
+    def nearest(self, p):
+        p = np.asarray(p, dtype=np.float64).reshape(-1, 2)
+        if self.__tree__ is None:
+            return np.full(len(p), np.inf), np.full(len(p), -1, dtype=np.int64)
+        dist, index = self.__tree__.query(p)
+        return dist, index.astype(np.int64)
+
+    # Признаки наличия узлов на расстоянии строго меньше r от точек p
+    def within(self, p, r):
+        p = np.asarray(p, dtype=np.float64).reshape(-1, 2)
+        if self.__tree__ is None or not len(p):
+            return np.zeros(len(p), dtype=bool)
+        return self.__tree__.query(p, distance_upper_bound=r)[0] < r
+
+    # Пары (номер точки p, номер узла) для узлов, лежащих внутри окружностей с центрами p и радиусами r
+    def query_radius(self, p, r):
+        p = np.asarray(p, dtype=np.float64).reshape(-1, 2)
+        if self.__tree__ is None or not len(p):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        near = self.__tree__.query_ball_point(p, r)
+        count = np.array([len(index) for index in near], dtype=np.int64)
+        if not count.sum():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.repeat(np.arange(0, len(p)), count), np.concatenate(near).astype(np.int64)
+
+    # Номера узлов, совпадающих (на расстоянии не больше tol) с узлами с меньшими номерами
+    def duplicates(self, tol):
+        if self.__tree__ is None:
+            return np.empty(0, dtype=np.int64)
+        pairs = self.__tree__.query_pairs(tol, output_type='ndarray')
+        return np.unique(pairs.max(axis=1)) if len(pairs) else np.empty(0, dtype=np.int64)
+
+    # Признаки новых точек p: удаленных от проиндексированных узлов и от предшествующих им точек p больше, чем на tol
+    def is_new(self, p, tol):
+        p = np.asarray(p, dtype=np.float64).reshape(-1, 2)
+        res = ~self.within(p, np.nextafter(tol, np.inf))
+        if np.count_nonzero(res) > 1:
+            index = np.nonzero(res)[0]
+            res[index[TSpatialIndex(p[index]).duplicates(tol)]] = False
+        return res
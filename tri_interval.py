@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+#   Интервальное вычисление R-функции: гарантированные границы
+#   значений функции области на прямоугольниках плоскости
+###################################################################
+
+import math
+import numpy as np
+from tri_tree import TRealNode, TUnaryNode, TBinaryNode, TFunctionNode, visit
+
+# Функции, монотонно возрастающие (и убывающие) на всей области определения
+increasing_functions = {
+    'exp': np.exp,
+    'asin': np.arcsin,
+    'atan': np.arctan,
+    'sinh': np.sinh,
+    'tanh': np.tanh
+}
+decreasing_functions = {
+    'acos': np.arccos
+}
+# Области определения функций (аргумент усекается до них)
+function_domains = {
+    'asin': (-1.0, 1.0),
+    'acos': (-1.0, 1.0)
+}
+# Точки максимума и минимума на периоде периодических функций
+periodic_functions = {
+    'sin': (np.sin, math.pi/2, -math.pi/2),
+    'cos': (np.cos, 0.0, math.pi)
+}
+# Максимальное количество прямоугольников на уровне разбиения при поиске габаритов области
+region_cells = 1 << 14
+# Точность габаритов области (доля размера области)
+region_resolution = 64
+
+
+# Округление нижней и верхней границ наружу (на две единицы последнего разряда - с запасом на погрешность
+# функций NumPy); неопределенные значения заменяются бесконечными
+def down(val):
+    val = np.nextafter(np.nextafter(val, -np.inf), -np.inf)
+    return np.where(np.isnan(val), -np.inf, val)
+
+
+def up(val):
+    val = np.nextafter(np.nextafter(val, np.inf), np.inf)
+    return np.where(np.isnan(val), np.inf, val)
+
+
+# Класс, вычисляющий границы значений R-функции области на прямоугольниках [x1, x2] x [y1, y2]
+# (интервалы - пары массивов нижних и верхних границ, вычисляемые сразу для всех прямоугольников)
+class TInterval:
+    def __init__(self, domain):
+        self.__domain__ = domain        # Область (результат разбора последнего блока 'domain')
+
+    # Границы значений R-функции на прямоугольниках
+    def evaluate(self, x1, x2, y1, y2):
+        x = (np.asarray(x1, dtype=np.float64), np.asarray(x2, dtype=np.float64))
+        y = (np.asarray(y1, dtype=np.float64), np.asarray(y2, dtype=np.float64))
+        bind = {}
+        args = [x, y, (np.float64(0.0), np.float64(0.0))]
+        arg_list = list(self.__domain__.arguments.keys())
+        for i in range(0, len(arg_list)):
+            bind[id(self.__domain__.arguments[arg_list[i]])] = args[i]
+        lo, hi = visit(self.__domain__.result, bind, self.__visit_node__)
+        shape = np.broadcast(x[0], x[1], y[0], y[1]).shape
+        return np.broadcast_to(lo, shape).copy(), np.broadcast_to(hi, shape).copy()
+
+    # Признаки прямоугольников, на которых R-функция может обращаться в ноль
+    def has_zero(self, x1, x2, y1, y2):
+        lo, hi = self.evaluate(x1, x2, y1, y2)
+        return (lo <= 0) & (hi >= 0)
+
+    # Габариты области (множества точек, в которых R-функция неотрицательна) в пределах прямоугольника
+    # [min_x, max_x]: прямоугольники, на которых R-функция заведомо отрицательна, отбрасываются, заведомо
+    # неотрицательна - учитываются целиком, остальные делятся на четыре. Возвращается None, если область пуста
+    # или не отделена от границ исходного прямоугольника
+    def bounds(self, min_x, max_x):
+        x1, x2 = np.array([float(min_x[0])]), np.array([float(max_x[0])])
+        y1, y2 = np.array([float(min_x[1])]), np.array([float(max_x[1])])
+        inner = [np.inf, np.inf, -np.inf, -np.inf]     # Габариты заведомо внутренних прямоугольников
+        while True:
+            lo, hi = self.evaluate(x1, x2, y1, y2)
+            inside = lo >= 0
+            keep = (hi >= 0) & ~inside
+            inner = [min(inner[0], x1[inside].min(initial=np.inf)), min(inner[1], y1[inside].min(initial=np.inf)),
+                     max(inner[2], x2[inside].max(initial=-np.inf)), max(inner[3], y2[inside].max(initial=-np.inf))]
+            x1, x2, y1, y2 = x1[keep], x2[keep], y1[keep], y2[keep]
+            box = [min(inner[0], x1.min(initial=np.inf)), min(inner[1], y1.min(initial=np.inf)),
+                   max(inner[2], x2.max(initial=-np.inf)), max(inner[3], y2.max(initial=-np.inf))]
+            if box[0] > box[2]:
+                return None
+            # Запас в размер наименьшего прямоугольника, чтобы граница области не совпадала с границей поиска
+            h = [x2[0] - x1[0], y2[0] - y1[0]] if len(x1) else [0.0, 0.0]
+            if not len(x1) or 4*len(x1) > region_cells or \
+                    max(h) <= min(box[2] - box[0], box[3] - box[1])/region_resolution:
+                if box[0] - h[0] <= min_x[0] or box[1] - h[1] <= min_x[1] or box[2] + h[0] >= max_x[0] or \
+                        box[3] + h[1] >= max_x[1]:
+                    return None
+                return [float(box[0] - h[0]), float(box[1] - h[1])], [float(box[2] + h[0]), float(box[3] + h[1])]
+            xm = (x1 + x2)/2
+            ym = (y1 + y2)/2
+            x1, x2 = np.concatenate((x1, xm, x1, xm)), np.concatenate((xm, x2, xm, x2))
+            y1, y2 = np.concatenate((y1, y1, ym, ym)), np.concatenate((ym, ym, y2, y2))
+
+    # Вычисление узла дерева по интервалам операндов args (дерево обходится функцией visit с учетом общих узлов)
+    def __visit_node__(self, node, args):
+        if isinstance(node, TRealNode):
+            return np.float64(node.__val__), np.float64(node.__val__)
+        elif isinstance(node, TUnaryNode):
+            return args[0] if node.__op__ == '+' else (-args[0][1], -args[0][0])
+        elif isinstance(node, TBinaryNode):
+            left, right = args
+            if node.__op__ == '^':
+                return self.__power__(left, right)
+            if node.__op__ == '*' and node.__left__ is node.__right__:
+                return self.__even_power__(left, 2)
+            return self.__binary__(node.__op__, left, right)
+        elif isinstance(node, TFunctionNode):
+            if node.__func__ == 'atan2':
+                return self.__atan2__(args[0], args[1])
+            return self.__function__(node.__func__, args[0])
+
+    # Бинарные операции
+    def __binary__(self, op, a, b):
+        if op == '+':
+            return down(a[0] + b[0]), up(a[1] + b[1])
+        elif op == '-':
+            return down(a[0] - b[1]), up(a[1] - b[0])
+        elif op == '*':
+            return self.__product__(a, b)
+        elif op == '/':
+            # Делитель, содержащий ноль, дает неограниченный интервал
+            with np.errstate(divide='ignore'):
+                res = self.__product__(a, (down(1.0/b[1]), up(1.0/b[0])))
+            zero = (b[0] <= 0) & (b[1] >= 0)
+            return np.where(zero, -np.inf, res[0]), np.where(zero, np.inf, res[1])
+        elif op == 'or' or op == 'and':
+            # R-конъюнкция и R-дизъюнкция монотонно возрастают по обоим аргументам
+            sgn = 1.0 if op == 'or' else -1.0
+            with np.errstate(invalid='ignore'):
+                return down(a[0] + b[0] + sgn*np.hypot(a[0], b[0])), up(a[1] + b[1] + sgn*np.hypot(a[1], b[1]))
+        # Сравнения: результат 1 или 0, если он одинаков для всех значений аргументов, иначе [0, 1]
+        if op == '<' or op == '>':
+            a, b = (a, b) if op == '<' else (b, a)
+            true, false = a[1] < b[0], a[0] >= b[1]
+        elif op == '<=' or op == '>=':
+            a, b = (a, b) if op == '<=' else (b, a)
+            true, false = a[1] <= b[0], a[0] > b[1]
+        else:
+            true = (a[0] == a[1]) & (b[0] == b[1]) & (a[0] == b[0])
+            false = (a[1] < b[0]) | (b[1] < a[0])
+            if op == '<>':
+                true, false = false, true
+        return np.where(true, 1.0, 0.0), np.where(false, 0.0, 1.0)
+
+    # Произведение интервалов (0*inf считается неопределенным и дает бесконечную границу)
+    @staticmethod
+    def __product__(a, b):
+        with np.errstate(invalid='ignore'):
+            p = [a[0]*b[0], a[0]*b[1], a[1]*b[0], a[1]*b[1]]
+        undefined = np.isnan(p[0]) | np.isnan(p[1]) | np.isnan(p[2]) | np.isnan(p[3])
+        lo = np.minimum(np.minimum(p[0], p[1]), np.minimum(p[2], p[3]))
+        hi = np.maximum(np.maximum(p[0], p[1]), np.maximum(p[2], p[3]))
+        return np.where(undefined, -np.inf, down(lo)), np.where(undefined, np.inf, up(hi))
+
+    # Возведение в четную степень n (наименьшее значение - в ближайшей к нулю точке интервала)
+    @staticmethod
+    def __even_power__(a, n):
+        lo = np.where(a[0] > 0, a[0], np.where(a[1] < 0, -a[1], 0.0))
+        hi = np.maximum(-a[0], a[1])
+        with np.errstate(over='ignore'):
+            return np.maximum(down(lo**n), 0.0), up(hi**n)
+
+    # Возведение в степень: целые и половинные показатели - по свойствам соответствующих функций,
+    # остальные - по значениям в вершинах прямоугольника (при положительном основании)
+    def __power__(self, a, b):
+        n = float(b[0]) if np.ndim(b[0]) == 0 and np.ndim(b[1]) == 0 and b[0] == b[1] else None
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            if n == 0.5:
+                return down(np.sqrt(np.maximum(a[0], 0.0))), up(np.sqrt(np.maximum(a[1], 0.0)))
+            if n is not None and abs(n) < 1 << 31 and n == int(n):
+                k = int(abs(n))
+                if k % 2 == 0:
+                    res = self.__even_power__(a, k)
+                else:
+                    res = down(a[0]**k), up(a[1]**k)
+                return res if n >= 0 else self.__binary__('/', (np.float64(1.0), np.float64(1.0)), res)
+            p = [a[0]**b[0], a[0]**b[1], a[1]**b[0], a[1]**b[1]]
+            lo = np.minimum(np.minimum(p[0], p[1]), np.minimum(p[2], p[3]))
+            hi = np.maximum(np.maximum(p[0], p[1]), np.maximum(p[2], p[3]))
+        positive = a[0] > 0
+        return np.where(positive, down(lo), -np.inf), np.where(positive, up(hi), np.inf)
+
+    # Встроенные функции одного аргумента
+    def __function__(self, func, a):
+        if func in function_domains:
+            a = np.clip(a[0], *function_domains[func]), np.clip(a[1], *function_domains[func])
+        with np.errstate(over='ignore', invalid='ignore'):
+            if func == 'abs':
+                lo = np.where(a[0] > 0, a[0], np.where(a[1] < 0, -a[1], 0.0))
+                return lo, np.maximum(-a[0], a[1])
+            elif func in increasing_functions:
+                return down(increasing_functions[func](a[0])), up(increasing_functions[func](a[1]))
+            elif func in decreasing_functions:
+                return down(decreasing_functions[func](a[1])), up(decreasing_functions[func](a[0]))
+            elif func == 'cosh':
+                lo = np.where(a[0] > 0, a[0], np.where(a[1] < 0, -a[1], 0.0))
+                return np.maximum(down(np.cosh(lo)), 1.0), up(np.cosh(np.maximum(-a[0], a[1])))
+            elif func == 'tan':
+                # Интервал, содержащий полюс, дает неограниченный результат
+                k1 = np.floor((a[0] - math.pi/2)/math.pi)
+                k2 = np.floor((a[1] - math.pi/2)/math.pi)
+                pole = (k1 != k2) | (a[1] - a[0] >= math.pi) | ~np.isfinite(a[0]) | ~np.isfinite(a[1])
+                return np.where(pole, -np.inf, down(np.tan(a[0]))), np.where(pole, np.inf, up(np.tan(a[1])))
+            return self.__periodic__(a, *periodic_functions[func])
+
+    # Периодические функции: значения на концах интервала, уточненные точками экстремума внутри него
+    @staticmethod
+    def __periodic__(a, func, peak, trough):
+        f1 = func(a[0])
+        f2 = func(a[1])
+        lo = down(np.minimum(f1, f2))
+        hi = up(np.maximum(f1, f2))
+        wide = (a[1] - a[0] >= 2*math.pi) | ~np.isfinite(a[0]) | ~np.isfinite(a[1])
+        # Точка t + 2*pi*k внутри интервала (с запасом на погрешность вычисления номера периода)
+        for t, val in ((peak, 1.0), (trough, -1.0)):
+            k1 = np.ceil((a[0] - t)/(2*math.pi) - 1.0E-12)
+            k2 = np.floor((a[1] - t)/(2*math.pi) + 1.0E-12)
+            inner = wide | (k1 <= k2)
+            if val > 0:
+                hi = np.where(inner, 1.0, hi)
+            else:
+                lo = np.where(inner, -1.0, lo)
+        return np.maximum(lo, -1.0), np.minimum(hi, 1.0)
+
+    # Функция atan2(y, x): если прямоугольник не пересекает разрез (x <= 0, y = 0), экстремумы достигаются
+    # в его вершинах, иначе - [-pi, pi]
+    @staticmethod
+    def __atan2__(y, x):
+        p = [np.arctan2(y[0], x[0]), np.arctan2(y[0], x[1]), np.arctan2(y[1], x[0]), np.arctan2(y[1], x[1])]
+        lo = np.minimum(np.minimum(p[0], p[1]), np.minimum(p[2], p[3]))
+        hi = np.maximum(np.maximum(p[0], p[1]), np.maximum(p[2], p[3]))
+        cut = ~((y[0] > 0) | (y[1] < 0) | (x[0] > 0))
+        return np.where(cut, -np.pi, np.maximum(down(lo), -np.pi)), np.where(cut, np.pi, np.minimum(up(hi), np.pi))
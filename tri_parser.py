@@ -5,9 +5,14 @@
 # Реализация интерпретатора арифметических и логических выражений
 ###################################################################
 
+import re
+import marshal
+import numpy as np
+from importlib.util import MAGIC_NUMBER
 from tri_error import TException
 from tri_tree import TTree
 from tri_domain import TDomain
+from tri_compiler import TCompiler, TGradientCompiler, compiler_version
 
 # Типы лексем
 tokens = [
@@ -66,18 +71,43 @@ statements = [
 ]
 
 
+# Типы лексем, соответствующие зарезервированным словам
+keyword_types = dict([(name, 'function') for name in functions] + [(name, 'delimiter') for name in booleans] +
+                     [(name, 'statement') for name in statements])
+
+# Выделение очередной лексемы: пробелы, конец строки, комментарий (до конца строки), число, идентификатор, разделитель
+# (двойные разделители - операции '>=', '<=', '<>')
+token_pattern = re.compile(r'(?P<space>[ \t\r]+)|(?P<eol>\n)|(?P<comment>#[^\n]*\n?)|'
+                           r'(?P<digit>\d+(?:\.\d*)?(?:[Ee][+-]?\d*)?)|(?P<name>[^\W\d_]\w*)|'
+                           r'(?P<delimiter>>=|<=|<>|[-+*/()^=><,])')
+
+# Допустимая запись порядка числа (знак обязателен)
+exponent_pattern = re.compile(r'[Ee][+-]\d+$')
+
+
 # Класс, реализующий разбор и выполнение арифметических и логических выражений
 class TParser:
     def __init__(self):
         self.is_begin_block = False
         self.error = self.code = self.token = self.token_type = self.current_block_name = ''
         self.domain_list = []
+        self.domain_index = {}      # Номера областей в domain_list по их именам
+        self.pos = 0                # Текущая позиция в тексте code
+        self.line = 1               # Номер текущей строки...
+        self.line_start = 0         # ... и позиция ее начала
+        self.token_pos = 0          # Позиция, номер строки и столбца последней выделенной лексемы
+        self.token_line = 0         # ...
+        self.token_col = 0          # ...
+        self.block_size = 8192      # Размер блока точек при вычислении для массивов координат
+        self.cache = None           # Кэш транслированных функций (TCache; None - трансляция без кэша)
 
     # Задание кода для обработки (массив строк преобразуется в одну строку)
     def set_code(self, c):
-        for i in range(0, len(c)):
-            self.code += c[i]
+        self.code = self.code[self.pos:] + ''.join(c)
+        self.pos = self.line_start = 0
+        self.line = 1
         self.compile()
+        self.translate()
 
     def is_error(self):
         return False if self.error == '' else True
@@ -178,12 +208,7 @@ class TParser:
 
     # Проверка наличия идентификатора в таблице областей (подобластей)
     def find_domain_name(self, name):
-        ret = -1
-        for i in range(0, len(self.domain_list)):
-            if name == self.domain_list[i].name:
-                ret = i
-                break
-        return ret
+        return self.domain_index.get(name, -1)
 
     # Обработка примитива (имени переменной или функции)
     def token_prim(self, result):
@@ -243,122 +268,128 @@ class TParser:
             self.say_error('syntax_err')
         return result
 
-    # Обработка очередной лексемы
+    # Обработка очередной лексемы (лексема выделяется регулярным выражением, начиная с текущей позиции текста)
     def get_token(self):
         self.token_type = self.token = ''
-        # Обработка пустой строки
-        if len(self.code) == 0:
-            self.token = 'end'
-            self.token_type = 'delimiter'
-            return
-        # Пропуск ведущих пробелов и табуляций
-        i = 0
-        while i < len(self.code) and (self.code[i] == ' ' or self.code[i] == '\t'):
-            i += 1
-        self.code = self.code[i:]
-        if len(self.code) == 0:
-            self.token = 'end'
-            self.token_type = 'delimiter'
-            return
-        # Обработка конца строки
-        if len(self.code) and self.code[0] == '\n':
-            self.code = self.code[1:]
-            self.token = 'eol'
-            self.token_type = 'delimiter'
-            return
-        # Пропуск комментариев
-        if self.code[0] == '#':
-            i = 0
-            while i < len(self.code) and self.code[i] != '\n':
-                i += 1
-            i += 1
-            self.code = self.code[i:]
-            self.token = 'eol'
-            self.token_type = 'delimiter'
-            return
-        # Обработка разделителей
-        if '+-*/()^=><,'.find(self.code[0]) != -1:
-            self.token = self.code[0]
-            self.code = self.code[1:len(self.code)]
-            # Проверка на наличие двойного разделителя
-            if len(self.code) and '+-*/()^=><,'.find(self.code[0]) != -1:
-                if self.token + self.code[0] in operations:
-                    self.token += self.code[0]
-                    self.code = self.code[1:len(self.code)]
-            self.token_type = 'delimiter'
-            return
-        # Обработка чисел
-        if self.code[0].isdigit():
-            i = 0
-            while i < len(self.code) and self.code[i].isdigit():
-                i += 1
-            self.token = self.code[0:i] if (i < len(self.code)) else self.code[0:]
-            self.code = self.code[i:]
-            if len(self.code) > 0 and self.code[0] == '.':
-                self.token += '.'
-                self.code = self.code[1:]
-                i = 0
-                while i < len(self.code) and self.code[i].isdigit():
-                    i += 1
-                self.token += self.code[0:i] if (i < len(self.code)) else self.code[0:]
-                self.code = self.code[i:]
-            if len(self.code) > 0 and (self.code[0] == 'E' or self.code[0] == 'e'):
-                self.code = self.code[1:]
-                self.token += 'E'
-                if self.code[0] != '+' and self.code[0] != '-':
-                    self.say_error('syntax_err')
-                self.token += self.code[0]
-                self.code = self.code[1:]
-                i = 0
-                while i < len(self.code) and self.code[i].isdigit():
-                    i += 1
-                self.token += self.code[0:i]
-                self.code = self.code[i:]
-            self.token_type = 'digit'
-            return
-        # Обработка функкций и переменных
-        if self.code[0].isalpha():
-            self.token = self.code[0]
-            self.code = self.code[1:]
-            i = 0
-            while i < len(self.code) and (self.code[i].isalpha() or self.code[i] == '_' or self.code[i].isdigit()):
-                i += 1
-            self.token += self.code[0:i] if (i < len(self.code)) else self.code[0:]
-            self.code = self.code[i:]
-            if self.token in functions or self.find_domain_name(self.token) != -1:
-                self.token_type = 'function'
-            elif self.token in booleans:
+        while True:
+            self.token_pos = self.pos
+            self.token_line = self.line
+            self.token_col = self.pos - self.line_start + 1
+            # Обработка конца текста
+            if self.pos >= len(self.code):
+                self.token = 'end'
+                self.token_type = 'delimiter'
+                return
+            match = token_pattern.match(self.code, self.pos)
+            if match is None:
+                self.say_error('syntax_err')
+            self.pos = match.end()
+            kind = match.lastgroup
+            # Пропуск пробелов и табуляций
+            if kind == 'space':
+                continue
+            # Обработка конца строки (комментарий пропускается вместе с ним)
+            if kind == 'eol' or kind == 'comment':
+                if self.code[self.pos - 1] == '\n':
+                    self.line += 1
+                    self.line_start = self.pos
+                self.token = 'eol'
                 self.token_type = 'delimiter'
-            elif self.token in statements:
-                self.token_type = 'statement'
+                return
+            self.token = match.group()
+            if kind == 'digit':
+                exponent = max(self.token.find('E'), self.token.find('e'))
+                if exponent != -1 and exponent_pattern.match(self.token, exponent) is None:
+                    self.say_error('syntax_err')
+                self.token_type = 'digit'
+            elif kind == 'name':
+                # Обработка функкций и переменных
+                if self.token in self.domain_index:
+                    self.token_type = 'function'
+                else:
+                    self.token_type = keyword_types.get(self.token, 'variable')
             else:
-                self.token_type = 'variable'
+                self.token_type = 'delimiter'
             return
 
-    # Запуск на выполнение
+    # Запуск на выполнение (транслированные функции и деревья разбора при вычислении не изменяются, поэтому
+    # один экземпляр TParser после трансляции может использоваться одновременно несколькими потоками)
     def run(self, x, y, z=0.0):
         i = len(self.domain_list) - 1
         if i < 0:
             self.say_error('domain_err')
-        arg_list = list(self.domain_list[i].arguments.keys())
-        self.domain_list[i].arguments[arg_list[0]].__set__(self.domain_list[i].arguments[arg_list[0]], x)
-        self.domain_list[i].arguments[arg_list[1]].__set__(self.domain_list[i].arguments[arg_list[1]], y)
-        if len(arg_list) > 2:
-            self.domain_list[i].arguments[arg_list[2]].__set__(self.domain_list[i].arguments[arg_list[2]], z)
-        return self.domain_list[i].result.value()
-
-    # Вывод сообщения об ошибке
+        return self.domain_list[i].function(x, y, z)
+
+    # Запуск на выполнение для массивов координат
+    def run_many(self, xs, ys, zs=0.0):
+        i = len(self.domain_list) - 1
+        if i < 0:
+            self.say_error('domain_err')
+        xs, ys, zs = np.broadcast_arrays(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64),
+                                         np.asarray(zs, dtype=np.float64))
+        res = np.empty(xs.shape)
+        out = res.reshape(-1)
+        xs = xs.ravel()
+        ys = ys.ravel()
+        zs = zs.ravel()
+        # Вычисление по частям: промежуточные массивы небольшого размера остаются в кэше процессора
+        for k in range(0, len(out), self.block_size):
+            out[k:k + self.block_size] = self.domain_list[i].function_many(xs[k:k + self.block_size],
+                                                                           ys[k:k + self.block_size],
+                                                                           zs[k:k + self.block_size])
+        return res
+
+    # Значение R-функции и ее частные производные по x и y в точке
+    def gradient(self, x, y, z=0.0):
+        i = len(self.domain_list) - 1
+        if i < 0:
+            self.say_error('domain_err')
+        return self.domain_list[i].gradient(x, y, z)
+
+    # Значения R-функции и ее частных производных по x и y для массивов координат (тремя массивами);
+    # в особых точках производные могут быть бесконечными или неопределенными
+    def gradient_many(self, xs, ys, zs=0.0):
+        i = len(self.domain_list) - 1
+        if i < 0:
+            self.say_error('domain_err')
+        xs, ys, zs = np.broadcast_arrays(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64),
+                                         np.asarray(zs, dtype=np.float64))
+        res = np.empty((3,) + xs.shape)
+        out = res.reshape(3, -1)
+        xs = xs.ravel()
+        ys = ys.ravel()
+        zs = zs.ravel()
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for k in range(0, out.shape[1], self.block_size):
+                val = self.domain_list[i].gradient_many(xs[k:k + self.block_size], ys[k:k + self.block_size],
+                                                        zs[k:k + self.block_size])
+                for j in range(0, 3):
+                    out[j, k:k + self.block_size] = val[j]
+        return res[0], res[1], res[2]
+
+    # Функция, описывающая область (результат трансляции последнего блока 'domain')
+    def get_function(self):
+        if len(self.domain_list) == 0:
+            self.say_error('domain_err')
+        return self.domain_list[len(self.domain_list) - 1].function
+
+    # Описываемая область (последний блок 'domain')
+    def get_domain(self):
+        if len(self.domain_list) == 0:
+            self.say_error('domain_err')
+        return self.domain_list[len(self.domain_list) - 1]
+
+    # Вывод сообщения об ошибке (с номером строки и столбца текущей лексемы)
     def say_error(self, err):
         self.error = err
-        raise TException(self.error)
+        raise TException(self.error, self.token_line, self.token_col)
 
     # Трансляция входнго описания геометрической области
     def compile(self):
-        # Построчная обработка входной спецификации
-        while len(self.code):
-            self.token_type = ''
-            while self.token != 'end':
-                self.get_token()
+        # Построчная обработка входной спецификации (до конца текста)
+        try:
+            self.get_token()
+            while self.token != 'end' or self.token_type != 'delimiter':
                 if self.token_type == 'variable':
                     self.putback()
                     self.assignment()
@@ -371,6 +402,56 @@ class TParser:
                         self.parse_end()
                     elif self.token == 'return':
                         self.parse_return()
+                if self.token != 'end' or self.token_type != 'delimiter':
+                    self.get_token()
+        except TException as err:
+            # Ошибки, обнаруженные при заполнении таблиц области, относятся к текущей лексеме
+            if not err.line:
+                err.line = self.token_line
+                err.col = self.token_col
+            raise
+
+    # Задание кэша транслированных функций
+    def set_cache(self, cache):
+        self.cache = cache
+
+    # Трансляция деревьев разбора всех областей в функции языка Python (байт-код функций сохраняется в кэше
+    # по ключу из версий транслятора и байт-кода Python и текста описания, при повторной трансляции того же текста
+    # загружается из кэша)
+    def translate(self):
+        compilers = [TCompiler(), TCompiler(True), TGradientCompiler(), TGradientCompiler(True)]
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(compiler_version, MAGIC_NUMBER, self.code)
+            if self.__load__(compilers, self.cache.get(key)):
+                return
+        res = []
+        for domain in self.domain_list:
+            functions = []
+            for compiler in compilers:
+                functions.append(compiler.compile(domain))
+                functions.append(compiler.export())
+            domain.set_function(functions[0], functions[2])
+            domain.set_gradient(functions[4], functions[6])
+            res.append([domain.name] + functions[1::2])
+        if key is not None:
+            self.cache.put(key, marshal.dumps(res))
+
+    # Загрузка транслированных функций всех областей из записи кэша data (False, если запись не подходит)
+    def __load__(self, compilers, data):
+        if data is None:
+            return False
+        try:
+            res = marshal.loads(data)
+            if [item[0] for item in res] != [domain.name for domain in self.domain_list]:
+                return False
+            for domain, item in zip(self.domain_list, res):
+                functions = [compiler.load(code, names) for compiler, (code, names) in zip(compilers, item[1:])]
+                domain.set_function(functions[0], functions[1])
+                domain.set_gradient(functions[2], functions[3])
+        except (ValueError, EOFError, TypeError, KeyError, IndexError):
+            return False
+        return True
 
     # Обработка оператора присваивания
     def assignment(self):
@@ -393,8 +474,11 @@ class TParser:
         if self.token != 'eol':
             self.say_error('syntax_err')
 
+    # Возврат последней лексемы (текущая позиция переносится на ее начало)
     def putback(self):
-        self.code = self.token + self.code
+        self.pos = self.token_pos
+        self.line = self.token_line
+        self.line_start = self.token_pos - self.token_col + 1
 
     # Обработка оператора 'domain'
     def parse_domain(self):
@@ -407,10 +491,10 @@ class TParser:
             self.say_error('syntax_err')
         self.current_block_name = self.token
         # Проверяем на переопределение имени
-        for i in range(0, len(self.domain_list)):
-            if self.domain_list[i].name == self.token:
-                self.say_error('redefinition_domain_err')
+        if self.token in self.domain_index:
+            self.say_error('redefinition_domain_err')
         # Добавляем новую область в список
+        self.domain_index[self.token] = len(self.domain_list)
         self.domain_list.append(TDomain())
         self.domain_list[len(self.domain_list) - 1].set_name(self.token)
         self.get_token()
@@ -427,7 +511,7 @@ class TParser:
             self.get_token()
             if self.token != ',' and self.token != ')':
                 self.say_error('syntax_err')
-            if self.code[0] == ')':
+            if self.code[self.pos:self.pos + 1] == ')':
                 break
         if self.token != ')':
             self.say_error('syntax_err')
@@ -9,7 +9,8 @@ import sys
 
 
 class TProgress:
-    def __init__(self):
+    def __init__(self, is_enabled=True):
+        self.__is_enabled__ = is_enabled    # Вывод прогресса (False - расчет выполняется без индикации)
         self.__process_id__ = ''
         self.__process_start__ = 0
         self.__process_stop__ = 0
@@ -21,14 +22,14 @@ class TProgress:
         self.__process_start__ = start
         self.__process_stop__ = stop
         self.__process_old__ = 0
-        if start <= stop:
+        if start <= stop and self.__is_enabled__:
             sys.stdout.write('\r' + self.__process_id__ + ' 0%')
             sys.stdout.flush()
 
     def set_progress(self, current):
         self.__process_current__ = current
         pos = int((100.0*float(self.__process_current__))/float(self.__process_stop__ - self.__process_start__ + 1))
-        if pos == self.__process_old__ or not pos:
+        if pos == self.__process_old__ or not pos or not self.__is_enabled__:
             return
         if pos % 5 == 0:
             sys.stdout.write('\r' + self.__process_id__ + ' ' + str(pos) + '%')
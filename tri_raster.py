@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+####################################################################
+#   Растровое изображение сетки без графического интерфейса:
+#   векторизованная отрисовка средствами NumPy и запись в PNG
+####################################################################
+
+import struct
+import zlib
+import numpy as np
+from tri_export import TMesh
+from tri_geometry import TGeometry
+
+# Цвета (RGB): узлы, КЭ, граница (как в TTriView) и фон
+vertex_color = (255, 0, 0)
+fe_color = (0, 0, 0)
+be_color = (0, 0, 255)
+background_color = (255, 255, 255)
+# Шкала цветов заливки КЭ по качеству: значения качества (0 - вырожденный треугольник, 1 - правильный) и цвета
+quality_scale = [0.0, 0.5, 1.0]
+quality_colors = [(215, 48, 39), (254, 224, 139), (26, 152, 80)]
+# Доля изображения, занимаемая сеткой
+view_fill = 0.9
+# Радиус изображения узла (в пикселях)
+vertex_radius = 2
+# Максимальное количество пикселей (узлов, строк треугольников при заливке), обрабатываемых за один раз
+chunk_pixels = 1 << 22
+# Уровень сжатия PNG (0 - 9)
+png_level = 6
+# Сигнатура файла PNG
+png_signature = b'\x89PNG\r\n\x1a\n'
+
+
+# Класс, строящий растровое изображение сетки width x height: заливка КЭ по качеству (если задана), узлы, КЭ и
+# граница. Сетка вписывается в изображение с сохранением пропорций, ось y направлена вверх. Все элементы рисуются
+# операциями над массивами, без циклов по узлам, отрезкам и треугольникам
+class TRaster:
+    def __init__(self, x, fe, be, width=800, height=800, show_vertex=False, show_fe=True, show_be=True):
+        self.__mesh__ = TMesh.from_arrays(x, fe, be)
+        self.__width__ = width
+        self.__height__ = height
+        self.__show_vertex__ = show_vertex
+        self.__show_fe__ = show_fe
+        self.__show_be__ = show_be
+        self.__quality__ = None
+        self.image = None                           # Изображение (height x width x 3, uint8)
+
+    # Заливка КЭ цветом по качеству: True - качество TGeometry.quality, массив - значения из [0, 1] для каждого
+    # КЭ, None - без заливки
+    def set_quality(self, quality=True):
+        self.__quality__ = quality
+
+    # Координаты узлов в пикселях (столбец, строка)
+    def __pixels__(self):
+        x = self.__mesh__.x
+        if not len(x):
+            return x
+        x_min = x.min(axis=0)
+        x_max = x.max(axis=0)
+        dx = np.where(x_max > x_min, x_max - x_min, 1.0)
+        scale = min(self.__width__/dx[0], self.__height__/dx[1])*view_fill
+        center = (x_max + x_min)/2
+        return np.column_stack(((x[:, 0] - center[0])*scale + self.__width__/2,
+                                self.__height__/2 - (x[:, 1] - center[1])*scale))
+
+    # Разбиение последовательности элементов с количествами пикселей count на части не более chunk_pixels
+    # пикселей (элемент, больший chunk_pixels, образует отдельную часть)
+    @staticmethod
+    def __chunks__(count):
+        total = np.cumsum(count)
+        if not len(total):
+            return
+        bounds = np.searchsorted(total, np.arange(chunk_pixels, total[-1], chunk_pixels), side='right')
+        bounds = np.unique(np.concatenate(([0], bounds, [len(count)])))
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            yield first, last
+
+    # Пиксели (строки, столбцы), покрываемые частями, заданными началами start и длинами count
+    @staticmethod
+    def __expand__(start, count):
+        index = np.repeat(np.arange(len(count)), count)
+        return index, np.arange(len(index)) - np.repeat(np.cumsum(count) - count, count) + np.repeat(start, count)
+
+    # Отсечение отрезков p1 - p2 прямоугольником изображения (алгоритм Лианга - Барски): концы отсеченных отрезков
+    # и признак пересечения с изображением
+    def __clip__(self, p1, p2):
+        d = p2 - p1
+        t0 = np.zeros(len(p1))
+        t1 = np.ones(len(p1))
+        is_visible = np.ones(len(p1), dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for k, size in enumerate([self.__width__, self.__height__]):
+                for p, q in [(-d[:, k], p1[:, k] + 0.5), (d[:, k], size - 0.5 - p1[:, k])]:
+                    is_visible &= (p != 0) | (q >= 0)
+                    t = q/p
+                    t0 = np.where(p < 0, np.maximum(t0, t), t0)
+                    t1 = np.where(p > 0, np.minimum(t1, t), t1)
+        is_visible &= t0 <= t1
+        return p1 + t0[:, np.newaxis]*d, p1 + t1[:, np.newaxis]*d, is_visible
+
+    # Отрисовка отрезков (номера вершин edges) цветом color: отрезок заменяется точками с шагом не более пикселя.
+    # Отрезки упорядочиваются по убыванию количества точек, поэтому k-е точки всех отрезков, имеющих больше k точек,
+    # вычисляются одной операцией над началом массивов
+    def __draw_lines__(self, p, edges, color):
+        p1, p2, is_visible = self.__clip__(p[edges[:, 0]], p[edges[:, 1]])
+        p1 = p1[is_visible]
+        d = p2[is_visible] - p1
+        count = np.ceil(np.abs(d).max(axis=1)).astype(np.int64) + 1
+        order = np.argsort(-count, kind='stable')
+        p1 = p1[order]
+        count = count[order]
+        d = d[order]/np.maximum(count - 1, 1)[:, np.newaxis]
+        size = np.searchsorted(-count, -np.arange(0, count[0] if len(count) else 0), side='left')
+        for k, m in enumerate(size):
+            q = np.rint(p1[:m] + k*d[:m]).astype(np.int64)
+            self.image[np.clip(q[:, 1], 0, self.__height__ - 1), np.clip(q[:, 0], 0, self.__width__ - 1)] = color
+
+    # Отрисовка узлов кругами радиуса vertex_radius
+    def __draw_vertices__(self, p):
+        dy, dx = np.mgrid[-vertex_radius:vertex_radius + 1, -vertex_radius:vertex_radius + 1]
+        mask = dx**2 + dy**2 <= vertex_radius**2
+        offset = np.column_stack((dx[mask], dy[mask]))
+        step = max(1, chunk_pixels//len(offset))
+        for k in range(0, len(p), step):
+            q = (np.rint(p[k:k + step])[:, np.newaxis, :] + offset).reshape(-1, 2).astype(np.int64)
+            q = q[(q[:, 0] >= 0) & (q[:, 0] < self.__width__) & (q[:, 1] >= 0) & (q[:, 1] < self.__height__)]
+            self.image[q[:, 1], q[:, 0]] = vertex_color
+
+    # Заливка треугольников цветами colors (M x 3) построчно: для каждой строки пикселей, пересекающей
+    # треугольник, вычисляется отрезок [левая, правая граница]; треугольник, не покрывающий центров пикселей,
+    # закрашивает пиксель центра тяжести
+    def __fill_triangles__(self, p, colors):
+        t = p[self.__mesh__.fe]
+        q = np.rint(t.mean(axis=1)).astype(np.int64)
+        mask = (q[:, 0] >= 0) & (q[:, 0] < self.__width__) & (q[:, 1] >= 0) & (q[:, 1] < self.__height__)
+        self.image[q[mask, 1], q[mask, 0]] = colors[mask]
+        y_min = np.maximum(np.ceil(t[:, :, 1].min(axis=1)), 0).astype(np.int64)
+        y_max = np.minimum(np.floor(t[:, :, 1].max(axis=1)), self.__height__ - 1).astype(np.int64)
+        rows = np.maximum(y_max - y_min + 1, 0)
+        # Ребра треугольников (M x 3): начало, наклон dx/dy и диапазон y (горизонтальные ребра не пересекаются
+        # строками)
+        b = np.roll(t, -1, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (b[:, :, 0] - t[:, :, 0])/(b[:, :, 1] - t[:, :, 1])
+        lower = np.where(t[:, :, 1] != b[:, :, 1], np.minimum(t[:, :, 1], b[:, :, 1]), np.inf)
+        upper = np.maximum(t[:, :, 1], b[:, :, 1])
+        for first, last in self.__chunks__(rows):
+            index, y = self.__expand__(y_min[first:last], rows[first:last])
+            index += first
+            yy = y[:, np.newaxis]
+            is_cross = (lower[index] <= yy) & (yy <= upper[index])
+            with np.errstate(invalid='ignore'):
+                x = t[index, :, 0] + (yy - t[index, :, 1])*slope[index]
+            left = np.where(is_cross, x, np.inf).min(axis=1)
+            right = np.where(is_cross, x, -np.inf).max(axis=1)
+            is_cross = left <= right
+            left = np.maximum(np.ceil(left[is_cross]), 0).astype(np.int64)
+            right = np.minimum(np.floor(right[is_cross]), self.__width__ - 1).astype(np.int64)
+            cols = np.maximum(right - left + 1, 0)
+            span, x = self.__expand__(left, cols)
+            self.image[np.repeat(y[is_cross], cols), x] = colors[index[is_cross][span]]
+
+    # Цвета КЭ по значениям качества
+    @staticmethod
+    def quality_colors(quality):
+        quality = np.clip(np.nan_to_num(np.asarray(quality, dtype=np.float64)), 0, 1)
+        return np.column_stack([np.interp(quality, quality_scale, [color[k] for color in quality_colors])
+                                for k in range(0, 3)]).astype(np.uint8)
+
+    # Построение изображения
+    def render(self):
+        self.image = np.empty((self.__height__, self.__width__, 3), dtype=np.uint8)
+        self.image[:] = background_color
+        p = self.__pixels__()
+        mesh = self.__mesh__
+        if self.__quality__ is not None and len(mesh.fe):
+            quality = self.__quality__
+            if quality is True:
+                quality = TGeometry(mesh.x, mesh.fe).quality()
+            self.__fill_triangles__(p, self.quality_colors(quality))
+        if self.__show_vertex__:
+            self.__draw_vertices__(p)
+        if self.__show_fe__ and len(mesh.fe):
+            self.__draw_lines__(p, mesh.edges(), fe_color)
+        if self.__show_be__ and len(mesh.be):
+            self.__draw_lines__(p, mesh.boundary_edges(), be_color)
+        return self.image
+
+    # Сохранение изображения в файл PNG (строится, если еще не построено)
+    def save_png(self, file_name):
+        if self.image is None:
+            self.render()
+        with open(file_name, 'wb') as file:
+            file.write(png_bytes(self.image))
+
+
+# Содержимое файла PNG (RGB, 8 бит на канал) для изображения image (height x width x 3, uint8)
+def png_bytes(image):
+    height, width = image.shape[:2]
+    # Строки изображения с байтом типа фильтра (0 - без фильтрации) в начале
+    data = np.hstack((np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width*3))).tobytes()
+    return png_signature + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) + \
+        png_chunk(b'IDAT', zlib.compress(data, png_level)) + png_chunk(b'IEND', b'')
+
+
+# Блок файла PNG: длина, тип, данные и контрольная сумма CRC-32 типа и данных
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###################################################################
+#   Методы уточнения корня R-функции на отрезке со сменой знака
+###################################################################
+
+import math
+import numpy as np
+from numpy import sign
+from abc import abstractmethod
+
+
+# Базовый класс итерационного метода: точность, ограничение количества итераций и статистика работы
+class TIterativeMethod:
+    def __init__(self, eps=1.0E-10, max_step=100):
+        self.eps = eps                  # Точность (длина итогового отрезка или шага)
+        self.max_step = max_step        # Максимальное количество итераций
+        self.calls = 0                  # Количество уточненных корней (спроецированных точек)
+        self.iterations = 0             # Суммарное количество итераций (вычислений функции)
+        self.max_iterations = 0         # Максимальное количество итераций для одного корня
+        self.failures = 0               # Количество неудач (в т.ч. не уточненных за max_step итераций)
+
+    # Статистика работы метода
+    def statistics(self):
+        return {'calls': self.calls, 'iterations': self.iterations, 'max_iterations': self.max_iterations,
+                'failures': self.failures}
+
+    # Добавление статистики, накопленной другим экземпляром метода (например, в процессе пула)
+    def merge(self, statistics):
+        self.calls += statistics['calls']
+        self.iterations += statistics['iterations']
+        self.max_iterations = max(self.max_iterations, statistics['max_iterations'])
+        self.failures += statistics['failures']
+
+    def __count__(self, iterations, failures=0):
+        self.calls += np.size(iterations)
+        self.iterations += int(np.sum(iterations))
+        self.max_iterations = max(self.max_iterations, int(np.max(iterations, initial=0)))
+        self.failures += failures
+
+    @staticmethod
+    def __warning__(x1, x2):
+        print('Warning: ', x1[0], ',', x1[1], ' ', x2[0], ',', x2[1])
+
+
+# Базовый класс метода уточнения корня на отрезке [x1, x2] плоскости.
+# solve - для одного отрезка (f(x, y) - скалярная функция),
+# solve_many - для массива отрезков (f(xs, ys) - векторная функция).
+# Известные значения функции на концах отрезков (f1, f2) повторно не вычисляются.
+class TRootFinder(TIterativeMethod):
+    @abstractmethod
+    def solve(self, f, x1, x2, f1=None, f2=None):
+        raise NotImplementedError('Method TRootFinder.solve is pure virtual')
+
+    @abstractmethod
+    def solve_many(self, f, x1, x2, f1=None, f2=None):
+        raise NotImplementedError('Method TRootFinder.solve_many is pure virtual')
+
+
+# Метод половинного деления
+class TBisection(TRootFinder):
+    def solve(self, f, x1, x2, f1=None, f2=None):
+        s1 = sign(f(x1[0], x1[1]) if f1 is None else f1)
+        i = 0
+        x = [(x1[0] + x2[0])*0.5, (x1[1] + x2[1])*0.5]
+        while i < self.max_step:
+            s = sign(f(x[0], x[1]))
+            if s1 != s:
+                x2 = [x[0], x[1]]
+            else:
+                x1 = [x[0], x[1]]
+                s1 = s
+            x = [(x1[0] + x2[0])*0.5, (x1[1] + x2[1])*0.5]
+            i += 1
+            if ((x2[0] - x1[0])**2 + (x2[1] - x1[1])**2)**0.5 < self.eps:
+                break
+            if i == self.max_step:
+                self.__warning__(x1, x2)
+                self.failures += 1
+        self.__count__(i)
+        return [(x1[0] + x2[0])*0.5, (x1[1] + x2[1])*0.5]
+
+    def solve_many(self, f, x1, x2, f1=None, f2=None):
+        x1 = np.array(x1, dtype=np.float64)
+        x2 = np.array(x2, dtype=np.float64)
+        s1 = sign(f(x1[:, 0], x1[:, 1]) if f1 is None else f1)
+        count = np.zeros(len(x1), dtype=int)
+        active = np.arange(0, len(x1))
+        for i in range(0, self.max_step):
+            if len(active) == 0:
+                break
+            x = (x1[active] + x2[active])*0.5
+            s = sign(f(x[:, 0], x[:, 1]))
+            left = s1[active] != s
+            x2[active[left]] = x[left]
+            x1[active[~left]] = x[~left]
+            s1[active[~left]] = s[~left]
+            count[active] += 1
+            d = x2[active] - x1[active]
+            active = active[np.sqrt(d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1]) >= self.eps]
+        for i in active:
+            self.__warning__(x1[i], x2[i])
+        self.__count__(count, len(active))
+        return (x1 + x2)*0.5
+
+
+# Базовый класс методов, работающих с параметром t отрезка x(t) = x1 + t*(x2 - x1), t из [0, 1].
+# Значения функции приводятся к виду g(0) < 0 < g(1); итоговый отрезок [a, b] имеет длину не более eps
+class TParametricRootFinder(TRootFinder):
+    def solve(self, f, x1, x2, f1=None, f2=None):
+        d = [x2[0] - x1[0], x2[1] - x1[1]]
+        length = (d[0]*d[0] + d[1]*d[1])**0.5
+        f1 = f(x1[0], x1[1]) if f1 is None else f1
+        f2 = f(x2[0], x2[1]) if f2 is None else f2
+        if f1 == 0 or length == 0:
+            self.__count__(0)
+            return [x1[0], x1[1]]
+        if f2 == 0:
+            self.__count__(0)
+            return [x2[0], x2[1]]
+        s = 1.0 if f1 < 0 else -1.0
+        a, b, i = self.__iterate__(lambda t: s*f(x1[0] + t*d[0], x1[1] + t*d[1]), s*f1, s*f2, self.eps/length)
+        if i == self.max_step and b - a > self.eps/length:
+            self.__warning__([x1[0] + a*d[0], x1[1] + a*d[1]], [x1[0] + b*d[0], x1[1] + b*d[1]])
+            self.failures += 1
+        self.__count__(i)
+        t = (a + b)*0.5
+        return [x1[0] + t*d[0], x1[1] + t*d[1]]
+
+    def solve_many(self, f, x1, x2, f1=None, f2=None):
+        x1 = np.array(x1, dtype=np.float64)
+        x2 = np.array(x2, dtype=np.float64)
+        d = x2 - x1
+        length = np.sqrt(d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1])
+        f1 = f(x1[:, 0], x1[:, 1]) if f1 is None else np.array(f1, dtype=np.float64)
+        f2 = f(x2[:, 0], x2[:, 1]) if f2 is None else np.array(f2, dtype=np.float64)
+        s = np.where(f1 < 0, 1.0, -1.0)
+        with np.errstate(divide='ignore'):
+            eps = self.eps/length
+        a = np.zeros(len(x1))
+        b = np.ones(len(x1))
+        # Корень в одном из концов отрезка
+        a[f2 == 0] = 1.0
+        b[(f1 == 0) | (length == 0)] = 0.0
+        count = np.zeros(len(x1), dtype=int)
+        active = np.nonzero(b - a > eps)[0]
+        a[active], b[active], count[active] = \
+            self.__iterate_many__(lambda idx, t: s[idx]*f(x1[idx, 0] + t*d[idx, 0], x1[idx, 1] + t*d[idx, 1]),
+                                  (s*f1)[active], (s*f2)[active], eps[active], active)
+        failed = np.nonzero(b - a > eps)[0]
+        for i in failed:
+            self.__warning__(x1[i] + a[i]*d[i], x1[i] + b[i]*d[i])
+        self.__count__(count, len(failed))
+        t = (a + b)*0.5
+        return x1 + t[:, np.newaxis]*d
+
+    # Уточнение корня функции g(t), g(0) = ga < 0 < g(1) = gb, с точностью eps; результат - (a, b, итерации)
+    @abstractmethod
+    def __iterate__(self, g, ga, gb, eps):
+        raise NotImplementedError('Method TParametricRootFinder.__iterate__ is pure virtual')
+
+    # То же для массива отрезков: g(idx, t) вычисляет функцию для отрезков с номерами idx
+    @abstractmethod
+    def __iterate_many__(self, g, ga, gb, eps, idx):
+        raise NotImplementedError('Method TParametricRootFinder.__iterate_many__ is pure virtual')
+
+
+# Метод ложного положения (регула фальси) с модификацией Illinois
+class TIllinois(TParametricRootFinder):
+    def __iterate__(self, g, ga, gb, eps):
+        a, b = 0.0, 1.0
+        side = 0
+        i = 0
+        while b - a > eps and i < self.max_step:
+            c = (a*gb - b*ga)/(gb - ga)
+            if not a < c < b:
+                c = (a + b)*0.5
+            gc = g(c)
+            i += 1
+            if gc < 0:
+                a, ga = c, gc
+                if side == -1:
+                    gb *= 0.5
+                side = -1
+            elif gc > 0:
+                b, gb = c, gc
+                if side == 1:
+                    ga *= 0.5
+                side = 1
+            else:
+                a = b = c
+        return a, b, i
+
+    def __iterate_many__(self, g, ga, gb, eps, idx):
+        n = len(idx)
+        a = np.zeros(n)
+        b = np.ones(n)
+        side = np.zeros(n)
+        count = np.zeros(n, dtype=int)
+        active = np.arange(0, n)
+        for i in range(0, self.max_step):
+            if len(active) == 0:
+                break
+            aa, bb, fa, fb = a[active], b[active], ga[active], gb[active]
+            c = (aa*fb - bb*fa)/(fb - fa)
+            c = np.where((aa < c) & (c < bb), c, (aa + bb)*0.5)
+            gc = g(idx[active], c)
+            count[active] += 1
+            lo = gc < 0
+            hi = gc > 0
+            root = ~(lo | hi)
+            gb[active[lo & (side[active] == -1)]] *= 0.5
+            ga[active[hi & (side[active] == 1)]] *= 0.5
+            a[active[lo]], ga[active[lo]], side[active[lo]] = c[lo], gc[lo], -1
+            b[active[hi]], gb[active[hi]], side[active[hi]] = c[hi], gc[hi], 1
+            a[active[root]] = b[active[root]] = c[root]
+            active = active[b[active] - a[active] > eps[active]]
+        return a, b, count
+
+
+# Метод ITP (Interpolate, Truncate, Project; I.F.D. Oliveira, R.H.C. Takahashi, 2020):
+# сверхлинейная сходимость при числе итераций не более, чем у метода половинного деления, плюс n0
+class TITP(TParametricRootFinder):
+    def __init__(self, eps=1.0E-10, max_step=100, k1=0.2, k2=2.0, n0=1):
+        TParametricRootFinder.__init__(self, eps, max_step)
+        self.k1 = k1
+        self.k2 = k2
+        self.n0 = n0
+
+    def __iterate__(self, g, ga, gb, eps):
+        a, b = 0.0, 1.0
+        e = eps*0.5
+        n_max = max(0, math.ceil(math.log2(1.0/eps))) + self.n0
+        i = 0
+        while b - a > eps and i < self.max_step:
+            x_half = (a + b)*0.5
+            r = e*2.0**(n_max - i) - (b - a)*0.5
+            delta = self.k1*(b - a)**self.k2
+            x_f = (gb*a - ga*b)/(gb - ga)
+            sigma = 1.0 if x_half >= x_f else -1.0
+            x_t = x_f + sigma*delta if delta <= abs(x_half - x_f) else x_half
+            c = x_t if abs(x_t - x_half) <= r else x_half - sigma*r
+            if not a < c < b:
+                c = x_half
+            gc = g(c)
+            i += 1
+            if gc < 0:
+                a, ga = c, gc
+            elif gc > 0:
+                b, gb = c, gc
+            else:
+                a = b = c
+        return a, b, i
+
+    def __iterate_many__(self, g, ga, gb, eps, idx):
+        n = len(idx)
+        a = np.zeros(n)
+        b = np.ones(n)
+        e = eps*0.5
+        n_max = np.maximum(0, np.ceil(np.log2(1.0/eps))) + self.n0
+        count = np.zeros(n, dtype=int)
+        active = np.arange(0, n)
+        for i in range(0, self.max_step):
+            if len(active) == 0:
+                break
+            aa, bb, fa, fb = a[active], b[active], ga[active], gb[active]
+            x_half = (aa + bb)*0.5
+            r = e[active]*2.0**(n_max[active] - i) - (bb - aa)*0.5
+            delta = self.k1*(bb - aa)**self.k2
+            x_f = (fb*aa - fa*bb)/(fb - fa)
+            sigma = np.where(x_half >= x_f, 1.0, -1.0)
+            x_t = np.where(delta <= np.abs(x_half - x_f), x_f + sigma*delta, x_half)
+            c = np.where(np.abs(x_t - x_half) <= r, x_t, x_half - sigma*r)
+            c = np.where((aa < c) & (c < bb), c, x_half)
+            gc = g(idx[active], c)
+            count[active] += 1
+            lo = gc < 0
+            hi = gc > 0
+            root = ~(lo | hi)
+            a[active[lo]], ga[active[lo]] = c[lo], gc[lo]
+            b[active[hi]], gb[active[hi]] = c[hi], gc[hi]
+            a[active[root]] = b[active[root]] = c[root]
+            active = active[b[active] - a[active] > eps[active]]
+        return a, b, count
+
+
+# Проекция точек на нулевую линию R-функции методом Ньютона: вдоль градиента (x <- x - f*grad/|grad|^2)
+# или, если задано направление d (единичный вектор), вдоль прямой x + t*d (t <- t - f/(grad, d)).
+# Длина шага ограничивается radius, шаг, не уменьшающий |f|, отвергается и на следующей итерации делится
+# пополам; проекция завершается, когда длина шага меньше eps. Точки с нулевой производной, удалившиеся от исходных
+# дальше radius или не уточненные за max_step итераций, считаются не спроецированными.
+# grad(xs, ys) - векторная функция, возвращающая значения R-функции и ее частных производных по x и y.
+# Сигнатура solve отличается от TRootFinder (проецируются точки, а не уточняются корни на отрезках), поэтому
+# класс наследует только статистику итерационного метода
+class TNewtonProjection(TIterativeMethod):
+    def solve(self, grad, p, radius, direction=None):
+        x, ok = self.solve_many(grad, [p], radius, None if direction is None else [direction])
+        return x[0].tolist() if ok[0] else None
+
+    # Результат - проекции точек и признаки успешного проецирования
+    def solve_many(self, grad, p, radius, direction=None):
+        p = np.array(p, dtype=np.float64).reshape(-1, 2)
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(p),))
+        x = p.copy()
+        f, gx, gy = (np.array(val, dtype=np.float64) for val in grad(x[:, 0], x[:, 1]))
+        count = np.ones(len(p), dtype=int)
+        damp = np.ones(len(p))
+        done = f == 0
+        failed = np.zeros(len(p), dtype=bool)
+        active = np.nonzero(~done)[0]
+        for i in range(0, self.max_step):
+            if not len(active):
+                break
+            # Направление движения и производная R-функции по нему
+            g = np.column_stack((gx[active], gy[active]))
+            if direction is None:
+                slope = np.hypot(g[:, 0], g[:, 1])
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    d = g/slope[:, np.newaxis]
+            else:
+                d = np.asarray(direction, dtype=np.float64).reshape(-1, 2)[active]
+                slope = (g*d).sum(axis=1)
+            bad = ~(np.abs(slope) > 0) | ~np.isfinite(slope) | ~np.isfinite(f[active])
+            failed[active[bad]] = True
+            active = active[~bad]
+            slope = slope[~bad]
+            d = d[~bad]
+            # Шаг длиной |f/slope|, ограниченной radius
+            length = np.minimum(np.abs(f[active]/slope), radius[active])*damp[active]
+            t = -np.sign(f[active])*np.sign(slope)*length
+            xn = x[active] + t[:, np.newaxis]*d
+            fn, gxn, gyn = grad(xn[:, 0], xn[:, 1])
+            count[active] += 1
+            small = length < self.eps
+            update = (np.abs(fn) < np.abs(f[active])) | small
+            index = active[update]
+            x[index], f[index], gx[index], gy[index] = xn[update], fn[update], gxn[update], gyn[update]
+            damp[index] = 1.0
+            damp[active[~update]] *= 0.5
+            r = x[active] - p[active]
+            far = np.hypot(r[:, 0], r[:, 1]) > radius[active]
+            failed[active[far]] = True
+            done[active[update & (small | (fn == 0)) & ~far]] = True
+            active = active[~done[active] & ~failed[active]]
+        failed[active] = True
+        self.__count__(count, int(np.count_nonzero(failed)))
+        return x, ~failed
+
+
+# Доступные методы уточнения корня
+root_methods = {
+    'bisect': TBisection,
+    'illinois': TIllinois,
+    'itp': TITP
+}
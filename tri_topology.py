@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+####################################################################
+#   Топология триангуляции: смежность треугольников по ребрам
+#   и граничные (не имеющие пары) полуребра, упорядоченные в контуры
+####################################################################
+
+from math import atan2
+from math import pi
+import numpy as np
+
+
+# Класс, описывающий топологию триангуляции.
+# Ребро k треугольника i - полуребро (triangles[i][k], triangles[i][(k + 1) % 3]);
+# neighbors[i][k] - номер треугольника, смежного по этому ребру (-1 для граничного ребра)
+class TTopology:
+    def __init__(self, x, triangles, neighbors=None):
+        self.x = np.asarray(x, dtype=np.float64).reshape(-1, 2)
+        self.triangles = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+        if neighbors is None:
+            self.neighbors = self.__edge_table__(self.triangles)
+        else:
+            self.neighbors = np.array(neighbors, dtype=np.int64).reshape(-1, 3)
+        self.__orient__(self.x)
+
+    # Построение таблицы смежности по ребрам: полуребра упорядочиваются по ключу неориентированного ребра,
+    # соседние в этом порядке полуребра с одинаковым ключом - общее ребро двух треугольников
+    @staticmethod
+    def __edge_table__(triangles):
+        count = len(triangles)
+        neighbors = np.full((count, 3), -1, dtype=np.int64)
+        if count == 0:
+            return neighbors
+        v1 = triangles.ravel()
+        v2 = np.roll(triangles, -1, axis=1).ravel()
+        key = np.minimum(v1, v2)*(int(triangles.max()) + 1) + np.maximum(v1, v2)
+        order = np.argsort(key, kind='stable')
+        pair = np.nonzero(key[order[:-1]] == key[order[1:]])[0]
+        e1 = order[pair]
+        e2 = order[pair + 1]
+        neighbors.ravel()[e1] = e2//3
+        neighbors.ravel()[e2] = e1//3
+        return neighbors
+
+    # Приведение всех треугольников к обходу против часовой стрелки
+    def __orient__(self, x):
+        if len(self.triangles) == 0:
+            return
+        p = x[self.triangles]
+        area = (p[:, 1, 0] - p[:, 0, 0])*(p[:, 2, 1] - p[:, 0, 1]) - (p[:, 1, 1] - p[:, 0, 1])*(p[:, 2, 0] - p[:, 0, 0])
+        cw = area < 0
+        # Перестановка вершин 1 и 2 меняет местами ребра 0 и 2 (ребро 1 сохраняется с обратным направлением)
+        self.triangles[cw] = self.triangles[cw][:, [0, 2, 1]]
+        self.neighbors[cw] = self.neighbors[cw][:, [2, 1, 0]]
+
+    # Граничные полуребра: (начальная вершина, конечная вершина, треугольник) в порядке номеров треугольников
+    def boundary(self):
+        i, k = np.nonzero(self.neighbors < 0)
+        return self.triangles[i, k], self.triangles[i, (k + 1) % 3], i
+
+    # Угол поворота по часовой стрелке от направления d0 к направлению d1 (в диапазоне (0, 2*pi])
+    @staticmethod
+    def __cw_angle__(d0, d1):
+        angle = (atan2(d0[1], d0[0]) - atan2(d1[1], d1[0])) % (2*pi)
+        return angle if angle > 0 else 2*pi
+
+    # Упорядочивание граничных полуребер v1 -> v2 в замкнутые контуры (область остается слева).
+    # Для каждого полуребра определяются предыдущее (prev) и следующее (nxt) полуребра контура и номер контура (loop);
+    # loops - списки номеров полуребер каждого контура: сначала внешние (обход против часовой стрелки)
+    # в порядке убывания площади, затем отверстия (обход по часовой стрелке)
+    def loops(self, v1, v2):
+        count = len(v1)
+        prev = np.full(count, -1, dtype=np.int64)
+        nxt = np.full(count, -1, dtype=np.int64)
+        loop = np.full(count, -1, dtype=np.int64)
+        if count == 0:
+            return prev, nxt, loop, []
+        # Отображение "вершина -> исходящие из нее полуребра"
+        order = np.argsort(v1, kind='stable')
+        first = np.searchsorted(v1[order], v2, side='left')
+        last = np.searchsorted(v1[order], v2, side='right')
+        single = last - first == 1
+        nxt[single] = order[first[single]]
+        # В вершинах касания контуров выбирается исходящее полуребро, ближайшее по часовой стрелке
+        # к направлению на начало входящего полуребра (полуребро того же веера треугольников)
+        for i in np.nonzero(last - first > 1)[0].tolist():
+            d0 = self.x[v1[i]] - self.x[v2[i]]
+            best = -1
+            best_angle = 0
+            for j in order[first[i]:last[i]].tolist():
+                angle = self.__cw_angle__(d0, self.x[v2[j]] - self.x[v1[j]])
+                if best < 0 or angle < best_angle:
+                    best, best_angle = j, angle
+            nxt[i] = best
+        linked = nxt >= 0
+        prev[nxt[linked]] = np.nonzero(linked)[0]
+        # Обход контуров (сначала незамкнутых цепочек, если они есть, - с их начала)
+        res = []
+        for start in np.concatenate((np.nonzero(prev < 0)[0], np.arange(0, count))).tolist():
+            if loop[start] >= 0:
+                continue
+            index = []
+            i = start
+            while i >= 0 and loop[i] < 0:
+                loop[i] = len(res)
+                index.append(i)
+                i = int(nxt[i])
+            res.append(index)
+        # Упорядочивание контуров по ориентированной площади
+        p1 = self.x[v1]
+        p2 = self.x[v2]
+        cross = p1[:, 0]*p2[:, 1] - p1[:, 1]*p2[:, 0]
+        area = [float(cross[index].sum())/2 for index in res]
+        rank = sorted(range(0, len(res)), key=lambda k: (area[k] <= 0, -abs(area[k])))
+        remap = np.empty(len(res), dtype=np.int64)
+        remap[rank] = np.arange(0, len(res))
+        return prev, nxt, remap[loop], [res[k] for k in rank]
+
+    # Преобразование смежности, найденной scipy.spatial.Delaunay (neighbors[i][k] - треугольник,
+    # противолежащий вершине k), к нумерации ребер и к подмножеству оставленных треугольников
+    @staticmethod
+    def from_delaunay(x, simplices, neighbors, mask):
+        index = np.full(len(simplices) + 1, -1, dtype=np.int64)
+        index[np.nonzero(mask)[0]] = np.arange(0, int(np.count_nonzero(mask)))
+        # Ребро k (вершины k, k + 1) противолежит вершине (k + 2) % 3; -1 отображается в последний элемент index
+        nb = index[np.asarray(neighbors)[mask][:, [2, 0, 1]]]
+        return TTopology(x, np.asarray(simplices)[mask], nb)
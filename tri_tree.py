@@ -5,15 +5,77 @@
 ###################################################################
 
 import math
+import numpy as np
 from abc import abstractmethod
 
 
-# Абстрактный базовый класс значения выражения
+# Поэлементное применение функции модуля math к массиву (для побитового совпадения с TNode.value)
+def libm(func, n=1):
+    f = np.frompyfunc(func, n, 1)
+    return lambda *args: np.asarray(f(*args), dtype=np.float64)
+
+
+libm_pow = libm(math.pow, 2)
+
+
+# Возведение в степень: квадрат и квадратный корень вычисляются точно (с корректным округлением),
+# остальные степени - функцией math.pow
+def power(a, b):
+    if b == 2.0:
+        return a*a
+    elif b == 0.5:
+        return math.sqrt(a)
+    return math.pow(a, b)
+
+
+# Векторный аналог функции power
+def vector_pow(a, b):
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    if b.size and np.all(b == b.flat[0]):
+        if b.flat[0] == 2.0:
+            return a*a
+        elif b.flat[0] == 0.5:
+            return np.sqrt(a)
+        return libm_pow(a, b)
+    res = np.empty(a.shape)
+    square = b == 2.0
+    root = b == 0.5
+    other = ~(square | root)
+    res[square] = a[square]*a[square]
+    res[root] = np.sqrt(a[root])
+    res[other] = libm_pow(a[other], b[other])
+    return res
+
+
+# Векторные аналоги функций, используемых при вычислении выражений
+vector_functions = {
+    'abs': np.fabs,
+    'sin': libm(math.sin),
+    'cos': libm(math.cos),
+    'tan': libm(math.tan),
+    'exp': libm(math.exp),
+    'asin': libm(math.asin),
+    'acos': libm(math.acos),
+    'atan': libm(math.atan),
+    'sinh': libm(math.sinh),
+    'cosh': libm(math.cosh),
+    'tanh': libm(math.tanh),
+    'atan2': libm(math.atan2, 2)
+}
+
+
+# Абстрактный базовый класс значения выражения.
+# frame - кадр вычисления: значения аргументов области по id их деревьев разбора (узлы дерева при вычислении
+# не изменяются, поэтому одно дерево может вычисляться одновременно в нескольких потоках и рекурсивно)
 class TNode:
     @abstractmethod
-    def value(self):
+    def value(self, frame=None):
         raise NotImplementedError('Method TNode.value is pure virtual')
 
+    @abstractmethod
+    def vector(self, frame=None):
+        raise NotImplementedError('Method TNode.vector is pure virtual')
+
 
 # Класс, реализующий дерево разбора арифметических выражений
 class TTree:
@@ -32,11 +94,17 @@ class TTree:
         elif len(args) == 7:
             self.node = TDomainNode(args[0], args[1], args[2], args[3], args[4], args[5], args[6])
 
-    def __set__(self, instance, value):
-        self.node.__val__ = value
+    # Вычисление выражения (дерево - аргумент области, если его значение задано в кадре frame)
+    def value(self, frame=None):
+        if frame is not None and id(self) in frame:
+            return frame[id(self)]
+        return self.node.value(frame)
 
-    def value(self):
-        return self.node.value()
+    # Вычисление выражения для массивов значений аргументов
+    def vector(self, frame=None):
+        if frame is not None and id(self) in frame:
+            return frame[id(self)]
+        return self.node.vector(frame)
 
 
 # Вещественная переменная
@@ -44,7 +112,10 @@ class TRealNode(TNode):
     def __init__(self, val):
         self.__val__ = val
 
-    def value(self):
+    def value(self, frame=None):
+        return self.__val__
+
+    def vector(self, frame=None):
         return self.__val__
 
 
@@ -54,13 +125,18 @@ class TUnaryNode(TNode):
         self.__op__ = op
         self.__val__ = val
 
-    def value(self):
+    def value(self, frame=None):
         if self.__op__ == '-':
-            return -self.__val__.value()
+            return -self.__val__.value(frame)
         elif self.__op__ == '+':
-            return +self.__val__.value()
+            return +self.__val__.value(frame)
         elif self.__op__ == 'not':
-            return -self.__val__.value()
+            return -self.__val__.value(frame)
+
+    def vector(self, frame=None):
+        if self.__op__ == '+':
+            return +self.__val__.vector(frame)
+        return -self.__val__.vector(frame)
 
 
 # Бинарная операция
@@ -70,35 +146,67 @@ class TBinaryNode(TNode):
         self.__op__ = op
         self.__right__ = right
 
-    def value(self):
+    def value(self, frame=None):
+        if self.__op__ == '+':
+            return self.__left__.value(frame) + self.__right__.value(frame)
+        elif self.__op__ == '-':
+            return self.__left__.value(frame) - self.__right__.value(frame)
+        elif self.__op__ == '*':
+            return self.__left__.value(frame)*self.__right__.value(frame)
+        elif self.__op__ == '/':
+            return self.__left__.value(frame)/self.__right__.value(frame)
+        elif self.__op__ == '^':
+            return power(self.__left__.value(frame), self.__right__.value(frame))
+        elif self.__op__ == '=':
+            return 1 if self.__left__.value(frame) == self.__right__.value(frame) else 0
+        elif self.__op__ == '<>':
+            return 0 if self.__left__.value(frame) == self.__right__.value(frame) else 1
+        elif self.__op__ == '<':
+            return 1 if self.__left__.value(frame) < self.__right__.value(frame) else 0
+        elif self.__op__ == '<=':
+            return 1 if self.__left__.value(frame) <= self.__right__.value(frame) else 0
+        elif self.__op__ == '>':
+            return 1 if self.__left__.value(frame) > self.__right__.value(frame) else 0
+        elif self.__op__ == '>=':
+            return 1 if self.__left__.value(frame) >= self.__right__.value(frame) else 0
+        elif self.__op__ == 'or':
+            left = self.__left__.value(frame)
+            right = self.__right__.value(frame)
+            return left + right + math.sqrt(left*left + right*right)
+        elif self.__op__ == 'and':
+            left = self.__left__.value(frame)
+            right = self.__right__.value(frame)
+            return left + right - math.sqrt(left*left + right*right)
+
+    def vector(self, frame=None):
+        left = self.__left__.vector(frame)
+        right = self.__right__.vector(frame)
         if self.__op__ == '+':
-            return self.__left__.value() + self.__right__.value()
+            return left + right
         elif self.__op__ == '-':
-            return self.__left__.value() - self.__right__.value()
+            return left - right
         elif self.__op__ == '*':
-            return self.__left__.value()*self.__right__.value()
+            return left*right
         elif self.__op__ == '/':
-            return self.__left__.value()/self.__right__.value()
+            return left/right
         elif self.__op__ == '^':
-            return math.pow(self.__left__.value(), self.__right__.value())
+            return vector_pow(left, right)
         elif self.__op__ == '=':
-            return 1 if self.__left__.value() == self.__right__.value() else 0
+            return np.where(left == right, 1.0, 0.0)
         elif self.__op__ == '<>':
-            return 0 if self.__left__.value() == self.__right__.value() else 1
+            return np.where(left == right, 0.0, 1.0)
         elif self.__op__ == '<':
-            return 1 if self.__left__.value() < self.__right__.value() else 0
+            return np.where(left < right, 1.0, 0.0)
         elif self.__op__ == '<=':
-            return 1 if self.__left__.value() <= self.__right__.value() else 0
+            return np.where(left <= right, 1.0, 0.0)
         elif self.__op__ == '>':
-            return 1 if self.__left__.value() > self.__right__.value() else 0
+            return np.where(left > right, 1.0, 0.0)
         elif self.__op__ == '>=':
-            return 1 if self.__left__.value() >= self.__right__.value() else 0
+            return np.where(left >= right, 1.0, 0.0)
         elif self.__op__ == 'or':
-            return self.__left__.value() + self.__right__.value() + \
-                   math.sqrt(self.__left__.value()**2 + self.__right__.value()**2)
+            return left + right + np.sqrt(left*left + right*right)
         elif self.__op__ == 'and':
-            return self.__left__.value() + self.__right__.value() - \
-                   math.sqrt(self.__left__.value()**2 + self.__right__.value()**2)
+            return left + right - np.sqrt(left*left + right*right)
 
 
 # Вызов внешней функции
@@ -112,11 +220,15 @@ class TDomainNode(TNode):
         self.__vy__ = vy
         self.__vz__ = vz
 
-    def value(self):
-        self.__x__.__set__(self.__x__, self.__vx__.value())
-        self.__y__.__set__(self.__y__, self.__vy__.value())
-        self.__z__.__set__(self.__z__, self.__vz__.value())
-        return self.__code__.value()
+    # Фактические аргументы вычисляются в кадре вызывающей области, тело подобласти - в новом кадре
+    def value(self, frame=None):
+        return self.__code__.value({id(self.__x__): self.__vx__.value(frame), id(self.__y__): self.__vy__.value(frame),
+                                    id(self.__z__): self.__vz__.value(frame)})
+
+    def vector(self, frame=None):
+        return self.__code__.vector({id(self.__x__): self.__vx__.vector(frame),
+                                     id(self.__y__): self.__vy__.vector(frame),
+                                     id(self.__z__): self.__vz__.vector(frame)})
 
 
 # Вызов встроенной функции
@@ -126,26 +238,79 @@ class TFunctionNode(TNode):
         self.__val1__ = val1
         self.__val2__ = val2
 
-    def value(self):
+    def value(self, frame=None):
         if self.__func__ == 'abs':
-            return math.fabs(self.__val1__.value())
+            return math.fabs(self.__val1__.value(frame))
         elif self.__func__ == 'sin':
-            return math.sin(self.__val1__.value())
+            return math.sin(self.__val1__.value(frame))
         elif self.__func__ == 'cos':
-            return math.cos(self.__val1__.value())
+            return math.cos(self.__val1__.value(frame))
         elif self.__func__ == 'tan':
-            return math.tan(self.__val1__.value())
+            return math.tan(self.__val1__.value(frame))
         elif self.__func__ == 'exp':
-            return math.exp(self.__val1__.value())
+            return math.exp(self.__val1__.value(frame))
         elif self.__func__ == 'asin':
-            return math.asin(self.__val1__.value())
+            return math.asin(self.__val1__.value(frame))
         elif self.__func__ == 'acos':
-            return math.acos(self.__val1__.value())
+            return math.acos(self.__val1__.value(frame))
         elif self.__func__ == 'atan':
-            return math.atan(self.__val1__.value())
+            return math.atan(self.__val1__.value(frame))
         elif self.__func__ == 'sinh':
-            return math.sinh(self.__val1__.value())
+            return math.sinh(self.__val1__.value(frame))
         elif self.__func__ == 'cosh':
-            return math.cosh(self.__val1__.value())
+            return math.cosh(self.__val1__.value(frame))
+        elif self.__func__ == 'tanh':
+            return math.tanh(self.__val1__.value(frame))
         elif self.__func__ == 'atan2':
-            return math.atan2(self.__val1__.value(), self.__val2__.value())
+            return math.atan2(self.__val1__.value(frame), self.__val2__.value(frame))
+
+    def vector(self, frame=None):
+        if self.__func__ == 'atan2':
+            return vector_functions['atan2'](self.__val1__.vector(frame), self.__val2__.vector(frame))
+        return vector_functions[self.__func__](self.__val1__.vector(frame))
+
+
+# Операнды узла дерева разбора (для вызова подобласти - фактические аргументы)
+def operands(node):
+    if isinstance(node, TUnaryNode):
+        return [node.__val__]
+    elif isinstance(node, TBinaryNode):
+        return [node.__left__, node.__right__]
+    elif isinstance(node, TFunctionNode):
+        return [node.__val1__, node.__val2__] if node.__func__ == 'atan2' else [node.__val1__]
+    elif isinstance(node, TDomainNode):
+        return [node.__vx__, node.__vy__, node.__vz__]
+    return []
+
+
+# Обход дерева разбора tree как графа (общие узлы вычисляются один раз) в обратном порядке: операнды слева направо,
+# затем узел. Используется явный стек, поэтому глубина дерева не ограничена глубиной рекурсии Python.
+# bind - таблица уже вычисленных деревьев по id (включая аргументы области), operation(node, args) - вычисление
+# узла по значениям операндов. Тело вызываемой подобласти обходится с новой таблицей, связывающей ее аргументы
+# со значениями фактических аргументов
+def visit(tree, bind, operation):
+    stack = [(tree, bind, None)]
+    while len(stack):
+        top, table, call = stack[-1]
+        if id(top) in table:
+            stack.pop()
+            continue
+        node = top.node
+        args = operands(node)
+        pending = [arg for arg in args if id(arg) not in table]
+        if len(pending):
+            stack.extend((arg, table, None) for arg in reversed(pending))
+            continue
+        if isinstance(node, TDomainNode):
+            if call is None:
+                call = {id(node.__x__): table[id(node.__vx__)], id(node.__y__): table[id(node.__vy__)],
+                        id(node.__z__): table[id(node.__vz__)]}
+                stack[-1] = (top, table, call)
+            if id(node.__code__) not in call:
+                stack.append((node.__code__, call, None))
+                continue
+            table[id(top)] = call[id(node.__code__)]
+        else:
+            table[id(top)] = operation(node, [table[id(arg)] for arg in args])
+        stack.pop()
+    return bind[id(tree)]
@@ -10,215 +10,452 @@
 # https://docs.scipy.org/doc/scipy/reference/tutorial/spatial.html
 
 
-from math import acos
 from math import ceil
+from math import log2
+from heapq import heapify, heappop
 from numpy import sign
 from tri_parser import TParser
 from tri_error import TException
 from tri_progress import TProgress
+from tri_root import root_methods, TNewtonProjection
+from tri_topology import TTopology
+from tri_geometry import TGeometry
+from tri_index import TSpatialIndex
+from tri_interval import TInterval
+from tri_cache import TCache, cache_size, default_cache_path
+from tri_export import TMesh
 from scipy.spatial import Delaunay
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from scipy.spatial import QhullError
 import numpy as np
+import scipy
+import io
+import os
+import time
+import zipfile
+
+# Максимальное количество узлов, при котором тройка вершин треугольника упаковывается в один ключ (по 21 биту)
+class_key_limit = 1 << 21
+# Максимальная доля добавляемых узлов, при которой они вставляются в существующую триангуляцию
+# (вставка большего количества узлов медленнее построения триангуляции заново)
+incremental_ratio = 0.1
+# Наименьшая длина (в единицах точности поиска корней) граничного сегмента, который может быть разделен
+split_length = 100
+# Расстояние (в единицах точности поиска корней), на котором узлы считаются совпадающими
+duplicate_length = 10
+# Доля радиуса описанной окружности плохого треугольника, в пределах которой в одну итерацию оптимизации не
+# вставляются центры других плохих треугольников
+refine_spacing = 1.0
+# Количество ячеек верхнего уровня квадродерева вдоль каждой оси
+quadtree_base = 16
+# Полуширина квадрата, в котором автоматически определяются габариты области
+region_limit = 1.0E6
+# Максимальное количество итераций метода Ньютона при проецировании точек на границу области
+newton_steps = 10
+# Отношение максимальной длины граничного сегмента к минимальной при перераспределении узлов границы по умолчанию
+resample_ratio = 10
+# Количество частей, на которые делится работа каждого процесса при параллельном поиске границы
+worker_chunks = 4
+# Версия алгоритма построения сетки (изменяется при изменении результатов расчета - для проверки кэшированных сеток)
+mesh_version = 2
+# Структура граничного элемента: вершины, предыдущий и следующий ГЭ контура, КЭ, длина, номер контура
+be_type = np.dtype([('v1', np.int32), ('v2', np.int32), ('prev', np.int32), ('next', np.int32), ('fe', np.int32),
+                    ('length', np.float64), ('loop', np.int32)])
 
 
 class TTri:
     def __init__(self):
-        self.x = []                         # Координаты узлов
-        self.be = []                        # Граничные элементы
-        self.fe = []                        # Конечные элементы
+        self.x = np.empty((0, 2))           # Координаты узлов (N x 2)
+        self.be = np.empty(0, be_type)      # Граничные элементы
+        self.loops = []                     # Контуры границы (списки номеров ГЭ в порядке обхода)
+        self.fe = np.empty((0, 3), np.int32)            # Конечные элементы (M x 3, вершины против часовой стрелки)
+        self.neighbors = np.empty((0, 3), np.int32)     # Соседи КЭ: neighbors[i][k] - КЭ, смежный по ребру (k, k + 1)
         self.__file_name__ = ''             # Имя файла, содержащего описание R-функции
+        self.__code__ = []                  # ... и его текст
         self.__eps__ = 1.0E-10              # Точность поиска корней
+        self.__root_method__ = 'itp'        # Метод уточнения корней ('bisect', 'illinois', 'itp')
+        self.__root__ = None                # ... и его реализация
+        self.__projection__ = None          # Проецирование точек на границу области методом Ньютона
         self.__min_x__ = [-10, -10]         # Габариты области поиска границы
         self.__max_x__ = [10, 10]           # ...
+        self.__auto_region__ = True         # Определение габаритов области поиска интервальным методом
+        self.__region__ = None              # Габариты области поиска, использованные при последнем расчете
         self.__max_step__ = 100             # Максимальное количество итераций для поиска границы
         self.__max_angle__ = 15             # Максимальный угол между соседними граничными сегментами
         self.__max_ratio__ = 2              # Максимальное соотношение длин граничных сегментов
+        self.__min_length__ = 0             # Минимальная длина граничного сегмента при перераспределении узлов
+                                            # (0 - max_length/resample_ratio)
+        self.__max_length__ = 0             # Максимальная длина граничного сегмента при перераспределении узлов
+                                            # (0 - средняя длина сегмента найденной границы)
+        self.__min_angle__ = 20             # Минимальный угол треугольника, не требующего оптимизации (по Рапперту)
+        self.__max_elements__ = 0           # Максимальное количество КЭ при оптимизации (0 - без ограничения)
+        self.__max_iterations__ = 100       # Максимальное количество итераций оптимизации
         self.__parser__ = TParser()         # Парсер входного языка описания R-функции
+        self.__function__ = None            # Функция, полученная трансляцией описания R-функции
+        self.__interval__ = None            # Интервальное вычисление R-функции на прямоугольниках
         self.__progress__ = TProgress()     # Индикатор прогресса расчета
+        self.__topology__ = None            # Топология текущей триангуляции (смежность треугольников)
+        self.__index__ = TSpatialIndex()    # Пространственный индекс узлов
+        self.__incremental__ = False        # Пополнение текущей триангуляции новыми узлами вместо ее построения заново
+        self.__delaunay__ = None            # Текущая (пополняемая) триангуляция Делоне...
+        self.__points__ = np.empty((0, 2))  # ... и ее узлы
+        self.__class_keys__ = np.empty(0, dtype=np.int64)   # Упорядоченные ключи (тройки вершин) треугольников...
+        self.__class_vals__ = np.empty(0, dtype=bool)       # ... и признаки их принадлежности области
+        self.__resample__ = True            # Перераспределение узлов границы по длине дуги и кривизне
         self.__length_optimize__ = True     # Оптимизация по критерию соотношения длин соседних граничных сегментов
         self.__angle_optimize__ = True      # Оптимизация по критерию угла между соседними граничными сегментами
         self.__full_optimize__ = True       # Полная оптимизация (по Рапперту)
+        self.__search_mode__ = 'grid'       # Способ поиска границы: 'line' - по прямым, 'grid' - по всей сетке сразу,
+                                            # 'quadtree' - адаптивно, с помощью квадродерева
+        self.__quadtree_depth__ = 0         # Глубина квадродерева (0 - определяется по max_step)
+        self.__batch_size__ = 1 << 20       # Максимальное количество точек, вычисляемых за один вызов
+        self.__workers__ = 1                # Количество процессов для поиска границы
+        self.__cache_path__ = default_cache_path()      # Каталог кэша...
+        self.__cache_size__ = cache_size                # ... и максимальный размер каждой его части
+        self.__cache__ = TCache(os.path.join(self.__cache_path__, 'compiled'))  # Кэш транслированных функций
+        self.__mesh_cache__ = None          # Кэш построенных сеток (None - сетка всегда строится заново)
+        self.__timings__ = {}               # Время выполнения этапов последнего расчета (в секундах)
+        self.__timer__ = 0.0                # Момент завершения предыдущего этапа
 
     @staticmethod
     # Определение расстояния между двумя точками
     def __length__(x1, x2):
         return ((x2[0] - x1[0])**2 + (x2[1] - x1[1])**2)**0.5
 
-    # Поиск центра описанной около заданного треугольника окружности
-    def __tri_center__(self, i):
-        xa = self.x[self.fe[i][0]][0]
-        ya = self.x[self.fe[i][0]][1]
-        xb = self.x[self.fe[i][1]][0]
-        yb = self.x[self.fe[i][1]][1]
-        xc = self.x[self.fe[i][2]][0]
-        yc = self.x[self.fe[i][2]][1]
-        d = 2*np.linalg.det(np.array([[xa, ya, 1], [xb, yb, 1], [xc, yc, 1]]))
-        x0 = np.linalg.det(np.array([[xa**2 + ya**2, ya, 1], [xb**2 + yb**2, yb, 1], [xc**2 + yc**2, yc, 1]]))/d
-        y0 = -np.linalg.det(np.array([[xa**2 + ya**2, xa, 1], [xb**2 + yb**2, xb, 1], [xc**2 + yc**2, xc, 1]]))/d
-        return [x0, y0]
-
-    # Вычисление радиуса описанной около треугольника окружности
-    def __tri_radius__(self, i):
-        a = self.__length__([self.x[self.fe[i][0]][0], self.x[self.fe[i][0]][1]],
-                            [self.x[self.fe[i][1]][0], self.x[self.fe[i][1]][1]])
-        b = self.__length__([self.x[self.fe[i][1]][0], self.x[self.fe[i][1]][1]],
-                            [self.x[self.fe[i][2]][0], self.x[self.fe[i][2]][1]])
-        c = self.__length__([self.x[self.fe[i][2]][0], self.x[self.fe[i][2]][1]],
-                            [self.x[self.fe[i][0]][0], self.x[self.fe[i][0]][1]])
-        p = (a + b + c)/2
-        return a*b*c/(4*p*(p*(p - a)*(p - b)*(p - c)**0.5))
-
-    # Поиск координат отрезка, ортогонального заданному граничному сегменту
+    # Поиск координат отрезка, ортогонального заданному граничному сегменту: концы отрезка лежат на нормали к сегменту,
+    # проходящей через его середину, на расстоянии scale*length (для сегмента, параллельного оси абсцисс)
+    # или sqrt(scale)*length от середины (вычисление через единичную нормаль устойчиво и для почти
+    # горизонтальных сегментов, на которых решение квадратного уравнения теряло точность)
     def __get_orthogonal__(self, x1, x2, scale):
         xc = [(x1[0] + x2[0])/2, (x1[1] + x2[1])/2]
-        if x1[1] == x2[1]:
-            # Сегмент параллелен оси абсцисс
-            p1 = [xc[0], xc[1] + scale*self.__length__(x1, x2)]
-            p2 = [xc[0], xc[1] - scale*self.__length__(x1, x2)]
-        else:
-            # Уравнение прямой, ортогональной граничному сегменту (y = kx + b), проходящей через точку xc
-            k = (x2[0] - x1[0])/(x1[1] - x2[1])
-            b = xc[1] - xc[0]*k
-            # Координаты точек, лежащих на ортогогнальной прямой на заданном расстоянии от точки xc
-            d = (2*b*k - 2*k*xc[1] - 2*xc[0])**2 - 4*(k**2 + 1) * \
-                (b**2 - 2*b*xc[1] - scale*self.__length__(x1, x2)**2 + xc[0]**2 + xc[1]**2)
-            d = 0 if abs(d) < self.__eps__ else d
-            if d <= 0:
-                return []
-            r1 = (-(2*b*k - 2*k*xc[1] - 2*xc[0]) - d**0.5)/2/(k**2 + 1)
-            r2 = (-(2*b*k - 2*k*xc[1] - 2*xc[0]) + d**0.5)/2/(k**2 + 1)
-            p1 = [r1, r1*k + b]
-            p2 = [r2, r2*k + b]
-        return [p1, p2]
-
-    # Определение угла между соседними граничными сегментами
-    def __angle__(self, i, j):
-        # Координаты направляющих векторов i и j граничных сегментов
-        vi = [self.x[self.be[i][0]][0] - self.x[self.be[i][1]][0], self.x[self.be[i][0]][1] - self.x[self.be[i][1]][1]]
-        vj = [self.x[self.be[j][0]][0] - self.x[self.be[j][1]][0], self.x[self.be[j][0]][1] - self.x[self.be[j][1]][1]]
-        val = abs(vi[0]*vj[0] + vi[1]*vj[1])/((vi[0]**2 + vi[1]**2)**0.5)/((vj[0]**2 + vj[1]**2)**0.5)
-        if val > 1.0:
-            val = 1.0
-        return 180/3.14*acos(val)
-
-    # Проверка принадлежности треугольника исходной области
-    def __check_triangle__(self, i, j, k):
-        xc = [(self.x[i][0] + self.x[j][0] + self.x[k][0])/3, (self.x[i][1] + self.x[j][1] + self.x[k][1])/3]
-        if self.__parser__.run(xc[0], xc[1]) >= 0:
-            return True
-        return False
-
-    # Реализация метода половинного деления
-    def __bisect__(self, x1, x2):
-        i = 0
-        x = [(x1[0] + x2[0])*0.5, (x1[1] + x2[1])*0.5]
-        while i < self.__max_step__:
-            if sign(self.__parser__.run(x1[0], x1[1])) != sign(self.__parser__.run(x[0], x[1])):
-                x2 = [x[0], x[1]]
-            else:
-                x1 = [x[0], x[1]]
-            x = [(x1[0] + x2[0])*0.5, (x1[1] + x2[1])*0.5]
-            if self.__length__(x1, x2) < self.__eps__:
-                break
-            i += 1
-            if i == self.__max_step__:
-                print('Warning: ', x1[0], ',', x1[1], ' ', x2[0], ',', x2[1])
-        return [(x1[0] + x2[0])*0.5, (x1[1] + x2[1])*0.5]
+        length = self.__length__(x1, x2)
+        if length == 0:
+            return []
+        r = (scale if x1[1] == x2[1] else scale**0.5)*length
+        n = [(x1[1] - x2[1])/length, (x2[0] - x1[0])/length]
+        return [[xc[0] + r*n[0], xc[1] + r*n[1]], [xc[0] - r*n[0], xc[1] - r*n[1]]]
+
+    # Проверка принадлежности треугольников исходной области (по значению R-функции в центре тяжести)
+    # (вырожденные с точностью eps треугольники, которые Qhull строит на почти коллинеарных граничных узлах,
+    # исключаются: их ребра образуют ложные острые углы границы)
+    def __check_triangles__(self, x, simplices):
+        xc = (x[simplices[:, 0]] + x[simplices[:, 1]] + x[simplices[:, 2]])/3
+        geometry = TGeometry(x, simplices)
+        is_flat = 2*np.abs(geometry.areas()) <= self.__eps__*geometry.edge_lengths().max(axis=1)
+        return (self.__parser__.run_many(xc[:, 0], xc[:, 1]) >= 0) & ~is_flat
+
+    # Пространственный индекс текущих узлов
+    def __node_index__(self):
+        self.__index__.update(self.x)
+        return self.__index__
+
+    # Добавление узлов (узлы, совпадающие с уже существующими или друг с другом, отбрасываются)
+    def __add_nodes__(self, x):
+        x = np.asarray(x, dtype=np.float64).reshape(-1, 2)
+        x = x[self.__node_index__().is_new(x, duplicate_length*self.__eps__)]
+        if len(x):
+            self.x = np.vstack((self.x, x))
+        return len(x)
 
     # Поиск всех нулей R-функции на заданном отрезке
     def __find_root__(self, x1, x2, step):
+        res = []
         h = [(x2[0] - x1[0])/step, (x2[1] - x1[1])/step]
-        for i in range(0, step - 1):
+        # Значения R-функции во всех узлах отрезка вычисляются за один вызов
+        t = np.arange(0, step)
+        val = self.__parser__.run_many(x1[0] + t*h[0], x1[1] + t*h[1])
+        s = sign(val)
+        for i in np.nonzero(s[:-1] != s[1:])[0].tolist():
             p1 = [x1[0] + i*h[0], x1[1] + i*h[1]]
             p2 = [x1[0] + (i + 1)*h[0], x1[1] + (i + 1)*h[1]]
-            if sign(self.__parser__.run(p1[0], p1[1])) != sign(self.__parser__.run(p2[0], p2[1])):
-                self.x.append(self.__bisect__(p1, p2))
+            res.append(self.__root__.solve(self.__function__, p1, p2, float(val[i]), float(val[i + 1])))
+        return res
 
-    # Процедура поиска опорного множества точек на границе области
+    # Процедура поиска опорного множества точек на границе области (прямые поиска - столбцы области; при наличии
+    # нескольких процессов столбцы распределяются между ними, результаты объединяются в порядке столбцов)
     def __find_boundary__(self, min_x, max_x):
+        count = quadtree_base if self.__search_mode__ == 'quadtree' else self.__max_step__
+        if self.__workers__ > 1:
+            try:
+                self.__add_nodes__(self.__find_boundary_parallel__(min_x, max_x, count))
+                return
+            except (OSError, BrokenProcessPool) as err:
+                print('\033[1;31mParallel search failed (%s), serial search is used\033[1;m' % err)
+        self.__add_nodes__(self.__find_columns__(min_x, max_x, 0, count))
+
+    # Поиск границы на столбцах first, ..., last - 1 выбранным способом
+    def __find_columns__(self, min_x, max_x, first, last):
+        if self.__search_mode__ == 'grid':
+            return self.__find_boundary_grid__(min_x, max_x, first, last)
+        if self.__search_mode__ == 'quadtree':
+            return self.__find_boundary_quadtree__(min_x, max_x, first, last)
+        return self.__find_boundary_line__(min_x, max_x, first, last)
+
+    # Параллельный поиск границы: столбцы делятся на части, каждый процесс пула транслирует описание R-функции сам
+    # (транслятор и построенные им функции не сериализуются pickle, поэтому в процессы передается только текст).
+    # В режиме квадродерева стороны ячеек на границах частей находятся двумя процессами, поэтому процессы
+    # возвращают отрезки со сменой знака без уточнения: повторы отбрасываются по ключам ребер, и каждый корень
+    # уточняется один раз (как и при поиске в одном процессе, в том же порядке)
+    def __find_boundary_parallel__(self, min_x, max_x, count):
+        bounds = np.linspace(0, count, min(count, self.__workers__*worker_chunks) + 1).astype(int)
+        settings = [self.__eps__, self.__root_method__, self.__max_step__, self.__search_mode__,
+                    self.__quadtree_depth__, self.__batch_size__, self.__cache__]
+        res = []
+        self.__progress__.set_process('Search of the region boundary...', 1, len(bounds) - 1)
+        with ProcessPoolExecutor(self.__workers__, initializer=init_worker, initargs=(self.__code__, settings)) as pool:
+            if self.__search_mode__ == 'quadtree':
+                brackets = []
+                for i, job in enumerate([pool.submit(find_brackets, min_x, max_x, int(first), int(last))
+                                         for first, last in zip(bounds[:-1], bounds[1:])]):
+                    brackets.append(job.result())
+                    self.__progress__.set_progress(i + 1)
+                x1, x2, f1, f2, key = (np.concatenate(b) for b in zip(*brackets))
+                index = np.unique(key, axis=0, return_index=True)[1]
+                if not len(index):
+                    return np.empty((0, 2))
+                parts = np.array_split(index, min(len(index), self.__workers__*worker_chunks))
+                self.__progress__.set_process('Refinement of the boundary points...', 1, len(parts))
+                jobs = [pool.submit(solve_brackets, x1[part], x2[part], f1[part], f2[part]) for part in parts]
+            else:
+                jobs = [pool.submit(find_columns, min_x, max_x, int(first), int(last))
+                        for first, last in zip(bounds[:-1], bounds[1:])]
+            for i, job in enumerate(jobs):
+                x, statistics = job.result()
+                res.append(x)
+                self.__root__.merge(statistics)
+                self.__progress__.set_progress(i + 1)
+        return np.concatenate(res)
+
+    # Поиск опорного множества точек на границе области по отдельным вертикальным прямым
+    def __find_boundary_line__(self, min_x, max_x, first, last):
         h_x = (max_x[0] - min_x[0])/self.__max_step__
-        self.__progress__.set_process('Search of the region boundary...', 1, self.__max_step__)
-        for i in range(0, self.__max_step__):
-            self.__progress__.set_progress(i + 1)
+        x = []
+        self.__progress__.set_process('Search of the region boundary...', 1, last - first)
+        for i in range(first, last):
+            self.__progress__.set_progress(i - first + 1)
             x1 = [min_x[0] + i*h_x, min_x[1]]
             x2 = [min_x[0] + i*h_x, max_x[1]]
-            self.__find_root__(x1, x2, self.__max_step__)
+            x += self.__find_root__(x1, x2, self.__max_step__)
+        return np.array(x, dtype=np.float64).reshape(-1, 2)
+
+    # Поиск опорного множества точек на границе области по всей сетке max_step x max_step сразу:
+    # R-функция вычисляется блоками вертикальных прямых, затем все найденные смены знака уточняются одновременно
+    def __find_boundary_grid__(self, min_x, max_x, first, last):
+        step = self.__max_step__
+        h_x = (max_x[0] - min_x[0])/step
+        h_y = (max_x[1] - min_x[1])/step
+        t = np.arange(0, step)
+        count = max(1, self.__batch_size__//step)
+        x1, x2, f1, f2 = [], [], [], []
+        self.__progress__.set_process('Search of the region boundary...', 1, last - first)
+        for k in range(first, last, count):
+            # Узлы сетки на прямых k, ..., k + count - 1 (столбцы) - так же, как в __find_root__. Прибавление 0.0
+            # заменяет -0.0 на 0.0, как x1[0] + t*h[0] при h[0] = 0 в __find_root__ (знак нуля важен, например,
+            # для atan2)
+            col = min_x[0] + t[k:min(k + count, last)]*h_x + 0.0
+            val = self.__parser__.run_many(np.broadcast_to(col[:, np.newaxis], (len(col), len(t))), min_x[1] + t*h_y)
+            s = sign(val)
+            i, j = np.nonzero(s[:, :-1] != s[:, 1:])
+            x1.append(np.column_stack((col[i], min_x[1] + j*h_y)))
+            x2.append(np.column_stack((col[i], min_x[1] + (j + 1)*h_y)))
+            f1.append(val[i, j])
+            f2.append(val[i, j + 1])
+            self.__progress__.set_progress(min(k + count, last) - first)
+        x1 = np.concatenate(x1)
+        if not len(x1):
+            return np.empty((0, 2))
+        return self.__root__.solve_many(self.__parser__.run_many, x1, np.concatenate(x2), np.concatenate(f1),
+                                        np.concatenate(f2))
+
+    # Значения R-функции в узлах решетки квадродерева (I, J) - точках min_x + (I, J)*h/2; уже вычисленные значения
+    # хранятся в cache (упорядоченные ключи узлов и значения) и повторно не вычисляются
+    def __lattice_values__(self, i, j, min_x, h, size, cache):
+        keys = i*(2*size + 1) + j
+        res = np.empty(len(keys))
+        found = np.zeros(len(keys), dtype=bool)
+        if len(cache[0]):
+            pos = np.minimum(np.searchsorted(cache[0], keys), len(cache[0]) - 1)
+            found = cache[0][pos] == keys
+            res[found] = cache[1][pos[found]]
+        if not found.all():
+            new_keys, index, inverse = np.unique(keys[~found], return_index=True, return_inverse=True)
+            new_i = i[~found][index]
+            new_j = j[~found][index]
+            val = self.__parser__.run_many(min_x[0] + new_i*(h[0]/2), min_x[1] + new_j*(h[1]/2))
+            res[~found] = val[inverse.ravel()]
+            keys = np.concatenate((cache[0], new_keys))
+            order = np.argsort(keys, kind='stable')
+            cache[0] = keys[order]
+            cache[1] = np.concatenate((cache[1], val))[order]
+        return res
+
+    # Поиск опорного множества точек на границе области с помощью квадродерева: ячейки начальной сетки
+    # quadtree_base x quadtree_base делятся на четыре, если в их вершинах и центре R-функция меняет знак или ее
+    # наименьшее по модулю значение сравнимо с изменением R-функции в пределах ячейки; ячейки наименьшего
+    # уровня (по умолчанию - с шагом не больше шага сетки max_step x max_step) содержат границу, нули R-функции
+    # уточняются на их сторонах (а если знак меняется только в центре ячейки - на отрезках, соединяющих центр
+    # с вершинами). Обрабатываются столбцы first, ..., last - 1 ячеек начальной сетки
+    def __find_boundary_quadtree__(self, min_x, max_x, first, last):
+        x1, x2, f1, f2 = self.__quadtree_brackets__(min_x, max_x, first, last)[:4]
+        if not len(x1):
+            return np.empty((0, 2))
+        return self.__root__.solve_many(self.__parser__.run_many, x1, x2, f1, f2)
+
+    # Отрезки квадродерева со сменой знака R-функции на столбцах first, ..., last - 1 (без уточнения корней):
+    # концы, значения на концах и ключи ребер (пары номеров концов), упорядоченные по ключам
+    def __quadtree_brackets__(self, min_x, max_x, first, last):
+        depth = self.__quadtree_depth__
+        if depth <= 0:
+            depth = max(0, int(ceil(log2(self.__max_step__/quadtree_base))))
+        size = quadtree_base << depth
+        h = [(max_x[0] - min_x[0])/size, (max_x[1] - min_x[1])/size]
+        cache = [np.empty(0, dtype=np.int64), np.empty(0)]
+        # Ячейки задаются номером левого нижнего узла решетки (в половинах шага наименьшего уровня)
+        i, j = np.meshgrid(np.arange(first, last), np.arange(0, quadtree_base), indexing='ij')
+        ci = i.ravel().astype(np.int64) << (depth + 1)
+        cj = j.ravel().astype(np.int64) << (depth + 1)
+        self.__progress__.set_process('Search of the region boundary...', 1, depth + 1)
+        for level in range(0, depth + 1):
+            self.__progress__.set_progress(level + 1)
+            d = 1 << (depth + 1 - level)
+            # Ячейки, на которых R-функция заведомо не обращается в ноль, отбрасываются без вычисления ее значений
+            is_zero = self.__interval__.has_zero(min_x[0] + ci*(h[0]/2), min_x[0] + (ci + d)*(h[0]/2),
+                                                 min_x[1] + cj*(h[1]/2), min_x[1] + (cj + d)*(h[1]/2))
+            ci = ci[is_zero]
+            cj = cj[is_zero]
+            # Вершины и центр ячеек
+            pi = np.column_stack((ci, ci + d, ci, ci + d, ci + d//2))
+            pj = np.column_stack((cj, cj, cj + d, cj + d, cj + d//2))
+            val = self.__lattice_values__(pi.ravel(), pj.ravel(), min_x, h, size, cache).reshape(-1, 5)
+            s = sign(val)
+            is_change = (s != s[:, :1]).any(axis=1)
+            if level == depth:
+                break
+            # Изменение R-функции от центра к вершинам, приведенное к длине диагонали ячейки
+            slope = 2*np.abs(val[:, :4] - val[:, 4:]).max(axis=1)
+            keep = is_change | (np.abs(val).min(axis=1) <= slope)
+            ci = ci[keep]
+            cj = cj[keep]
+            d //= 2
+            ci = np.concatenate((ci, ci + d, ci, ci + d))
+            cj = np.concatenate((cj, cj, cj + d, cj + d))
+        # Отрезки (стороны и полудиагонали) ячеек наименьшего уровня, на концах которых R-функция меняет знак
+        pi = pi[is_change]
+        pj = pj[is_change]
+        val = val[is_change]
+        edges = np.array([[0, 1], [2, 3], [0, 2], [1, 3], [4, 0], [4, 1], [4, 2], [4, 3]])
+        e1 = pi[:, edges[:, 0]]*(2*size + 1) + pj[:, edges[:, 0]]
+        e2 = pi[:, edges[:, 1]]*(2*size + 1) + pj[:, edges[:, 1]]
+        f1 = val[:, edges[:, 0]]
+        f2 = val[:, edges[:, 1]]
+        is_root = sign(f1) != sign(f2)
+        is_root[:, 4:] &= ~is_root[:, :4].any(axis=1)[:, np.newaxis]
+        f1 = f1.ravel()
+        f2 = f2.ravel()
+        is_root = is_root.ravel()
+        # Общие стороны соседних ячеек учитываются один раз: ключ ребра - пара номеров его концов (упаковка пары
+        # в одно число переполнялась бы при больших глубинах квадродерева)
+        key = np.column_stack((np.minimum(e1, e2).ravel(), np.maximum(e1, e2).ravel()))
+        key, index = np.unique(key[is_root], axis=0, return_index=True)
+        index = np.nonzero(is_root)[0][index]
+        e1 = e1.ravel()[index]
+        e2 = e2.ravel()[index]
+        x1 = np.column_stack((min_x[0] + (e1//(2*size + 1))*(h[0]/2), min_x[1] + (e1 % (2*size + 1))*(h[1]/2)))
+        x2 = np.column_stack((min_x[0] + (e2//(2*size + 1))*(h[0]/2), min_x[1] + (e2 % (2*size + 1))*(h[1]/2)))
+        return x1, x2, f1[index], f2[index], key
+
+    # Классификация треугольников с запоминанием результата по тройке вершин: если узлы только добавлялись,
+    # значение R-функции вычисляется лишь для треугольников, появившихся после предыдущей классификации
+    def __classify_triangles__(self, x, simplices):
+        if len(x) > class_key_limit:
+            return self.__check_triangles__(x, simplices)
+        s = np.sort(simplices, axis=1).astype(np.int64)
+        keys = (s[:, 0] << 42) | (s[:, 1] << 21) | s[:, 2]
+        res = np.zeros(len(keys), dtype=bool)
+        found = np.zeros(len(keys), dtype=bool)
+        if len(self.__class_keys__):
+            pos = np.minimum(np.searchsorted(self.__class_keys__, keys), len(self.__class_keys__) - 1)
+            found = self.__class_keys__[pos] == keys
+            res[found] = self.__class_vals__[pos[found]]
+        if not found.all():
+            res[~found] = self.__check_triangles__(x, simplices[~found])
+        order = np.argsort(keys)
+        self.__class_keys__ = keys[order]
+        self.__class_vals__ = res[order]
+        return res
+
+    # Триангуляция Делоне узлов x. Если с момента предыдущей триангуляции узлы только добавлялись и их немного,
+    # они вставляются в текущую триангуляцию, иначе (или при ошибке вставки) триангуляция строится заново
+    def __delaunay_triangulation__(self, x):
+        size = len(self.__points__)
+        is_append = len(x) >= size and np.array_equal(x[:size], self.__points__)
+        if not is_append:
+            # Номера узлов изменились - запомненная классификация треугольников недействительна
+            self.__class_keys__ = np.empty(0, dtype=np.int64)
+            self.__class_vals__ = np.empty(0, dtype=bool)
+        self.__points__ = x
+        if self.__delaunay__ is not None and is_append and len(x) - size <= incremental_ratio*size:
+            try:
+                if len(x) > size:
+                    self.__delaunay__.add_points(x[size:])
+                return self.__delaunay__
+            except QhullError:
+                pass
+        if self.__delaunay__ is not None:
+            self.__delaunay__.close()
+            self.__delaunay__ = None
+        tri = Delaunay(x, incremental=self.__incremental__)
+        if self.__incremental__:
+            self.__delaunay__ = tri
+        return tri
 
     # Предварительная триангуляция
     def __pre_triangulation__(self):
-        self.fe = []
+        self.fe = np.empty((0, 3), np.int32)
+        self.neighbors = np.empty((0, 3), np.int32)
         # Построение триангуляции
         self.__progress__.set_process('Create pretriangulation...', 1, 100)
+        x = self.x
         try:
-            tri = Delaunay(np.array([np.array([self.x[i][0] for i in range(0, len(self.x))]),
-                                     np.array([self.x[i][1] for i in range(0, len(self.x))])]).T)
+            tri = self.__delaunay_triangulation__(x)
         except ValueError as err:
             print(err)
             return False
-        for v in tri.simplices:
-            if self.__check_triangle__(v[0], v[1], v[2]) is True:
-                self.fe.append([v[0], v[1], v[2]])
+        # Смежность оставленных треугольников берется из триангуляции Делоне
+        mask = self.__classify_triangles__(x, tri.simplices)
+        self.__topology__ = TTopology.from_delaunay(x, tri.simplices, tri.neighbors, mask)
+        self.fe = self.__topology__.triangles.astype(np.int32)
+        self.neighbors = self.__topology__.neighbors.astype(np.int32)
         self.__progress__.set_progress(100)
         return True
 
     # Построение границы области
     def __create_boundary__(self):
-        self.be = []
-        ind = [[0, 1], [1, 2], [2, 0]]
-        index_map = []
-        for i in range(0, len(self.fe)):
-            index_map.append([-1, -1, -1])
         self.__progress__.set_process('Create boundary...', 1, len(self.fe))
-        # Вычеркиваем все смежные ребра треугольников
-        for i in range(0, len(self.fe)):
-            self.__progress__.set_progress(i + 1)
-            for j in range(i + 1, len(self.fe)):
-                # Ищем ребра соседних треугольников, которые не являются общими
-                for k in range(0, 3):
-                    if index_map[i][k] == -1:
-                        g1 = sorted([self.fe[i][ind[k][0]], self.fe[i][ind[k][1]]])
-                        for m in range(0, 3):
-                            if index_map[j][m] == -1:
-                                g2 = sorted([self.fe[j][ind[m][0]], self.fe[j][ind[m][1]]])
-                                if g1 == g2:
-                                    index_map[i][k] = j
-                                    index_map[j][m] = i
-        # Невычеркнутые грани добавляем в список ГЭ
-        for i in range(0, len(self.fe)):
-            for j in range(0, 3):
-                if index_map[i][j] == -1:
-                    length = self.__length__(self.x[self.fe[i][ind[j][0]]], self.x[self.fe[i][ind[j][1]]])
-                    self.be.append([self.fe[i][ind[j][0]], self.fe[i][ind[j][1]], -1, -1, i, length])
-            self.fe[i] += index_map[i]
-        # Поиск соседей к граничным элементам
-        self.__find_triangle_neighborhood__()
-
-    # Процедура поиска соседей к граничным элементам
-    def __find_triangle_neighborhood__(self):
-        self.__progress__.set_process('Find boundary neighborhood...', 1, len(self.be))
-        for i in range(0, len(self.be)):
-            self.__progress__.set_progress(i + 1)
-            for j in range(0, len(self.be)):
-                if i != j:
-                    if self.be[i][0] == self.be[j][0] or self.be[i][0] == self.be[j][1] or \
-                       self.be[i][1] == self.be[j][0] or self.be[i][1] == self.be[j][1]:
-                        if self.be[i][2] < 0:
-                            self.be[i][2] = j
-                        else:
-                            self.be[i][3] = j
-
-    # Удаление вырожденных граничных сегментов
+        # Ребра, не имеющие смежного треугольника, - граничные элементы
+        v1, v2, fe = self.__topology__.boundary()
+        # Упорядочивание ГЭ в контуры: предыдущий и следующий ГЭ контура, номер контура
+        prev, nxt, loop, self.loops = self.__topology__.loops(v1, v2)
+        self.be = np.empty(len(fe), be_type)
+        self.be['v1'] = v1
+        self.be['v2'] = v2
+        self.be['prev'] = prev
+        self.be['next'] = nxt
+        self.be['fe'] = fe
+        self.be['length'] = TGeometry.segment_lengths(self.x, v1, v2)
+        self.be['loop'] = loop
+        if len(self.fe):
+            self.__progress__.set_progress(len(self.fe))
+
+    # Удаление вырожденных граничных сегментов и всех совпадающих (с точностью duplicate_length*eps) узлов
     def __remove_degenerate_boundary__(self):
-        del_index = []
-        # Удаление вырожденных участков границы
-        self.__progress__.set_process('Find degenerate boundary segment...', 1, len(self.fe))
-        for i in range(0, len(self.be)):
-            self.__progress__.set_progress(i + 1)
-            if self.__length__(self.x[self.be[i][0]], self.x[self.be[i][1]]) < self.__eps__:
-                del_index.append(self.be[i][1])
+        self.__progress__.set_process('Find degenerate boundary segment...', 1, 100)
+        del_index = np.union1d(self.be['v2'][self.be['length'] < self.__eps__],
+                               self.__node_index__().duplicates(duplicate_length*self.__eps__))
+        self.__progress__.set_progress(100)
         if len(del_index):
-            del_index.sort()
-            for i in reversed(range(0, len(del_index))):
-                self.x.pop(del_index[i])
+            self.x = np.delete(self.x, del_index, axis=0)
             # Перетриангуляция
             if self.__pre_triangulation__() is False:
                 return False
@@ -226,32 +463,131 @@ class TTri:
             self.__create_boundary__()
         return True
 
-    # Деление граничного сегмента по критерию длины
+    # Длины шагов вдоль контура в вершинах с длинами дуг s (длина контура - length; для замкнутого контура
+    # вершина 0 повторяется в конце): поворот на шаге не больше max_angle, шаг в пределах [min_length, max_length],
+    # а его изменение на единицу длины дуги не больше max_ratio - 1
+    def __resample_steps__(self, s, turn, length, min_length, max_length, is_closed):
+        m = len(turn)
+        d = np.diff(s)
+        # Кривизна в вершине: угол поворота, отнесенный к полусумме длин прилежащих сегментов
+        arc = (np.r_[d[-1] if is_closed else d[0], d[:m - 1]] + d[:m])/2 if m > 1 else d[:m]
+        with np.errstate(divide='ignore'):
+            h = np.clip(np.radians(self.__max_angle__)*arc/turn, min_length, max_length)
+        h = np.r_[h, h[0] if is_closed else h[-1]]
+        # Ограничение скорости изменения шага (для замкнутого контура - по удвоенному обходу)
+        g = max(self.__max_ratio__ - 1, 0.0)
+        if is_closed:
+            ss = np.r_[s[:-1], s + length]
+            hh = np.r_[h[:-1], h]
+        else:
+            ss, hh = s, h
+        for k in range(0, 2):
+            hh = np.minimum(hh, np.minimum.accumulate(hh - g*ss) + g*ss)
+            hh = np.minimum(hh, (np.minimum.accumulate((hh + g*ss)[::-1]) - g*ss[::-1])[::-1])
+        return hh[-len(s):]
+
+    # Перераспределение узлов границы: каждый контур обходится, и узлы расставляются по длине дуги с шагом,
+    # определяемым кривизной контура (__resample_steps__); вершины с поворотом больше max_angle и концы незамкнутых
+    # цепочек сохраняются, новые точки проецируются на границу методом Ньютона (при неудаче заменяются ближайшей
+    # вершиной контура). Узлы, не лежащие на границе, сохраняются
+    def __resample_boundary__(self):
+        be = self.be
+        if not len(be):
+            return True
+        self.__progress__.set_process('Resample boundary...', 1, len(self.loops))
+        max_length = self.__max_length__ if self.__max_length__ > 0 else be['length'].sum()/len(be)
+        min_length = self.__min_length__ if self.__min_length__ > 0 else max_length/resample_ratio
+        # Угол поворота в начальной вершине каждого ГЭ (от предыдущего ГЭ контура)
+        prev = be[np.maximum(be['prev'], 0)]
+        turn = np.radians(TGeometry.turn_angles(self.x, prev['v1'], prev['v2'], be['v1'], be['v2']))
+        turn[be['prev'] < 0] = np.pi
+        is_boundary = np.zeros(len(self.x), dtype=bool)
+        is_boundary[be['v1']] = is_boundary[be['v2']] = True
+        res = [self.x[~is_boundary]]
+        samples = []
+        near = []
+        radius = []
+        for k, index in enumerate(self.loops):
+            self.__progress__.set_progress(k + 1)
+            index = np.array(index, dtype=np.int64)
+            is_closed = be['next'][index[-1]] == index[0]
+            fixed = turn[index] > np.radians(self.__max_angle__)
+            # Замкнутый контур начинается с сохраняемой вершины
+            if is_closed and fixed.any():
+                index = np.roll(index, -int(np.argmax(fixed)))
+                fixed = turn[index] > np.radians(self.__max_angle__)
+            fixed[0] = True
+            v = np.r_[be['v1'][index], be['v1'][index[0]] if is_closed else be['v2'][index[-1]]]
+            p = self.x[v]
+            s = np.r_[0.0, np.cumsum(be['length'][index])]
+            h = self.__resample_steps__(s, turn[index], s[-1], min_length, max_length, is_closed)
+            # Количество шагов от вершины до вершины: интеграл ds/h (h линейно меняется вдоль сегмента)
+            w = np.r_[0.0, np.cumsum(np.diff(s)*(1/h[:-1] + 1/h[1:])/2)]
+            f = np.r_[np.nonzero(fixed)[0], len(v) - 1]
+            res.append(p[f[:-1] if is_closed else f])
+            a = w[f[:-1]]
+            b = w[f[1:]]
+            n = np.maximum(np.rint(b - a), 1).astype(np.int64)
+            if not (n > 1).any():
+                continue
+            piece = np.repeat(np.arange(0, len(n)), n - 1)
+            t = np.arange(0, len(piece)) - np.repeat(np.cumsum(n - 1) - (n - 1), n - 1) + 1
+            st = np.interp(a[piece] + (b - a)[piece]*t/n[piece], w, s)
+            samples.append(np.column_stack((np.interp(st, s, p[:, 0]), np.interp(st, s, p[:, 1]))))
+            # Граница удалена от найденного контура не больше, чем на длину содержащего точку сегмента
+            edge = np.clip(np.searchsorted(s, st) - 1, 0, len(s) - 2)
+            near.append(p[np.where(st - s[edge] < s[edge + 1] - st, edge, edge + 1)])
+            radius.append(s[edge + 1] - s[edge])
+        self.x = np.empty((0, 2))
+        self.__add_nodes__(np.concatenate(res))
+        if len(samples):
+            x, ok = self.__projection__.solve_many(self.__parser__.gradient_many, np.concatenate(samples),
+                                                   np.concatenate(radius))
+            x = np.where(ok[:, np.newaxis], x, np.concatenate(near))
+            # Точки, оказавшиеся после проецирования ближе min_length/2 к другим узлам (в углах границы), отбрасываются
+            self.__add_nodes__(x[self.__node_index__().is_new(x, min_length/2)])
+        # Перетриангуляция
+        if self.__pre_triangulation__() is False:
+            return False
+        # Формирование границы области
+        self.__create_boundary__()
+        return True
+
+    # Поиск точек на границе области вблизи ГЭ index (массив номеров), разделенных на count равных частей: середины
+    # частей проецируются на границу методом Ньютона по нормали к ГЭ (как и при поиске нуля на ортогональном
+    # отрезке, в острых углах границы находится вершина угла), а если проекция не найдена, нули R-функции ищутся
+    # на ортогональном отрезке перебором. Результат - найденные точки и номера ГЭ, к которым они относятся
     def __optimize_boundary_segment__(self, index, count=2):
         scale = 10   # Параметр, определяющий длину отрезка поиска нуля R-функции
-        h = [(self.x[self.be[index][1]][0] - self.x[self.be[index][0]][0])/count,
-             (self.x[self.be[index][1]][1] - self.x[self.be[index][0]][1])/count]
-        for i in range(0, count):
-            x1 = [self.x[self.be[index][0]][0] + i*h[0], self.x[self.be[index][0]][1] + i*h[1]]
-            x2 = [self.x[self.be[index][0]][0] + (i + 1)*h[0], self.x[self.be[index][0]][1] + (i + 1)*h[1]]
-            p = self.__get_orthogonal__(x1, x2, scale)
+        index = np.asarray(index, dtype=np.int64).reshape(-1)
+        count = np.broadcast_to(np.asarray(count, dtype=np.int64), index.shape)
+        seg = np.repeat(index, count)
+        n = np.repeat(count, count)
+        k = np.arange(0, len(seg)) - np.repeat(np.cumsum(count) - count, count)
+        p0 = self.x[self.be['v1'][seg]]
+        h = (self.x[self.be['v2'][seg]] - p0)/n[:, np.newaxis]
+        normal = np.column_stack((-h[:, 1], h[:, 0]))/np.hypot(h[:, 0], h[:, 1])[:, np.newaxis]
+        x, ok = self.__projection__.solve_many(self.__parser__.gradient_many, p0 + (k + 0.5)[:, np.newaxis]*h,
+                                               scale**0.5*self.be['length'][seg]/n, normal)
+        res = [x[ok]]
+        owner = [seg[ok]]
+        for i in np.nonzero(~ok)[0].tolist():
+            p = self.__get_orthogonal__((p0[i] + k[i]*h[i]).tolist(), (p0[i] + (k[i] + 1)*h[i]).tolist(), scale)
             if len(p):
-                self.__find_root__(p[0], p[1], 10)
-#                self.__find_root__(p[0], p[1], self.__max_step__)
+                roots = self.__find_root__(p[0], p[1], 10)
+                res.append(np.array(roots, dtype=np.float64).reshape(-1, 2))
+                owner.append(np.full(len(roots), seg[i], dtype=np.int64))
+        return np.concatenate(res), np.concatenate(owner)
 
     # Оптимизация границы области по критерию соотношения длин соседних сегментов
     def __optimize_boundary_for_length__(self):
-        size_x = len(self.x)
         # Определяем среднюю длину граничного сегмента
-        avg_len = 0
-        for i in range(0, len(self.be)):
-            avg_len += self.be[i][5]
-        avg_len /= len(self.be)
+        avg_len = self.be['length'].sum()/len(self.be)
         # Дробим на части граничные сегменты, длина которых больше средней
-        for i in range(0, len(self.be)):
-            if self.be[i][5]/avg_len > self.__max_ratio__:
-                self.__optimize_boundary_segment__(i, int(ceil(self.be[i][5]/avg_len)))
-        if size_x != len(self.x):
+        index = np.nonzero(self.be['length']/avg_len > self.__max_ratio__)[0]
+        x = self.__optimize_boundary_segment__(index, np.ceil(self.be['length'][index]/avg_len).astype(np.int64))[0]
+        if len(x):
+            self.__add_nodes__(x)
             # Перетриангуляция
             if self.__pre_triangulation__() is False:
                 return False
@@ -263,33 +599,33 @@ class TTri:
     @property
     def __optimize_boundary_for_angle__(self):
         for k in range(0, 20):
-            size_x = len(self.x)
-            for i in range(0, len(self.be)):
-                # Определяем углы между соседними граничными сегментами
-                if self.__angle__(i, self.be[i][2]) > self.__max_angle__ and \
-                        self.__angle__(i, self.be[i][3]) > self.__max_angle__:
-                    self.__optimize_boundary_segment__(i)
-            if size_x != len(self.x):
-                # Перетриангуляция
-                if self.__pre_triangulation__() is False:
-                    return False
-                # Формирование границы области
-                self.__create_boundary__()
+            be = self.be
+            # Определяем углы между соседними граничными сегментами (концы незамкнутых цепочек не имеют соседей)
+            prev = be[np.maximum(be['prev'], 0)]
+            nxt = be[np.maximum(be['next'], 0)]
+            is_angle = (TGeometry.segment_angles(self.x, be['v1'], be['v2'], prev['v1'], prev['v2']) >
+                        self.__max_angle__) & \
+                       (TGeometry.segment_angles(self.x, be['v1'], be['v2'], nxt['v1'], nxt['v2']) > self.__max_angle__)
+            is_angle &= (be['prev'] >= 0) & (be['next'] >= 0)
+            x = self.__optimize_boundary_segment__(np.nonzero(is_angle)[0])[0]
+            if not len(x):
+                break
+            self.__add_nodes__(x)
+            # Перетриангуляция
+            if self.__pre_triangulation__() is False:
+                return False
+            # Формирование границы области
+            self.__create_boundary__()
         return True
 
     # Удаление "висячих" узлов
     def __remove_orphan_vertex__(self):
-        attr = np.zeros(len(self.x))
-        self.__progress__.set_process('Find orphan vertex...', 1, len(self.fe))
-        for i in range(0, len(self.be)):
-            self.__progress__.set_progress(i + 1)
-            attr[self.be[i][0]] = attr[self.be[i][1]] = 1
-        is_orphan = False
-        for i in reversed(range(0, len(attr))):
-            if (attr[i]) == 0:
-                self.x.pop(i)
-                is_orphan = True
-        if is_orphan is True:
+        attr = np.zeros(len(self.x), dtype=bool)
+        self.__progress__.set_process('Find orphan vertex...', 1, 100)
+        attr[self.be['v1']] = attr[self.be['v2']] = True
+        self.__progress__.set_progress(100)
+        if not attr.all():
+            self.x = self.x[attr]
             # Перетриангуляция
             if self.__pre_triangulation__() is False:
                 return False
@@ -297,45 +633,112 @@ class TTri:
             self.__create_boundary__()
         return True
 
-    # Оптимизация по схеме  Рапперта
-    def __optimize__(self):
-        size_x = len(self.x)
-        # Оптимизация границы
-        self.__progress__.set_process('Optimize boundary...', 1, len(self.be))
-        for i in range(0, len(self.be)):
-            self.__progress__.set_progress(i + 1)
-            # Вычисляем координаты центра описанной около ГЭ окружности
-            c0 = [(self.x[self.be[i][0]][0] + self.x[self.be[i][1]][0])/2,
-                 (self.x[self.be[i][0]][1] + self.x[self.be[i][1]][1])/2]
-            # Проверяем, попадают ли в описанную около ГЭ окружность вершины соседних ГЭ
-            for j in range(0, 2):
-                for k in range(0, 2):
-                    if self.be[self.be[i][2 + j]][k] not in self.be[i]:
-                        x = [self.x[self.be[self.be[i][2 + j]][k]][0], self.x[self.be[self.be[i][2 + j]][k]][1]]
-                        if self.__length__(x, c0) <= self.be[i][5]/2:
-                            # Делим текущий ГЭ пополам
-                            #self.__optimize_boundary_segment__(i)
-                            if sign(self.__parser__.run(c0[0], c0[1])) >= 0:
-                                self.x.append(c0)
-                            break
-        # Оптимизация сетки
-        self.__progress__.set_process('Optimize mesh...', 1, len(self.fe))
-        for i in range(0, len(self.fe)):
-            # Вычисляем координаты центра текущего КЭ и радиус описанной около него окружности
-            c0 = self.__tri_center__(i)
-            r = self.__tri_radius__(i)
-            # Проверяем попадают ли вершины соседних КЭ внутрь этой окружности
-            for j in range(0, 3):
-                if self.fe[i][3 + j] != -1:
-                    for k in range(0, 3):
-                        if self.fe[self.fe[i][3 + j]][k] not in self.fe[i]:
-                            x = [self.x[self.fe[self.fe[i][3 + j]][k]][0], self.x[self.fe[self.fe[i][3 + j]][k]][1]]
-                            if self.__length__(x, c0) < r:
-                                # Добавляем новый узел в сетку
-                                if sign(self.__parser__.run(c0[0], c0[1])) >= 0:
-                                    self.x.append(c0)
-                                    break
-        if size_x != len(self.x):
+    # Вершины острых углов границы (внутренний угол между соседними ГЭ меньше 60 градусов)
+    def __sharp_corner__(self):
+        be = self.be
+        nxt = be[be['next']]
+        a = self.x[be['v1']] - self.x[be['v2']]
+        b = self.x[nxt['v2']] - self.x[nxt['v1']]
+        # Внутренний угол отсчитывается от следующего ГЭ до предыдущего против часовой стрелки (область слева)
+        angle = np.degrees(np.arctan2(b[:, 0]*a[:, 1] - b[:, 1]*a[:, 0], (a*b).sum(axis=1))) % 360
+        return be['v2'][(angle < 60) & (be['next'] >= 0)]
+
+    # Номера ГЭ, в диаметральные окружности которых попадают точки p (для каждой точки - один из таких ГЭ или -1):
+    # кандидаты - ГЭ, середины которых удалены от точки не больше, чем на половину наибольшей длины ГЭ
+    def __encroached_segment__(self, p):
+        res = np.full(len(p), -1, dtype=np.int64)
+        if not len(self.be) or not len(p):
+            return res
+        c0 = (self.x[self.be['v1']] + self.x[self.be['v2']])/2
+        r2 = (self.be['length']/2)**2
+        i, j = TSpatialIndex(c0).query_radius(p, float(self.be['length'].max())/2)
+        inside = ((c0[j] - p[i])**2).sum(axis=1) < r2[j]
+        res[i[inside]] = j[inside]
+        return res
+
+    # Точки деления граничных сегментов index (упорядоченный массив номеров): ближайшие к их серединам найденные
+    # точки границы (или сами середины, если точки не найдены, но середины принадлежат области)
+    def __split_segments__(self, index):
+        c0 = (self.x[self.be['v1'][index]] + self.x[self.be['v2'][index]])/2
+        x, owner = self.__optimize_boundary_segment__(index, 1)
+        pos = np.searchsorted(index, owner)
+        order = np.lexsort((((x - c0[pos])**2).sum(axis=1), pos))
+        first = order[np.r_[True, pos[order][1:] != pos[order][:-1]]] if len(order) else order
+        res = c0.copy()
+        res[pos[first]] = x[first]
+        found = np.zeros(len(index), dtype=bool)
+        found[pos[first]] = True
+        if not found.all():
+            found[~found] = self.__parser__.run_many(c0[~found, 0], c0[~found, 1]) >= 0
+        return res[found]
+
+    # Оптимизация по схеме Рапперта: на каждой итерации делятся граничные сегменты, в диаметральные окружности
+    # которых попадают вершины сетки, и в центры описанных окружностей плохих треугольников (наименьший угол меньше
+    # заданного) вставляются новые узлы - в порядке возрастания наименьшего угла, не более одного узла на группу
+    # смежных треугольников или треугольников с близкими центрами; центр, попадающий в диаметральную окружность
+    # ГЭ, заменяется делением этого ГЭ. Оптимизация завершается, когда плохих треугольников не осталось, исчерпан
+    # бюджет КЭ или итераций или очередная итерация не добавила ни одного узла
+    def __refine__(self):
+        self.__progress__.set_process('Optimize mesh...', 1, self.__max_iterations__)
+        for k in range(0, self.__max_iterations__):
+            self.__progress__.set_progress(k + 1)
+            budget = self.__max_elements__ - len(self.fe) if self.__max_elements__ > 0 else len(self.fe) + 1
+            if budget <= 0:
+                break
+            be = self.be
+            # Треугольники и ГЭ в острых углах границы не оптимизируются (вставка узлов в них не завершается)
+            corner = np.zeros(len(self.x), dtype=bool)
+            corner[self.__sharp_corner__()] = True
+            fixed = corner[be['v1']] | corner[be['v2']]
+            # Точка деления ГЭ находится с точностью eps, поэтому слишком короткие ГЭ также не делятся
+            fixed |= be['length'] < split_length*self.__eps__
+            # Граничные сегменты, в диаметральные окружности которых попадают узлы сетки (кроме концов сегмента)
+            c0 = (self.x[be['v1']] + self.x[be['v2']])/2
+            r2 = (be['length']/2)**2
+            i, j = self.__node_index__().query_radius(c0, be['length']/2)
+            inside = (j != be['v1'][i]) & (j != be['v2'][i]) & (((self.x[j] - c0[i])**2).sum(axis=1) < r2[i])
+            split = (np.bincount(i[inside], minlength=len(be)) > 0) & ~fixed
+            # Очередь плохих треугольников (по возрастанию наименьшего угла)
+            geometry = TGeometry(self.x, self.fe)
+            center = geometry.circumcenters()
+            angle = geometry.angles().min(axis=1)
+            bad = np.nonzero((angle < self.__min_angle__) & np.isfinite(center).all(axis=1) &
+                             ~corner[self.fe].any(axis=1))[0]
+            # Пары плохих треугольников с близкими центрами (центр одного лежит в окружности радиуса
+            # refine_spacing*R другого): почти совпадающие центры не вставляются в одной итерации
+            i, j = TSpatialIndex(center[bad]).query_radius(center[bad], refine_spacing*geometry.circumradii()[bad])
+            i, j = np.concatenate((i, j)), np.concatenate((j, i))
+            order = np.argsort(i, kind='stable')
+            near = bad[j[order]]
+            start = np.searchsorted(i[order], np.arange(0, len(bad) + 1))
+            queue = list(zip(angle[bad].tolist(), range(0, len(bad))))
+            heapify(queue)
+            used = np.zeros(len(self.fe), dtype=bool)
+            index = []
+            while len(queue) and 2*(len(index) + np.count_nonzero(split)) < budget:
+                item = heappop(queue)[1]
+                tri = bad[item]
+                if used[tri]:
+                    continue
+                used[tri] = True
+                used[self.neighbors[tri][self.neighbors[tri] >= 0]] = True
+                used[near[start[item]:start[item + 1]]] = True
+                index.append(tri)
+            if not len(index) and not split.any():
+                break
+            # Центры, попадающие в диаметральные окружности ГЭ, заменяются делением этих ГЭ
+            x = center[index]
+            segment = self.__encroached_segment__(x)
+            split[segment[segment >= 0]] = True
+            split &= ~fixed
+            x = x[segment < 0]
+            if len(x):
+                x = x[self.__parser__.run_many(x[:, 0], x[:, 1]) >= 0]
+            if split.any():
+                x = np.vstack((x, self.__split_segments__(np.nonzero(split)[0])))
+            # Совпадающие с уже существующими узлы не добавляются
+            if not self.__add_nodes__(x):
+                break
             # Перетриангуляция
             if self.__pre_triangulation__() is False:
                 return False
@@ -343,8 +746,77 @@ class TTri:
             self.__create_boundary__()
         return True
 
+    # Внешние единичные нормали к границе области в начальных узлах ГЭ (в порядке ГЭ): направлены против градиента
+    # R-функции (нулевые, если градиент в узле равен нулю или не определен)
+    def boundary_normals(self):
+        p = self.x[self.be['v1']]
+        f, gx, gy = self.__parser__.gradient_many(p[:, 0], p[:, 1])
+        norm = np.hypot(gx, gy)
+        res = np.zeros((len(p), 2))
+        ok = (norm > 0) & np.isfinite(norm)
+        res[ok] = -np.column_stack((gx[ok], gy[ok]))/norm[ok, np.newaxis]
+        return res
+
+    # Поиск ближайшего к точке (x, y) узла сетки: номер узла (-1, если узлов нет) и расстояние до него
+    def nearest_node(self, x, y):
+        dist, index = self.__node_index__().nearest([x, y])
+        return int(index[0]), float(dist[0])
+
+    # Показатели качества сетки: количество узлов, КЭ, ГЭ и контуров; наименьший и наибольший углы КЭ;
+    # среднее и наименьшее качество КЭ (отношение удвоенного радиуса вписанной окружности к радиусу описанной);
+    # наибольшее отношение радиуса описанной окружности к наименьшему ребру; длины ребер КЭ и ГЭ;
+    # наибольший угол поворота границы между соседними ГЭ
+    def mesh_quality(self):
+        res = {'nodes': len(self.x), 'elements': len(self.fe), 'boundary': len(self.be), 'loops': len(self.loops)}
+        if len(self.fe):
+            geometry = TGeometry(self.x, self.fe)
+            angles = geometry.angles()
+            quality = geometry.quality()
+            edges = geometry.edge_lengths()
+            res.update({
+                'min_angle': float(angles.min()),
+                'max_angle': float(angles.max()),
+                'mean_quality': float(quality.mean()),
+                'min_quality': float(quality.min()),
+                'max_radius_edge': float(geometry.radius_edge_ratios().max()),
+                'min_edge': float(edges.min()),
+                'max_edge': float(edges.max())
+            })
+        if len(self.be):
+            # Концы незамкнутых цепочек не имеют следующего ГЭ (если таких ГЭ нет вовсе, поворот равен 0)
+            be = self.be[self.be['next'] >= 0]
+            nxt = self.be[be['next']]
+            res.update({
+                'min_boundary_length': float(self.be['length'].min()),
+                'max_boundary_length': float(self.be['length'].max()),
+                'max_boundary_turn': float(np.max(TGeometry.turn_angles(self.x, be['v1'], be['v2'], nxt['v1'],
+                                                                        nxt['v2']), initial=0.0))
+            })
+        return res
+
+    # Трансляция описания R-функции и создание методов уточнения корней и проецирования на границу
+    def __compile__(self, code):
+        self.__code__ = code
+        self.__parser__ = TParser()
+        self.__parser__.set_cache(self.__cache__)
+        self.__parser__.set_code(code)
+        self.__function__ = self.__parser__.get_function()
+        self.__interval__ = TInterval(self.__parser__.get_domain())
+        if self.__root_method__ not in root_methods:
+            raise TException('root_method_err')
+        self.__root__ = root_methods[self.__root_method__](self.__eps__, self.__max_step__)
+        self.__projection__ = TNewtonProjection(self.__eps__, newton_steps)
+
+    # Учет времени выполнения этапа расчета phase (от завершения предыдущего этапа)
+    def __mark__(self, phase):
+        now = time.perf_counter()
+        self.__timings__[phase] = self.__timings__.get(phase, 0.0) + now - self.__timer__
+        self.__timer__ = now
+
     # Запуск процедуры построения триангуляции
     def start(self):
+        self.__timings__ = {}
+        self.__timer__ = time.perf_counter()
         try:
             file = open(self.__file_name__)
             code = file.readlines()
@@ -352,41 +824,130 @@ class TTri:
         except IOError as err:
             print('\033[1;31m%s\033[1;m' % err)
             return False
+        self.__mark__('read')
 
         try:
-            self.__parser__.set_code(code)
+            self.__compile__(code)
         except TException as err:
             err.print_error()
             return False
+        self.__mark__('compile')
+
+        # Сетка, построенная ранее по тому же описанию области с теми же параметрами, загружается из кэша
+        key = None
+        if self.__mesh_cache__ is not None:
+            key = self.__mesh_cache__.key(mesh_version, np.__version__, scipy.__version__, ''.join(code),
+                                          self.__parameters__())
+            is_loaded = self.__load_mesh__(self.__mesh_cache__.get(key))
+            self.__mark__('cache')
+            if is_loaded:
+                return True
 
         # Поиск границы области
-        self.__find_boundary__(self.__min_x__, self.__max_x__)
+        self.x = np.empty((0, 2))
+        self.__delaunay__ = None
+        self.__points__ = np.empty((0, 2))
+        self.__region__ = [self.__min_x__, self.__max_x__]
+        if self.__auto_region__ is True:
+            region = self.__interval__.bounds([-region_limit, -region_limit], [region_limit, region_limit])
+            if region is not None:
+                self.__region__ = [region[0], region[1]]
+            self.__mark__('region')
+        self.__find_boundary__(self.__region__[0], self.__region__[1])
+        self.__mark__('search')
         # Предварительная триангуляция
         if self.__pre_triangulation__() is False:
             return False
         # Формирование границы области
         self.__create_boundary__()
+        self.__mark__('triangulation')
         # Удаление "висячих" узлов
         if self.__remove_orphan_vertex__() is False:
             return False
         # Удаление вырожденых граничных сегментов
         if self.__remove_degenerate_boundary__() is False:
             return False
+        self.__mark__('cleanup')
+        # Перераспределение узлов границы
+        if self.__resample__ is True:
+            if self.__resample_boundary__() is False:
+                return False
+            self.__mark__('resample')
         # Оптимизация по критерию длины сегмента
         if self.__length_optimize__ is True:
             if self.__optimize_boundary_for_length__() is False:
                 return False
+            self.__mark__('length_optimize')
         # Оптимизация по критерию угла между соседними граничными сегментами
         if self.__angle_optimize__ is True:
             if self.__optimize_boundary_for_angle__ is False:
                 return False
+            self.__mark__('angle_optimize')
         # Оптимизация по схеме  Рапперта
-        for i in range(0, 3):
-            if self.__full_optimize__ is True:
-                if self.__optimize__() is False:
-                    return False
+        if self.__full_optimize__ is True:
+            if self.__refine__() is False:
+                return False
+            self.__mark__('refine')
+        if key is not None:
+            self.__mesh_cache__.put(key, self.__save_mesh__())
+            self.__mark__('cache')
         return True
 
+    # Параметры расчета, от которых зависит построенная сетка (часть ключа кэша сеток)
+    def __parameters__(self):
+        return [self.__eps__, self.__root_method__, self.__min_x__, self.__max_x__, self.__auto_region__,
+                self.__max_step__, self.__max_angle__, self.__max_ratio__, self.__min_length__, self.__max_length__,
+                self.__min_angle__, self.__max_elements__, self.__max_iterations__, self.__resample__,
+                self.__length_optimize__, self.__angle_optimize__, self.__full_optimize__, self.__search_mode__,
+                self.__quadtree_depth__, self.__incremental__, self.__batch_size__]
+
+    # Сохранение сетки в двоичном виде (архив массивов NumPy без сжатия)
+    def __save_mesh__(self):
+        res = io.BytesIO()
+        np.savez(res, x=self.x, fe=self.fe, neighbors=self.neighbors, be=self.be,
+                 loops=np.array([i for index in self.loops for i in index], dtype=np.int32),
+                 loop_sizes=np.array([len(index) for index in self.loops], dtype=np.int32),
+                 region=np.array(self.__region__, dtype=np.float64))
+        return res.getvalue()
+
+    # Загрузка сетки, сохраненной __save_mesh__ (False, если данные отсутствуют или повреждены)
+    def __load_mesh__(self, data):
+        if data is None:
+            return False
+        try:
+            with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+                x, fe, neighbors, be = arrays['x'], arrays['fe'], arrays['neighbors'], arrays['be']
+                loops, loop_sizes, region = arrays['loops'], arrays['loop_sizes'], arrays['region']
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return False
+        if be.dtype != be_type or fe.shape[1:] != (3,) or x.shape[1:] != (2,):
+            return False
+        self.x = x
+        self.fe = fe
+        self.neighbors = neighbors
+        self.be = be
+        self.loops = []
+        if len(loop_sizes):
+            self.loops = [index.tolist() for index in np.split(loops, np.cumsum(loop_sizes)[:-1])]
+        self.__region__ = [region[0].tolist(), region[1].tolist()]
+        self.__topology__ = None
+        self.__delaunay__ = None
+        self.__points__ = np.empty((0, 2))
+        return True
+
+    # Сетка в прежнем представлении (списками): узлы [x, y], КЭ [v1, v2, v3, n1, n2, n3],
+    # ГЭ [v1, v2, предыдущий, следующий, КЭ, длина, контур]
+    def get_lists(self):
+        return self.x.tolist(), np.hstack((self.fe, self.neighbors)).tolist(), [list(be) for be in self.be.tolist()]
+
+    # Сетка в виде объекта TMesh (для сохранения в файл)
+    def get_mesh(self):
+        return TMesh(self.x, self.fe, self.be, self.neighbors)
+
+    # Сохранение сетки в файл формата fmt ('npz', 'raw', 'vtk', 'gmsh'; по умолчанию - по расширению имени файла)
+    def save(self, file_name, fmt=None):
+        self.get_mesh().save(file_name, fmt)
+
     # Задание имени файла, содержащего описание R-функции на входном языке
     def set_file_name(self, file_name):
         self.__file_name__ = file_name
@@ -395,14 +956,97 @@ class TTri:
     def set_eps(self, eps):
         self.__eps__ = eps
 
+    # Задание метода уточнения корней R-функции ('bisect', 'illinois' или 'itp')
+    def set_root_method(self, method):
+        self.__root_method__ = method
+
+    # Время выполнения этапов последнего расчета в секундах (чтение, трансляция, кэш, поиск границы и т.д.)
+    def get_timings(self):
+        return dict(self.__timings__)
+
+    # Включение (отключение) вывода прогресса расчета
+    def set_progress(self, is_enabled):
+        self.__progress__ = TProgress(is_enabled)
+
+    # Статистика уточнения корней: количество корней, суммарное и максимальное количество итераций, отказы
+    def get_root_statistics(self):
+        return self.__root__.statistics() if self.__root__ is not None else {}
+
+    # Статистика проецирования точек на границу методом Ньютона
+    def get_projection_statistics(self):
+        return self.__projection__.statistics() if self.__projection__ is not None else {}
+
+    # Задание количества процессов для поиска границы (1 - поиск в текущем процессе)
+    def set_workers(self, count):
+        self.__workers__ = max(1, count)
+
+    # Задание каталога кэша транслированных функций и построенных сеток и максимального размера каждой его части
+    # в байтах (None - расчет без кэша)
+    def set_cache(self, path, max_size=cache_size):
+        is_mesh_cache = self.__mesh_cache__ is not None
+        self.__cache_path__ = path
+        self.__cache_size__ = max_size
+        self.__cache__ = None if path is None else TCache(os.path.join(path, 'compiled'), max_size)
+        self.set_mesh_cache(is_mesh_cache)
+
+    # Включение кэша построенных сеток (в каталоге кэша, заданном set_cache): повторный расчет с тем же описанием
+    # области и теми же параметрами возвращает сохраненную сетку
+    def set_mesh_cache(self, is_enabled):
+        self.__mesh_cache__ = None
+        if is_enabled and self.__cache_path__ is not None:
+            self.__mesh_cache__ = TCache(os.path.join(self.__cache_path__, 'mesh'), self.__cache_size__)
+
+    # Очистка кэшей транслированных функций и построенных сеток
+    def clear_cache(self):
+        if self.__cache__ is not None:
+            self.__cache__.clear()
+        if self.__mesh_cache__ is not None:
+            self.__mesh_cache__.clear()
+
+    # Задание режима пополнения триангуляции (False - построение триангуляции заново после каждой оптимизации)
+    def set_incremental(self, is_incremental):
+        self.__incremental__ = is_incremental
+
     # Здание количества шагов
     def set_step(self, step):
         self.__max_step__ = step
 
-    # Здание области поиска
+    # Задание способа поиска границы области ('line' - по отдельным прямым, 'grid' - по всей сетке сразу,
+    # 'quadtree' - адаптивно, с помощью квадродерева)
+    def set_search_mode(self, mode):
+        self.__search_mode__ = mode
+
+    # Задание глубины квадродерева при поиске границы (ячейки наименьшего уровня в 2^depth раз меньше ячеек
+    # начальной сетки quadtree_base x quadtree_base; 0 - глубина определяется по количеству шагов)
+    def set_quadtree_depth(self, depth):
+        self.__quadtree_depth__ = depth
+
+    # Здание области поиска (отключает автоматическое определение габаритов области)
     def set_region(self, min_x, max_x):
         self.__min_x__ = min_x
         self.__max_x__ = max_x
+        self.__auto_region__ = False
+
+    # Включение автоматического определения габаритов области (если область неограничена
+    # или пуста, используется область поиска, заданная set_region)
+    def set_auto_region(self, is_auto):
+        self.__auto_region__ = is_auto
+
+    # Габариты области поиска, использованные при последнем расчете
+    def get_region(self):
+        return self.__region__
+
+    # Задание режима перераспределения узлов границы по длине дуги и кривизне
+    def set_resample(self, is_resample):
+        self.__resample__ = is_resample
+
+    # Задание минимальной и максимальной длин граничного сегмента при перераспределении узлов границы
+    # (0 - по умолчанию; максимальный угол поворота на сегменте задается set_angle)
+    def set_min_length(self, length):
+        self.__min_length__ = length
+
+    def set_max_length(self, length):
+        self.__max_length__ = length
 
     # Здание максимального соотношения длин соседних сегментов
     def set_ratio(self, ratio):
@@ -412,6 +1056,18 @@ class TTri:
     def set_angle(self, angle):
         self.__max_angle__ = angle
 
+    # Задание минимального угла треугольника, не требующего оптимизации по Рапперту
+    def set_min_angle(self, angle):
+        self.__min_angle__ = angle
+
+    # Задание максимального количества КЭ при оптимизации (0 - без ограничения)
+    def set_max_elements(self, count):
+        self.__max_elements__ = count
+
+    # Задание максимального количества итераций оптимизации
+    def set_max_iterations(self, count):
+        self.__max_iterations__ = count
+
     # Здание оптимизвции по углу между соседними сегментами
     def set_angle_optimize(self, is_angle):
         self.__angle_optimize__ = is_angle
@@ -421,4 +1077,43 @@ class TTri:
         self.__length_optimize__ = is_length
 
     def set_full_optimize(self, is_optimize):
-        self.__full_optimize__ = is_optimize
\ No newline at end of file
+        self.__full_optimize__ = is_optimize
+
+
+# Экземпляр TTri процесса пула параллельного поиска границы
+worker_tri = None
+
+
+# Инициализация процесса пула: трансляция описания R-функции с параметрами поиска границы основного процесса
+def init_worker(code, settings):
+    global worker_tri
+    eps, root_method, step, search_mode, depth, batch_size, cache = settings
+    worker_tri = TTri()
+    worker_tri.__progress__ = TProgress(False)
+    worker_tri.__batch_size__ = batch_size
+    worker_tri.__cache__ = cache
+    worker_tri.set_eps(eps)
+    worker_tri.set_root_method(root_method)
+    worker_tri.set_step(step)
+    worker_tri.set_search_mode(search_mode)
+    worker_tri.set_quadtree_depth(depth)
+    worker_tri.__compile__(code)
+
+
+# Поиск границы процессом пула на столбцах first, ..., last - 1: найденные точки и статистика уточнения корней
+def find_columns(min_x, max_x, first, last):
+    worker_tri.__root__ = root_methods[worker_tri.__root_method__](worker_tri.__eps__, worker_tri.__max_step__)
+    x = worker_tri.__find_columns__(min_x, max_x, first, last)
+    return x, worker_tri.__root__.statistics()
+
+
+# Отрезки квадродерева со сменой знака на столбцах first, ..., last - 1, найденные процессом пула
+def find_brackets(min_x, max_x, first, last):
+    return worker_tri.__quadtree_brackets__(min_x, max_x, first, last)
+
+
+# Уточнение корней на отрезках [x1, x2] процессом пула: найденные точки и статистика уточнения корней
+def solve_brackets(x1, x2, f1, f2):
+    worker_tri.__root__ = root_methods[worker_tri.__root_method__](worker_tri.__eps__, worker_tri.__max_step__)
+    x = worker_tri.__root__.solve_many(worker_tri.__parser__.run_many, x1, x2, f1, f2)
+    return x, worker_tri.__root__.statistics()
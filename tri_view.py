@@ -5,25 +5,50 @@
 ####################################################################
 
 from tkinter import *
+import numpy as np
+from tri_export import TMesh
 
+# Доля окна, занимаемая изображением сетки при масштабе 1
+view_fill = 0.9
+# Изменение масштаба при прокрутке колеса мыши
+zoom_factor = 1.1
+# Начальный шаг сетки (в пикселях), по которой прореживаются узлы и отрезки при отрисовке (уровень детализации)
+lod_pixels = 1
+# Максимальное количество отрезков (узлов) одного вида на холсте: при превышении шаг прореживания удваивается
+max_items = 20000
+# Запас области отрисовки вокруг окна (в размерах окна): сдвиг в пределах запаса не требует перерисовки
+view_margin = 1.0
+# Изменение масштаба, после которого изображение перерисовывается с новым уровнем детализации
+lod_ratio = 2.0
+# Задержка перерисовки после изменения масштаба, сдвига или размера окна (мс)
+refresh_delay = 150
 
+
+# Изображение сетки строится один раз для текущего масштаба: масштабирование и сдвиг выполняются преобразованием
+# элементов холста (scale, move), а перерисовка (с отсечением невидимых элементов и прореживанием) - только после
+# выхода окна за пределы нарисованной области или заметного изменения масштаба
 class TTriView(Frame):
     def __init__(self, root, name, x, fe, be, show_vertex=False, show_fe=False, show_be=True):
         Frame.__init__(self, root)
         root.title('R-function - ' + name)
 
-        self.__x__ = x
-        self.__fe__ = fe
-        self.__be__ = be
+        mesh = TMesh.from_arrays(x, fe, be)
+        self.__x__ = mesh.x
+        self.__edges__ = mesh.edges()               # Ребра КЭ (каждое - один раз)
+        self.__boundary__ = mesh.boundary_edges()   # Граничные отрезки
         self.__show_vertex__ = show_vertex
         self.__show_fe__ = show_fe
         self.__show_be__ = show_be
         self.__scale__ = 1
         self.__shift_x__ = 0
         self.__shift_y__ = 0
+        self.__width__ = 0
+        self.__height__ = 0
+        self.__drawn__ = None                       # Масштаб и область (min, max) нарисованного изображения
+        self.__refresh_id__ = None                  # Отложенная перерисовка
 
-        self.__x_min__ = [min(x[i][0] for i in range(0, len(x))), min(x[i][1] for i in range(0, len(x)))]
-        self.__x_max__ = [max(x[i][0] for i in range(0, len(x))), max(x[i][1] for i in range(0, len(x)))]
+        self.__x_min__ = self.__x__.min(axis=0)
+        self.__x_max__ = self.__x__.max(axis=0)
         size = 600
 
         self.columnconfigure(0, weight=1)
@@ -36,16 +61,52 @@ class TTriView(Frame):
         self.display.bind('<Button-3>', self.shift)
         self.display.bind_all('<KeyPress>', self.shift)
 
+    # Преобразование координат в координаты холста (a*x + b) для текущих масштаба, сдвига и размера окна
+    def __transform__(self):
+        size = np.array([self.__width__, self.__height__], dtype=np.float64)
+        dx = self.__x_max__ - self.__x_min__
+        center = (self.__x_max__ + self.__x_min__)/2 + [self.__shift_x__, self.__shift_y__]
+        a = size*self.__scale__*view_fill/dx
+        return a, size/2 - center*a
+
+    # Отложенная перерисовка (серия событий масштабирования или сдвига вызывает одну перерисовку)
+    def __schedule__(self):
+        if self.__refresh_id__ is not None:
+            self.after_cancel(self.__refresh_id__)
+        self.__refresh_id__ = self.after(refresh_delay, self.__refresh__)
+
+    # Перерисовка, если окно вышло за пределы нарисованной области или масштаб изменился более чем в lod_ratio раз
+    def __refresh__(self):
+        self.__refresh_id__ = None
+        if self.__width__ < 2 or self.__height__ < 2:
+            return
+        if self.__drawn__ is not None:
+            a, b = self.__transform__()
+            ratio = a/self.__drawn__[0]
+            view_min, view_max = -b/a, (np.array([self.__width__, self.__height__]) - b)/a
+            if np.all(ratio < lod_ratio) and np.all(ratio > 1/lod_ratio) and \
+                    np.all(view_min >= self.__drawn__[1]) and np.all(view_max <= self.__drawn__[2]):
+                return
+        self.paint(self.__width__, self.__height__)
+
     def resize(self, event):
-        self.paint(event.width, event.height)
+        if self.__drawn__ is not None and self.__width__ > 0 and self.__height__ > 0 and \
+                event.width > 0 and event.height > 0:
+            self.display.scale('all', 0, 0, event.width/self.__width__, event.height/self.__height__)
+        else:
+            self.display.delete('all')
+            self.__drawn__ = None
+        self.__width__, self.__height__ = event.width, event.height
+        self.__schedule__()
 
     def zoom(self, event):
-        self.__scale__ = self.__scale__*1.1 if event.delta > 0 else self.__scale__/1.1
-        w, h = self.display.winfo_width(), self.display.winfo_height()
-        self.paint(w, h)
+        factor = zoom_factor if event.delta > 0 else 1/zoom_factor
+        self.__scale__ *= factor
+        self.display.scale('all', self.__width__/2, self.__height__/2, factor, factor)
+        self.__schedule__()
 
     def shift(self, event):
-        w, h = self.display.winfo_width(), self.display.winfo_height()
+        _, b = self.__transform__()
         if event.keysym == 'Right':
             self.__shift_x__ -= (self.__x_max__[0] - self.__x_min__[0])/100
         elif event.keysym == 'Left':
@@ -56,41 +117,66 @@ class TTriView(Frame):
             self.__shift_y__ -= (self.__x_max__[1] - self.__x_min__[1])/100
         else:
             return
-        self.paint(w, h)
+        _, moved = self.__transform__()
+        self.display.move('all', float(moved[0] - b[0]), float(moved[1] - b[1]))
+        self.__schedule__()
 
-    def paint(self, width, height):
-        self.display.delete('LINE')
-        self.display.delete('OVAL')
+    # Прореживание (только если строк больше max_items; иначе координаты не изменяются): координаты (в пикселях)
+    # округляются до сетки с шагом cell, совпадающие строки удаляются, а если и после этого их больше max_items,
+    # шаг удваивается. Строки из четырех столбцов - отрезки: концы упорядочиваются, отрезки, стянутые в точку,
+    # заменяются отрезками длиной в шаг сетки (чтобы мелкие КЭ оставались видимыми)
+    @staticmethod
+    def __decimate__(p):
+        if len(p) <= max_items:
+            return p.tolist()
+        cell = lod_pixels
+        res = np.round(p/cell).astype(np.int64)
+        while True:
+            if res.shape[1] == 4:
+                swap = (res[:, 0] > res[:, 2]) | ((res[:, 0] == res[:, 2]) & (res[:, 1] > res[:, 3]))
+                res[swap] = res[swap][:, [2, 3, 0, 1]]
+            if len(res) > max_items:
+                res = res[np.lexsort(res.T[::-1])]
+                res = res[np.concatenate(([True], np.any(res[1:] != res[:-1], axis=1)))]
+            if len(res) <= max_items:
+                break
+            # Следующий шаг - по уже прореженным координатам
+            cell *= 2
+            res = np.round(res/2).astype(np.int64)
+        if res.shape[1] == 4:
+            res[np.all(res[:, :2] == res[:, 2:], axis=1), 2] += 1
+        return (res*cell).tolist()
 
-        w = width*self.__scale__
-        h = height*self.__scale__
-        dx = [self.__x_max__[0] - self.__x_min__[0], self.__x_max__[1] - self.__x_min__[1]]
-        s_x = [self.__shift_x__ + (self.__x_max__[0] + self.__x_min__[0])/2,
-               self.__shift_y__ + (self.__x_max__[1] + self.__x_min__[1])/2]
+    # Отрезки edges в координатах холста: отрезки вне области (view_min, view_max) отбрасываются
+    def __segments__(self, edges, a, b, view_min, view_max):
+        x1 = self.__x__[edges[:, 0]]
+        x2 = self.__x__[edges[:, 1]]
+        mask = np.all(np.maximum(x1, x2) >= view_min, axis=1) & np.all(np.minimum(x1, x2) <= view_max, axis=1)
+        return self.__decimate__(np.hstack((x1[mask]*a + b, x2[mask]*a + b)))
+
+    def paint(self, width, height):
+        self.display.delete('all')
+        self.__width__, self.__height__ = width, height
+        a, b = self.__transform__()
+        # Нарисованная область: окно с запасом view_margin с каждой стороны
+        view_min, view_max = -b/a, (np.array([width, height]) - b)/a
+        margin = (view_max - view_min)*view_margin
+        view_min, view_max = view_min - margin, view_max + margin
 
         # Изображение узлов
         if self.__show_vertex__:
-            for i in range(0, len(self.__x__)):
-                x = [(self.__x__[i][0] - s_x[0])*w/dx[0]*0.9 + width/2,
-                     (self.__x__[i][1] - s_x[1])*h/dx[1]*0.9 + height/2]
+            mask = np.all(self.__x__ >= view_min, axis=1) & np.all(self.__x__ <= view_max, axis=1)
+            for x in self.__decimate__(self.__x__[mask]*a + b):
                 self.display.create_oval([x[0] - 2, x[1] - 2], [x[0] + 2, x[1] + 2], fill='red', tags='OVAL')
 
         # Изображение КЭ
         if self.__show_fe__:
-            for i in range(0, len(self.__fe__)):
-                x = []
-                for j in range(0, 3):
-                    x.append([(self.__x__[self.__fe__[i][j]][0] - s_x[0])*w/dx[0]*0.9 + width/2,
-                              (self.__x__[self.__fe__[i][j]][1] - s_x[1])*h/dx[1]*0.9 + height/2])
-                self.display.create_line([x[0][0], x[0][1]], [x[1][0], x[1][1]], tags='LINE')
-                self.display.create_line([x[1][0], x[1][1]], [x[2][0], x[2][1]], tags='LINE')
-                self.display.create_line([x[2][0], x[2][1]], [x[0][0], x[0][1]], tags='LINE')
+            for x in self.__segments__(self.__edges__, a, b, view_min, view_max):
+                self.display.create_line(x, tags='LINE')
 
         # Изображение границы
         if self.__show_be__:
-            for i in range(0, len(self.__be__)):
-                x = []
-                for j in range(0, 2):
-                    x.append([(self.__x__[self.__be__[i][j]][0] - s_x[0])*w/dx[0]*0.9 + width/2,
-                              (self.__x__[self.__be__[i][j]][1] - s_x[1])*h/dx[1]*0.9 + height/2])
-                self.display.create_line([x[0][0], x[0][1]], [x[1][0], x[1][1]], fill='blue', tags='LINE')
+            for x in self.__segments__(self.__boundary__, a, b, view_min, view_max):
+                self.display.create_line(x, fill='blue', tags='LINE')
+
+        self.__drawn__ = (a, view_min, view_max)